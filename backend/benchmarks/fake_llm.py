@@ -0,0 +1,77 @@
+import asyncio
+import json
+import random
+import re
+import sys
+import types
+
+# Stand-in for emergentintegrations.llm.chat so benchmarks never reach a real
+# provider. Latency is drawn from a log-normal around the configured mean.
+
+CANNED_RESPONSE = (
+    "Q: What is the main idea of the passage?\n"
+    "A) Option one\nB) Option two\nC) Option three\nD) Option four\n"
+    "Correct: A"
+)
+
+
+def _quiz_response(prompt: str) -> str:
+    # Distinct questions in the JSON shape the chunked quiz generator asks for
+    match = re.search(r"Write (\d+) multiple choice questions", prompt)
+    count = int(match.group(1)) if match else 1
+    return json.dumps([
+        {
+            "question": f"Which statement about topic {random.getrandbits(48):x} is correct?",
+            "options": ["First", "Second", "Third", "Fourth"],
+            "correct": "ABCD"[i % 4],
+        }
+        for i in range(count)
+    ])
+
+
+class FakeUserMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeLlmChat:
+    latency_ms = 800.0
+    jitter = 0.35
+    calls = 0
+
+    def __init__(self, api_key: str = "", session_id: str = "", system_message: str = ""):
+        self.session_id = session_id
+        self.system_message = system_message
+
+    def with_model(self, provider: str, model: str):
+        return self
+
+    async def send_message(self, message) -> str:
+        FakeLlmChat.calls += 1
+        delay = random.lognormvariate(0, self.jitter) * self.latency_ms / 1000.0
+        await asyncio.sleep(delay)
+        if "quiz generator" in self.system_message:
+            return _quiz_response(message.text)
+        return CANNED_RESPONSE
+
+
+def install_fake_llm(latency_ms: float = 800.0, jitter: float = 0.35):
+    FakeLlmChat.latency_ms = latency_ms
+    FakeLlmChat.jitter = jitter
+
+    root = types.ModuleType("emergentintegrations")
+    llm = types.ModuleType("emergentintegrations.llm")
+    chat = types.ModuleType("emergentintegrations.llm.chat")
+    chat.LlmChat = FakeLlmChat
+    chat.UserMessage = FakeUserMessage
+    root.llm = llm
+    llm.chat = chat
+
+    sys.modules["emergentintegrations"] = root
+    sys.modules["emergentintegrations.llm"] = llm
+    sys.modules["emergentintegrations.llm.chat"] = chat
+
+    # The server imports the LLM client lazily; drop anything it already resolved
+    server = sys.modules.get("server")
+    if server is not None:
+        server.load_llm.cache_clear()
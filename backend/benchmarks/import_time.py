@@ -0,0 +1,83 @@
+"""Cold-start import breakdown for the server module.
+
+Run from the backend directory:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --with-llm --top 25
+
+Each measurement spawns a fresh interpreter with ``-X importtime`` so nothing
+is served from an already-populated sys.modules. ``--with-llm`` also resolves
+the lazily imported LLM client, which shows what the AI routes add on first use.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(statement: str, env: Dict[str, str]) -> List[Tuple[str, int, int, int]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise SystemExit(f"Import failed:\n{tail}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, module = m.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def by_top_level_package(rows: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    totals: Dict[str, int] = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        totals[module.split(".")[0]] += self_us
+    return totals
+
+
+def report(label: str, rows: List[Tuple[str, int, int, int]], top: int):
+    totals = by_top_level_package(rows)
+    total_us = sum(totals.values())
+    print(f"\n{label}: {total_us / 1000:.1f} ms across {len(rows)} modules")
+    print(f"  {'package':<32}{'self ms':>10}{'share':>8}")
+    for package, us in sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"  {package:<32}{us / 1000:>10.1f}{us / total_us * 100:>7.1f}%")
+    return total_us
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time breakdown for server.py")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--with-llm", action="store_true", help="Also measure with the LLM client preloaded")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "padho_aur_badho_db")
+
+    cold = report("import server", measure("import server", env), args.top)
+
+    if args.with_llm:
+        warm = report(
+            "import server + load_llm()",
+            measure("import server; server.load_llm()", env),
+            args.top,
+        )
+        print(f"\nDeferred by lazy LLM import: {(warm - cold) / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
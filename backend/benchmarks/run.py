@@ -0,0 +1,282 @@
+"""Load-test the hot API routes against a seeded database.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --scale 0.01 --concurrency 32 --out bench.json
+    python -m benchmarks.run --scale 0.01 --compare bench.json
+    python -m benchmarks.run --scale 0.01 --storage memory   # no MongoDB needed
+
+The app is driven in-process over httpx's ASGI transport unless --base-url
+points at a running server. Results are written as a JSON artifact so runs
+can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.fake_llm import install_fake_llm
+from benchmarks import seed as seeding
+
+SCENARIOS = [
+    "login",
+    "get_courses_search",
+    "get_student_dashboard",
+    "update_video_progress",
+    "submit_quiz",
+    "get_leaderboard",
+]
+
+SEARCH_TERMS = ["physics", "python", "revision", "calculus", "grammar", "mock"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+class Scenarios:
+    def __init__(self, plan: seeding.SeedPlan, seed: int):
+        self.plan = plan
+        self.rng = random.Random(seed)
+
+    def _session(self) -> Dict[str, str]:
+        i = self.rng.randrange(self.plan.session_users)
+        return {"Authorization": f"Bearer {seeding.session_token(i)}"}
+
+    def _student(self) -> int:
+        return seeding.student_index(self.plan, self.rng.randrange(self.plan.users - self.plan.instructors))
+
+    async def login(self, client: httpx.AsyncClient, n: int) -> httpx.Response:
+        return await client.post("/api/auth/login", json={
+            "email": seeding.user_email(self._student()),
+            "password": seeding.BENCH_PASSWORD,
+        })
+
+    async def get_courses_search(self, client: httpx.AsyncClient, n: int) -> httpx.Response:
+        return await client.get("/api/courses", params={"search": self.rng.choice(SEARCH_TERMS)})
+
+    async def get_student_dashboard(self, client: httpx.AsyncClient, n: int) -> httpx.Response:
+        return await client.get("/api/dashboard/student", headers=self._session())
+
+    async def update_video_progress(self, client: httpx.AsyncClient, n: int) -> httpx.Response:
+        c = self.rng.randrange(self.plan.courses)
+        total = float(self.rng.randint(300, 2700))
+        return await client.post("/api/video-progress", headers=self._session(), json={
+            "lesson_id": seeding.lesson_id(c, self.rng.randrange(seeding.LESSONS_PER_COURSE)),
+            "progress_seconds": self.rng.uniform(0, total),
+            "total_seconds": total,
+        })
+
+    async def submit_quiz(self, client: httpx.AsyncClient, n: int) -> httpx.Response:
+        q = self.rng.randrange(self.plan.quizzes)
+        answers = {
+            seeding.question_id(q, k): self.rng.choice("ABCD")
+            for k in range(seeding.QUESTIONS_PER_QUIZ)
+        }
+        return await client.post("/api/quizzes/submit", headers=self._session(), json={
+            "quiz_id": seeding.quiz_id(q),
+            "answers": answers,
+        })
+
+    async def get_leaderboard(self, client: httpx.AsyncClient, n: int) -> httpx.Response:
+        q = self.rng.randrange(self.plan.quizzes)
+        return await client.get(f"/api/quizzes/{seeding.quiz_id(q)}/leaderboard")
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    total: int,
+    concurrency: int,
+    warmup: int,
+) -> Dict[str, float]:
+    for n in range(warmup):
+        await request(client, n)
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for n in counter:
+            start = time.perf_counter()
+            try:
+                resp = await request(client, n)
+                if resp.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def compare(current: Dict, baseline: Dict):
+    print(f"\n{'scenario':<24}{'rps':>12}{'Δrps':>9}{'p50':>10}{'Δp50':>9}{'p99':>10}{'Δp99':>9}")
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+
+        def delta(key):
+            if not base[key]:
+                return "n/a"
+            return f"{(cur[key] - base[key]) / base[key] * 100:+.1f}%"
+
+        print(
+            f"{name:<24}{cur['throughput_rps']:>12.1f}{delta('throughput_rps'):>9}"
+            f"{cur['p50_ms']:>10.2f}{delta('p50_ms'):>9}{cur['p99_ms']:>10.2f}{delta('p99_ms'):>9}"
+        )
+
+
+async def wait_until_ready(client, timeout: float = 300.0):
+    # Measure a warmed worker, the same thing the load balancer would route to
+    deadline = time.perf_counter() + timeout
+    while True:
+        response = await client.get("/readyz")
+        if response.status_code == 200:
+            return
+        if time.perf_counter() > deadline:
+            raise SystemExit(f"Server not ready after {timeout:.0f}s: {response.text}")
+        await asyncio.sleep(0.5)
+
+
+async def main(args):
+    install_fake_llm(latency_ms=args.llm_latency_ms, jitter=args.llm_jitter)
+
+    # Point the app at the benchmark database before it is imported
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["STORAGE_BACKEND"] = args.storage
+    if args.mongo_url:
+        os.environ["MONGO_URL"] = args.mongo_url
+    # Every benchmark request comes from one client; keep the login limits out of the way
+    os.environ.setdefault("RATE_LIMIT_LOGIN_IP", "1000000/1")
+    os.environ.setdefault("RATE_LIMIT_LOGIN_ACCOUNT", "1000000/1")
+
+    import server
+
+    plan = seeding.SeedPlan.for_scale(args.scale, seed=args.seed, session_users=args.session_users)
+    await seeding.seed_database(server.db, plan, reseed=args.reseed)
+
+    selected = args.scenarios.split(",") if args.scenarios else SCENARIOS
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+    scenarios = Scenarios(plan, args.seed)
+    results = {}
+
+    if args.base_url:
+        client_ctx = httpx.AsyncClient(base_url=args.base_url, timeout=60.0)
+        lifespan = None
+    else:
+        transport = httpx.ASGITransport(app=server.app)
+        client_ctx = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0)
+        lifespan = server.app.router.lifespan_context(server.app)
+
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        async with client_ctx as client:
+            await wait_until_ready(client)
+            for name in selected:
+                print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})...")
+                results[name] = await run_scenario(
+                    client, getattr(scenarios, name), args.requests, args.concurrency, args.warmup
+                )
+                r = results[name]
+                print(
+                    f"  {r['throughput_rps']:.1f} req/s  p50={r['p50_ms']:.2f}ms  "
+                    f"p95={r['p95_ms']:.2f}ms  p99={r['p99_ms']:.2f}ms  errors={r['errors']}"
+                )
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    artifact = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": args.base_url or "in-process",
+            "storage": args.storage,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "warmup": args.warmup,
+            "llm_latency_ms": args.llm_latency_ms,
+            "plan": asdict(plan),
+        },
+        "results": results,
+    }
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(artifact, indent=2))
+        print(f"\nWrote {args.out}")
+
+    if args.compare:
+        compare(artifact, json.loads(Path(args.compare).read_text()))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot API routes")
+    parser.add_argument("--scale", type=float, default=1.0, help="Dataset scale (1.0 = 100k users, 5k courses, 2M progress rows)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reseed", action="store_true", help="Drop and reseed even if a matching dataset exists")
+    parser.add_argument("--db-name", default="padho_aur_badho_bench")
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--storage", choices=["mongo", "memory"], default="mongo",
+                        help="memory runs the app on the in-process engine; the dataset is seeded on every run")
+    parser.add_argument("--base-url", default=None, help="Benchmark a running server instead of in-process")
+    parser.add_argument("--scenarios", default=None, help=f"Comma-separated subset of: {','.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--session-users", type=int, default=1000)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter", type=float, default=0.35)
+    parser.add_argument("--out", default=None, help="Write the JSON artifact here")
+    parser.add_argument("--compare", default=None, help="Baseline JSON artifact to diff against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
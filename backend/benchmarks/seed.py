@@ -0,0 +1,318 @@
+import random
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Iterator, List
+
+import bcrypt
+
+# Full-size volumes; --scale multiplies all of them
+FULL_USERS = 100_000
+FULL_COURSES = 5_000
+FULL_VIDEO_PROGRESS = 2_000_000
+LESSONS_PER_COURSE = 20
+QUESTIONS_PER_QUIZ = 10
+ENROLLMENTS_PER_STUDENT = 3
+QUIZ_RESULTS_PER_QUIZ = 50
+
+BENCH_PASSWORD = "bench-password"
+# Bumped whenever the document shape changes so stale datasets get reseeded
+SEED_FORMAT = 2  # 2: native BSON dates instead of ISO strings
+BATCH_SIZE = 10_000
+
+CATEGORIES = ["JEE", "NEET", "UPSC", "Class 10", "Class 12", "Programming", "Spoken English", "Banking"]
+LANGUAGES = ["English", "Hindi", "Tamil", "Bengali", "Marathi"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+SUBJECTS = [
+    "Physics", "Chemistry", "Biology", "Mathematics", "History", "Geography", "Polity",
+    "Economics", "Python", "JavaScript", "Grammar", "Reasoning", "Algebra", "Calculus",
+]
+ADJECTIVES = ["Complete", "Crash", "Foundation", "Advanced", "Essential", "Practical", "Rapid", "Mastery"]
+WORDS = [
+    "concepts", "problems", "revision", "practice", "theory", "examples", "notes", "formulas",
+    "chapters", "mock", "tests", "strategy", "basics", "applications", "numericals", "syllabus",
+]
+
+
+@dataclass
+class SeedPlan:
+    scale: float
+    seed: int
+    users: int
+    instructors: int
+    courses: int
+    quizzes: int
+    video_progress: int
+    session_users: int
+
+    @classmethod
+    def for_scale(cls, scale: float, seed: int = 42, session_users: int = 1000) -> "SeedPlan":
+        users = max(int(FULL_USERS * scale), 50)
+        courses = max(int(FULL_COURSES * scale), 10)
+        return cls(
+            scale=scale,
+            seed=seed,
+            users=users,
+            instructors=max(users // 200, 1),
+            courses=courses,
+            quizzes=max(courses // 2, 5),
+            video_progress=max(int(FULL_VIDEO_PROGRESS * scale), 1000),
+            session_users=min(session_users, users // 2),
+        )
+
+
+def user_id(i: int) -> str:
+    return f"bench-user-{i}"
+
+
+def user_email(i: int) -> str:
+    return f"user{i}@bench.local"
+
+
+def course_id(i: int) -> str:
+    return f"bench-course-{i}"
+
+
+def lesson_id(c: int, j: int) -> str:
+    return f"bench-lesson-{c}-{j}"
+
+
+def quiz_id(q: int) -> str:
+    return f"bench-quiz-{q}"
+
+
+def question_id(q: int, k: int) -> str:
+    return f"bench-question-{q}-{k}"
+
+
+def session_token(i: int) -> str:
+    return f"bench-session-{i}"
+
+
+def student_index(plan: SeedPlan, i: int) -> int:
+    # Students follow the instructors in the user id space
+    return plan.instructors + i
+
+
+def _batches(docs: Iterator[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _users(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    # One bcrypt hash shared by every user keeps seeding fast while logins still pay full cost
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    for i in range(plan.users):
+        yield {
+            "id": user_id(i),
+            "email": user_email(i),
+            "name": f"Bench User {i}",
+            "picture": None,
+            "password_hash": password_hash,
+            "role": "instructor" if i < plan.instructors else "student",
+            "created_at": now - timedelta(days=rng.randint(0, 720)),
+        }
+
+
+def _courses(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    for c in range(plan.courses):
+        subject = rng.choice(SUBJECTS)
+        instructor = c % plan.instructors
+        yield {
+            "id": course_id(c),
+            "title": f"{rng.choice(ADJECTIVES)} {subject} {c}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(40)) + f" {subject.lower()}",
+            "category": rng.choice(CATEGORIES),
+            "language": rng.choice(LANGUAGES),
+            "instructor_id": user_id(instructor),
+            "instructor_name": f"Bench User {instructor}",
+            "thumbnail": None,
+            "intro_video": None,
+            "syllabus": "\n".join(f"Week {w}: {rng.choice(WORDS)} {rng.choice(WORDS)}" for w in range(1, 9)),
+            "price": rng.choice([0.0, 499.0, 999.0, 1999.0]),
+            "rating": round(rng.uniform(3.0, 5.0), 2),
+            "total_ratings": rng.randint(0, 2000),
+            "level": rng.choice(LEVELS),
+            "duration": f"{rng.randint(2, 16)} weeks",
+            "tags": rng.sample(WORDS, 3),
+            "prerequisites": [],
+            "total_enrollments": rng.randint(0, 50_000),
+            "created_at": now - timedelta(days=rng.randint(0, 720)),
+        }
+
+
+def _lessons(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    for c in range(plan.courses):
+        for j in range(LESSONS_PER_COURSE):
+            yield {
+                "id": lesson_id(c, j),
+                "course_id": course_id(c),
+                "title": f"Lesson {j + 1}: {rng.choice(WORDS)}",
+                "description": " ".join(rng.choice(WORDS) for _ in range(20)),
+                "video_url": None,
+                "order": j,
+                "duration": f"{rng.randint(5, 45)} min",
+                "resources": [],
+                "created_at": now,
+            }
+
+
+def _quizzes(plan: SeedPlan, now: datetime) -> Iterator[dict]:
+    for q in range(plan.quizzes):
+        yield {
+            "id": quiz_id(q),
+            "course_id": course_id(q % plan.courses),
+            "title": f"Quiz {q}",
+            "duration": 30,
+            "total_marks": QUESTIONS_PER_QUIZ,
+            "negative_marking": False,
+            "created_at": now,
+        }
+
+
+def _questions(plan: SeedPlan) -> Iterator[dict]:
+    for q in range(plan.quizzes):
+        for k in range(QUESTIONS_PER_QUIZ):
+            yield {
+                "id": question_id(q, k),
+                "quiz_id": quiz_id(q),
+                "question_text": f"Question {k} of quiz {q}?",
+                "type": "mcq",
+                "options": ["A", "B", "C", "D"],
+                "correct_answer": "ABCD"[k % 4],
+                "marks": 1,
+            }
+
+
+def _quiz_results(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    students = plan.users - plan.instructors
+    for q in range(plan.quizzes):
+        for r in range(QUIZ_RESULTS_PER_QUIZ):
+            yield {
+                "id": f"bench-result-{q}-{r}",
+                "user_id": user_id(student_index(plan, rng.randrange(students))),
+                "quiz_id": quiz_id(q),
+                "score": float(rng.randint(0, 100)),
+                "answers": {},
+                "completed_at": now - timedelta(minutes=rng.randint(0, 100_000)),
+            }
+
+
+def enrolled_course(plan: SeedPlan, student: int, k: int) -> int:
+    return (student * 7 + k * 13) % plan.courses
+
+
+def _enrollments(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    students = plan.users - plan.instructors
+    for s in range(students):
+        for k in range(ENROLLMENTS_PER_STUDENT):
+            yield {
+                "id": f"bench-enrollment-{s}-{k}",
+                "user_id": user_id(student_index(plan, s)),
+                "course_id": course_id(enrolled_course(plan, s, k)),
+                "progress": float(rng.choice([0, 10, 25, 50, 75, 100])),
+                "last_watched_lesson_id": None,
+                "enrolled_at": now - timedelta(days=rng.randint(0, 365)),
+            }
+
+
+def _video_progress(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    # Round-robin over students so each (user, lesson) pair is unique
+    students = plan.users - plan.instructors
+    per_student = ENROLLMENTS_PER_STUDENT * LESSONS_PER_COURSE
+    for n in range(plan.video_progress):
+        s = n % students
+        slot = (n // students) % per_student
+        c = enrolled_course(plan, s, slot // LESSONS_PER_COURSE)
+        total = float(rng.randint(300, 2700))
+        watched = rng.uniform(0, total)
+        yield {
+            "id": f"bench-progress-{n}",
+            "user_id": user_id(student_index(plan, s)),
+            "lesson_id": lesson_id(c, slot % LESSONS_PER_COURSE),
+            "progress_seconds": watched,
+            "total_seconds": total,
+            "completed": watched >= total * 0.9,
+            "last_watched": now - timedelta(minutes=rng.randint(0, 100_000)),
+        }
+
+
+def _study_materials(plan: SeedPlan, rng: random.Random, now: datetime) -> Iterator[dict]:
+    for m in range(max(plan.courses // 2, 5)):
+        subject = rng.choice(SUBJECTS)
+        yield {
+            "id": f"bench-material-{m}",
+            "title": f"{subject} {rng.choice(WORDS)} notes {m}",
+            "file_url": f"https://files.bench.local/materials/{m}.pdf",
+            "category": rng.choice(CATEGORIES),
+            "tags": rng.sample(WORDS, 3),
+            "chapter": f"Chapter {rng.randint(1, 20)}",
+            "uploaded_by": user_id(m % plan.instructors),
+            "preview_available": rng.random() < 0.3,
+            "downloads": rng.randint(0, 5000),
+            "created_at": now - timedelta(days=rng.randint(0, 720)),
+        }
+
+
+def _sessions(plan: SeedPlan, now: datetime) -> Iterator[dict]:
+    for i in range(plan.session_users):
+        yield {
+            "user_id": user_id(student_index(plan, i)),
+            "session_token": session_token(i),
+            "expires_at": now + timedelta(days=30),
+            "created_at": now,
+        }
+
+
+COLLECTIONS = [
+    "users", "courses", "lessons", "quizzes", "questions", "quiz_results",
+    "enrollments", "video_progress", "user_sessions",
+]
+
+
+def documents(plan: SeedPlan, rng: random.Random, now: datetime) -> Dict[str, Iterator[dict]]:
+    # Lazy generators sharing one rng; consume them in this order for reproducible data
+    return {
+        "users": _users(plan, rng, now),
+        "courses": _courses(plan, rng, now),
+        "lessons": _lessons(plan, rng, now),
+        "quizzes": _quizzes(plan, now),
+        "questions": _questions(plan),
+        "quiz_results": _quiz_results(plan, rng, now),
+        "enrollments": _enrollments(plan, rng, now),
+        "video_progress": _video_progress(plan, rng, now),
+        "user_sessions": _sessions(plan, now),
+        "study_materials": _study_materials(plan, rng, now),
+    }
+
+
+async def seed_database(db, plan: SeedPlan, reseed: bool = False, log=print) -> bool:
+    marker = await db.bench_meta.find_one({"_id": "seed"})
+    if marker and not reseed and marker.get("plan") == asdict(plan) and marker.get("format") == SEED_FORMAT:
+        log(f"Reusing seeded dataset (scale={plan.scale}, seed={plan.seed})")
+        return False
+
+    for name in COLLECTIONS + ["bench_meta"]:
+        await db[name].drop()
+
+    rng = random.Random(plan.seed)
+    now = datetime.now(timezone.utc)
+    generators = documents(plan, rng, now)
+
+    for name in COLLECTIONS:
+        docs = generators[name]
+        start = time.perf_counter()
+        count = 0
+        for batch in _batches(docs):
+            await db[name].insert_many(batch, ordered=False)
+            count += len(batch)
+        log(f"Seeded {count:>10,} {name} in {time.perf_counter() - start:.1f}s")
+
+    await db.bench_meta.insert_one({"_id": "seed", "plan": asdict(plan), "format": SEED_FORMAT, "seeded_at": now})
+    return True
@@ -0,0 +1,367 @@
+"""Bulk NDJSON import/export for catalogue data.
+
+Run from the backend directory:
+
+    python bulk_data.py export dump/ --collections courses,lessons --gzip
+    python bulk_data.py import dump/ --batch-size 2000 --writers 4
+    python bulk_data.py generate synthetic/ --scale 0.5
+
+Each collection is one `<collection>.ndjson` (or `.ndjson.gz`) file and all
+collections run as parallel pipelines. Imports validate every line against
+the server's pydantic models, write in batches, and checkpoint progress in
+`bulk_import_checkpoints`, so an interrupted import resumes where it stopped.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from server import Course, Lesson, Question, Quiz, StudyMaterial, User  # noqa: E402
+from benchmarks import seed as seeding  # noqa: E402
+
+# Quizzes ride along because questions are meaningless without them
+MODELS = {
+    "users": User,
+    "courses": Course,
+    "lessons": Lesson,
+    "quizzes": Quiz,
+    "questions": Question,
+    "study_materials": StudyMaterial,
+}
+
+SECRET_FIELDS = {"users": ["password_hash"]}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_lines(docs: List[dict]) -> str:
+    return "".join(json.dumps(doc, default=_json_default, ensure_ascii=False) + "\n" for doc in docs)
+
+
+def data_path(directory: Path, name: str, compressed: bool) -> Path:
+    return directory / f"{name}.ndjson{'.gz' if compressed else ''}"
+
+
+def open_text(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def find_data_file(directory: Path, name: str) -> Optional[Path]:
+    for compressed in (False, True):
+        path = data_path(directory, name, compressed)
+        if path.exists():
+            return path
+    return None
+
+
+def selected_collections(args) -> List[str]:
+    names = args.collections.split(",") if args.collections else list(MODELS)
+    unknown = [n for n in names if n not in MODELS]
+    if unknown:
+        raise SystemExit(f"Unknown collections: {', '.join(unknown)}")
+    return names
+
+
+class Progress:
+    def __init__(self, name: str, every: float = 5.0):
+        self.name = name
+        self.every = every
+        self.count = 0
+        self.started = time.monotonic()
+        self._last = self.started
+
+    def add(self, n: int, force: bool = False):
+        self.count += n
+        now = time.monotonic()
+        if force or now - self._last >= self.every:
+            self._last = now
+            rate = self.count / max(now - self.started, 1e-9)
+            print(f"  {self.name}: {self.count:,} documents ({rate:,.0f}/s)")
+
+
+# ==================== EXPORT ====================
+
+async def export_collection(db, name: str, out_dir: Path, args) -> int:
+    path = data_path(out_dir, name, args.gzip)
+    # Keep the .gz suffix last; open_text picks compression from it
+    tmp = path.with_name(f"{path.stem}.tmp{path.suffix}")
+    projection = {"_id": 0}
+    if not args.include_secrets:
+        projection.update({field: 0 for field in SECRET_FIELDS.get(name, [])})
+
+    progress = Progress(name)
+    cursor = db[name].find({}, projection).sort("_id", 1).batch_size(args.batch_size)
+    handle = await asyncio.to_thread(open_text, tmp, "w")
+    try:
+        while True:
+            batch = await cursor.to_list(args.batch_size)
+            if not batch:
+                break
+            # Encoding and (g)zip writes are CPU and disk work; keep the fetch loop free
+            await asyncio.to_thread(lambda b=batch: handle.write(encode_lines(b)))
+            progress.add(len(batch))
+    finally:
+        await asyncio.to_thread(handle.close)
+    os.replace(tmp, path)
+    progress.add(0, force=True)
+    return progress.count
+
+
+# ==================== IMPORT ====================
+
+def read_batch(handle, size: int) -> List[str]:
+    lines = []
+    for line in handle:
+        lines.append(line)
+        if len(lines) >= size:
+            break
+    return lines
+
+
+def validate_lines(model, lines: List[str], first_line: int) -> Tuple[List[Tuple[dict, dict]], List[dict]]:
+    docs, rejects = [], []
+    for offset, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            record = model.model_validate_json(line)
+        except ValidationError as e:
+            rejects.append({"line": first_line + offset + 1, "errors": e.errors(include_url=False), "raw": line.rstrip("\n")})
+            continue
+        # Fields present in the file overwrite; defaults only fill new documents
+        docs.append((record.model_dump(), record.model_dump(exclude_unset=True)))
+    return docs, rejects
+
+
+def build_ops(docs: List[Tuple[dict, dict]]) -> List[UpdateOne]:
+    ops = []
+    for full, explicit in docs:
+        defaults = {k: v for k, v in full.items() if k not in explicit}
+        update = {"$set": explicit}
+        if defaults:
+            update["$setOnInsert"] = defaults
+        ops.append(UpdateOne({"id": full["id"]}, update, upsert=True))
+    return ops
+
+
+async def write_batch(collection, docs: List[Tuple[dict, dict]], mode: str) -> Tuple[int, int]:
+    # Returns (written, skipped)
+    if mode == "insert":
+        try:
+            result = await collection.insert_many([full for full, _ in docs], ordered=False)
+            return len(result.inserted_ids), 0
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            # Already imported by an earlier, interrupted run
+            return e.details.get("nInserted", 0), len(errors)
+    result = await collection.bulk_write(build_ops(docs), ordered=False)
+    return result.upserted_count + result.modified_count, result.matched_count - result.modified_count
+
+
+async def import_collection(db, name: str, path: Path, args) -> Dict[str, int]:
+    model = MODELS[name]
+    collection = db[name]
+    # Upserts match on the application id; without an index every one is a scan
+    await collection.create_index("id")
+
+    stat = path.stat()
+    checkpoint_id = f"{name}:{path.name}:{stat.st_size}:{int(stat.st_mtime)}"
+    checkpoint = None if args.restart else await db.bulk_import_checkpoints.find_one({"_id": checkpoint_id})
+    if checkpoint and checkpoint.get("done"):
+        print(f"{name}: {path.name} already imported")
+        return {"written": 0, "skipped": 0, "rejected": 0}
+    start_line = checkpoint["lines_done"] if checkpoint else 0
+    if start_line:
+        print(f"{name}: resuming {path.name} after line {start_line:,}")
+
+    stats = {"written": 0, "skipped": 0, "rejected": 0}
+    progress = Progress(name)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.writers * 2)
+    rejects_path = path.with_name(f"{path.name}.rejects.ndjson")
+    rejects_handle = None
+
+    async def reader():
+        nonlocal rejects_handle
+        handle = await asyncio.to_thread(open_text, path, "r")
+        try:
+            line_no = 0
+            while line_no < start_line:
+                skipped = await asyncio.to_thread(read_batch, handle, min(args.batch_size * 10, start_line - line_no))
+                if not skipped:
+                    break
+                line_no += len(skipped)
+            batch_no = 0
+            while True:
+                lines = await asyncio.to_thread(read_batch, handle, args.batch_size)
+                if not lines:
+                    break
+                docs, rejects = await asyncio.to_thread(validate_lines, model, lines, line_no)
+                if rejects:
+                    if rejects_handle is None:
+                        rejects_handle = open(rejects_path, "a", encoding="utf-8")
+                    rejects_handle.write(encode_lines(rejects))
+                    stats["rejected"] += len(rejects)
+                line_no += len(lines)
+                await queue.put((batch_no, line_no, docs))
+                batch_no += 1
+        finally:
+            await asyncio.to_thread(handle.close)
+            for _ in range(args.writers):
+                await queue.put(None)
+
+    # Batches finish out of order; the checkpoint only advances over a contiguous prefix
+    finished: Dict[int, int] = {}
+    next_batch = 0
+
+    async def writer():
+        nonlocal next_batch
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            batch_no, end_line, docs = item
+            if docs:
+                written, skipped = await write_batch(collection, docs, args.mode)
+                stats["written"] += written
+                stats["skipped"] += skipped
+                progress.add(len(docs))
+            finished[batch_no] = end_line
+            watermark = None
+            while next_batch in finished:
+                watermark = finished.pop(next_batch)
+                next_batch += 1
+            if watermark is not None:
+                await db.bulk_import_checkpoints.update_one(
+                    {"_id": checkpoint_id},
+                    {"$max": {"lines_done": watermark}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+                    upsert=True
+                )
+
+    try:
+        await asyncio.gather(reader(), *[writer() for _ in range(args.writers)])
+    finally:
+        if rejects_handle is not None:
+            rejects_handle.close()
+
+    await db.bulk_import_checkpoints.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"done": True, "finished_at": datetime.now(timezone.utc), **stats}},
+        upsert=True
+    )
+    progress.add(0, force=True)
+    print(f"{name}: {stats['written']:,} written, {stats['skipped']:,} unchanged, {stats['rejected']:,} rejected")
+    if stats["rejected"]:
+        print(f"  rejected lines saved to {rejects_path}")
+    return stats
+
+
+# ==================== GENERATE ====================
+
+def generate(args):
+    # Synthetic data at the benchmark seeder's volumes, written as importable NDJSON
+    out_dir = Path(args.directory)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    names = selected_collections(args)
+    plan = seeding.SeedPlan.for_scale(args.scale, seed=args.seed)
+    generators = seeding.documents(plan, random.Random(args.seed), datetime.now(timezone.utc))
+
+    for name in generators:
+        if name not in names:
+            continue
+        path = data_path(out_dir, name, args.gzip)
+        progress = Progress(name)
+        with open_text(path, "w") as handle:
+            for batch in seeding._batches(generators[name], args.batch_size):
+                handle.write(encode_lines(batch))
+                progress.add(len(batch))
+        progress.add(0, force=True)
+        print(f"{name}: wrote {path}")
+
+
+async def run(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url or os.environ['MONGO_URL'], tz_aware=True)
+    db = client[args.db_name or os.environ['DB_NAME']]
+    directory = Path(args.directory)
+    names = selected_collections(args)
+    started = time.monotonic()
+    try:
+        if args.command == "export":
+            directory.mkdir(parents=True, exist_ok=True)
+            await asyncio.gather(*[export_collection(db, name, directory, args) for name in names])
+        else:
+            files = {name: find_data_file(directory, name) for name in names}
+            missing = [name for name, path in files.items() if path is None]
+            if args.collections and missing:
+                raise SystemExit(f"No NDJSON file for: {', '.join(missing)}")
+            await asyncio.gather(*[
+                import_collection(db, name, path, args) for name, path in files.items() if path is not None
+            ])
+    finally:
+        client.close()
+    print(f"Done in {time.monotonic() - started:.1f}s")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk NDJSON import/export for catalogue collections")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p):
+        p.add_argument("directory", help="Directory holding <collection>.ndjson[.gz] files")
+        p.add_argument("--collections", default=None, help=f"Comma-separated subset of {', '.join(MODELS)}")
+        p.add_argument("--batch-size", type=int, default=1000)
+
+    def database(p):
+        p.add_argument("--mongo-url", default=None)
+        p.add_argument("--db-name", default=None)
+
+    export = sub.add_parser("export", help="Write collections out as NDJSON")
+    common(export)
+    database(export)
+    export.add_argument("--gzip", action="store_true")
+    export.add_argument("--include-secrets", action="store_true", help="Keep password hashes in the users export")
+
+    load = sub.add_parser("import", help="Validate and load NDJSON files")
+    common(load)
+    database(load)
+    load.add_argument("--writers", type=int, default=4, help="Concurrent write batches per collection")
+    load.add_argument("--mode", choices=["upsert", "insert"], default="upsert",
+                      help="upsert matches on id (idempotent); insert is faster into empty collections")
+    load.add_argument("--restart", action="store_true", help="Ignore saved checkpoints")
+
+    synth = sub.add_parser("generate", help="Write a synthetic dataset as NDJSON")
+    common(synth)
+    synth.add_argument("--scale", type=float, default=0.01, help="Fraction of the full-size benchmark dataset")
+    synth.add_argument("--seed", type=int, default=42)
+    synth.add_argument("--gzip", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "generate":
+        generate(args)
+    else:
+        asyncio.run(run(args))
@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Fields copied out of changed documents so caches can be tagged by the
+# application ids they are keyed on (documentKey only carries _id)
+TAGGED_FIELDS = ("id", "course_id", "quiz_id", "user_id", "session_token")
+
+# Change stream events after which nothing about the collection can be trusted
+_RESET_OPERATIONS = {"drop", "dropDatabase", "rename", "invalidate"}
+
+# Resume token no longer in the oplog
+_CHANGE_STREAM_HISTORY_LOST = 286
+
+
+def doc_tag(collection: str, field_name: str, value: Any) -> str:
+    return f"{collection}/{field_name}/{value}"
+
+
+@dataclass
+class InvalidationEvent:
+    collection: str
+    operation: str  # insert, update, replace, delete, or a reset operation
+    document_id: Any = None
+    fields: Dict[str, Any] = field(default_factory=dict)
+    cluster_time: Optional[float] = None
+
+    @property
+    def is_reset(self) -> bool:
+        return self.operation in _RESET_OPERATIONS
+
+    def tags(self) -> List[str]:
+        tags = [self.collection]
+        if self.document_id is not None:
+            tags.append(doc_tag(self.collection, "_id", self.document_id))
+        for name, value in self.fields.items():
+            tags.append(doc_tag(self.collection, name, value))
+        return tags
+
+    @classmethod
+    def from_change(cls, change: Dict[str, Any]) -> "InvalidationEvent":
+        full_document = change.get("fullDocument") or {}
+        cluster_time = change.get("clusterTime")
+        return cls(
+            collection=change.get("ns", {}).get("coll", ""),
+            operation=change["operationType"],
+            document_id=(change.get("documentKey") or {}).get("_id"),
+            fields={k: full_document[k] for k in TAGGED_FIELDS if full_document.get(k) is not None},
+            cluster_time=cluster_time.time if cluster_time is not None else None,
+        )
+
+
+class LocalCache:
+    # Bounded LRU cache whose entries carry invalidation tags. While the bus
+    # is healthy entries live for `ttl`; when it is down or lagging they fall
+    # back to the much shorter `fallback_ttl`.
+
+    def __init__(self, name: str, ttl: float, fallback_ttl: float, maxsize: int = 10_000):
+        self.name = name
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.maxsize = maxsize
+        self.bus: Optional["InvalidationBus"] = None
+        self._entries: "OrderedDict[Any, Tuple[Any, float, Tuple[str, ...]]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _max_age(self) -> float:
+        if self.bus is not None and self.bus.healthy:
+            return self.ttl
+        return self.fallback_ttl
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, stored_at, _ = entry
+        if time.monotonic() - stored_at > self._max_age():
+            self._remove(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any, tags: Iterable[str] = ()):
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (value, time.monotonic(), tags)
+        for tag in tags:
+            self._by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Any):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def invalidate(self, key: Any):
+        if key in self._entries:
+            self.invalidations += 1
+            self._remove(key)
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in list(self._by_tag.get(tag, ())):
+                self.invalidations += 1
+                self._remove(key)
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_tag.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "max_age": self._max_age(),
+        }
+
+
+class InvalidationBus:
+    # Tails one change stream over the watched collections and fans typed
+    # invalidation events out to registered caches and handlers. The resume
+    # token is kept in memory so a dropped stream reconnects where it stopped;
+    # a restarted worker starts with empty caches and needs none. Whenever
+    # continuity is lost every cache is cleared instead.
+
+    def __init__(
+        self,
+        collections: List[str],
+        bus_id: str,
+        max_lag_seconds: float = 5.0,
+        heartbeat_ms: int = 1000,
+    ):
+        self.collections = collections
+        self.bus_id = bus_id
+        self.max_lag_seconds = max_lag_seconds
+        self.heartbeat_ms = heartbeat_ms
+        self.caches: List[LocalCache] = []
+        self.handlers: List[Callable[[InvalidationEvent], Any]] = []
+        self.events_seen = 0
+        self._connected = False
+        self._last_heartbeat = 0.0
+        self._lag = 0.0
+        self._resume_token = None
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, cache: LocalCache) -> LocalCache:
+        cache.bus = self
+        self.caches.append(cache)
+        return cache
+
+    def subscribe(self, handler: Callable[[InvalidationEvent], Any]):
+        self.handlers.append(handler)
+
+    @property
+    def healthy(self) -> bool:
+        if not self._connected or self._lag > self.max_lag_seconds:
+            return False
+        # A stream that stopped returning (even empty) batches is as bad as a lagging one
+        heartbeat_window = self.heartbeat_ms / 1000.0 + self.max_lag_seconds
+        return time.monotonic() - self._last_heartbeat <= heartbeat_window
+
+    def publish(self, event: InvalidationEvent):
+        self.events_seen += 1
+        if event.is_reset:
+            self.clear_all()
+        else:
+            tags = event.tags()
+            for cache in self.caches:
+                cache.invalidate_tags(tags)
+        for handler in self.handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Invalidation handler error: {e}")
+
+    def clear_all(self):
+        for cache in self.caches:
+            cache.clear()
+
+    def start(self, db):
+        self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._connected = False
+
+    def _pipeline(self) -> List[Dict[str, Any]]:
+        project = {
+            "operationType": 1,
+            "ns": 1,
+            "documentKey": 1,
+            "clusterTime": 1,
+        }
+        for name in TAGGED_FIELDS:
+            project[f"fullDocument.{name}"] = 1
+        return [
+            {"$match": {"ns.coll": {"$in": self.collections}}},
+            {"$project": project},
+        ]
+
+    async def _run(self, db):
+        backoff = 1.0
+        while True:
+            try:
+                await self._consume(db)
+                backoff = 1.0
+            except OperationFailure as e:
+                self._connected = False
+                if e.code == _CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Invalidation bus resume token expired; starting fresh")
+                    self._resume_token = None
+                else:
+                    # Standalone servers have no change streams; caches run on TTL only
+                    logger.warning(f"Invalidation bus unavailable: {e}")
+            except PyMongoError as e:
+                self._connected = False
+                logger.warning(f"Invalidation bus stream error: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    async def _consume(self, db):
+        resuming = self._resume_token is not None
+        async with db.watch(
+            self._pipeline(),
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=self.heartbeat_ms,
+        ) as stream:
+            if not resuming:
+                # Nothing guarantees we saw every write before this point
+                self.clear_all()
+            self._connected = True
+            while stream.alive:
+                change = await stream.try_next()
+                self._last_heartbeat = time.monotonic()
+                if change is not None:
+                    event = InvalidationEvent.from_change(change)
+                    if event.cluster_time is not None:
+                        self._lag = max(time.time() - event.cluster_time, 0.0)
+                    self.publish(event)
+                else:
+                    self._lag = 0.0
+                self._resume_token = stream.resume_token
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bus_id": self.bus_id,
+            "healthy": self.healthy,
+            "connected": self._connected,
+            "lag_seconds": round(self._lag, 3),
+            "events_seen": self.events_seen,
+            "caches": [cache.stats() for cache in self.caches],
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+from starlette.responses import Response
+
+# Bump whenever the layout changes; cached artifacts are keyed by it, so old
+# renders are simply never looked up again
+TEMPLATE_VERSION = "1"
+
+CERTIFICATE_FORMATS = {"pdf": "application/pdf", "png": "image/png"}
+
+_PAGE_SIZE = (2339, 1654)  # A4 landscape at 200 dpi
+_DPI = 200
+_INK = (33, 37, 41)
+_ACCENT = (13, 110, 253)
+_MUTED = (108, 117, 125)
+_FONT_CANDIDATES = (
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+)
+
+
+def _font(size: int):
+    custom = os.environ.get("CERTIFICATE_FONT")
+    for candidate in ((custom,) if custom else ()) + _FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def _centered(draw: ImageDraw.ImageDraw, y: int, text: str, size: int, fill) -> int:
+    font = _font(size)
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    # Shrink overly long course titles until they fit inside the border
+    while right - left > _PAGE_SIZE[0] - 400 and size > 24:
+        size -= 4
+        font = _font(size)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    draw.text(((_PAGE_SIZE[0] - (right - left)) / 2 - left, y), text, font=font, fill=fill)
+    return y + (bottom - top)
+
+
+def render_certificate(data: Mapping[str, str], fmt: str) -> bytes:
+    # Runs in a worker process: everything it needs arrives in `data`
+    image = Image.new("RGB", _PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    width, height = _PAGE_SIZE
+    draw.rectangle((60, 60, width - 60, height - 60), outline=_ACCENT, width=12)
+    draw.rectangle((100, 100, width - 100, height - 100), outline=_MUTED, width=3)
+
+    y = _centered(draw, 260, "CERTIFICATE OF COMPLETION", 96, _ACCENT) + 120
+    y = _centered(draw, y, "This certifies that", 48, _MUTED) + 70
+    y = _centered(draw, y, data["student_name"], 120, _INK) + 90
+    y = _centered(draw, y, "has successfully completed", 48, _MUTED) + 70
+    y = _centered(draw, y, data["course_title"], 80, _INK) + 60
+    if data.get("instructor_name"):
+        y = _centered(draw, y, f"Instructor: {data['instructor_name']}", 44, _MUTED) + 40
+
+    _centered(draw, height - 330, f"Issued {data['issued_on']}", 44, _INK)
+    _centered(draw, height - 250, f"Certificate ID {data['certificate_id']}", 36, _MUTED)
+
+    out = io.BytesIO()
+    if fmt == "pdf":
+        image.save(out, "PDF", resolution=_DPI)
+    else:
+        image.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+class CertificateStore:
+    # Rendered artifacts on local disk keyed by (user, course, template
+    # version). Rendering happens in a small process pool so the event loop
+    # never runs Pillow; concurrent requests for the same artifact share one render.
+
+    def __init__(self, directory: str, max_workers: int = 2):
+        self.directory = Path(directory)
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[Path, asyncio.Future] = {}
+        self.rendered = 0
+        self.hits = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that holds Motor's threads and sockets is not safe
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def path(self, user_id: str, course_id: str, fmt: str) -> Path:
+        digest = hashlib.sha256(f"{user_id}\x00{course_id}".encode("utf-8")).hexdigest()
+        return self.directory / f"v{TEMPLATE_VERSION}" / digest[:2] / f"{digest}.{fmt}"
+
+    async def get(self, user_id: str, course_id: str, fmt: str, data: Mapping[str, str]) -> Path:
+        path = self.path(user_id, course_id, fmt)
+        if path.exists():
+            self.hits += 1
+            return path
+        pending = self._inflight.get(path)
+        if pending is None:
+            pending = asyncio.ensure_future(self._render(path, fmt, dict(data)))
+            self._inflight[path] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(path, None))
+        return await asyncio.shield(pending)
+
+    async def _render(self, path: Path, fmt: str, data: Dict[str, str]) -> Path:
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(self._executor(), render_certificate, data, fmt)
+        await asyncio.to_thread(self._write, path, body)
+        self.rendered += 1
+        return path
+
+    @staticmethod
+    def _write(path: Path, body: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a half-written file
+        tmp = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, path)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"rendered": self.rendered, "hits": self.hits, "inflight": len(self._inflight)}
+
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Single ranges only; anything fancier gets the whole file, which is allowed
+    match = _RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        return (max(size - length, 0), size - 1) if length else (size, size)
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    return first, last
+
+
+async def file_response(request_headers: Mapping[str, str], path: Path, media_type: str, filename: str) -> Response:
+    stat = await asyncio.to_thread(path.stat)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": f'inline; filename="{filename}"',
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif "if-modified-since" in request_headers:
+        try:
+            if modified <= parsedate_to_datetime(request_headers["if-modified-since"]):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    body = await asyncio.to_thread(path.read_bytes)
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, len(body))
+        if byte_range is not None:
+            first, last = byte_range
+            if first >= len(body) or first > last:
+                headers["Content-Range"] = f"bytes */{len(body)}"
+                return Response(status_code=416, headers=headers)
+            headers["Content-Range"] = f"bytes {first}-{last}/{len(body)}"
+            return Response(body[first:last + 1], status_code=206, media_type=media_type, headers=headers)
+
+    return Response(body, media_type=media_type, headers=headers)
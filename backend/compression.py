@@ -0,0 +1,249 @@
+import asyncio
+import os
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+_ENCODERS = {"gzip": _GzipEncoder, "br": _BrotliEncoder, "zstd": _ZstdEncoder}
+
+
+class CompressionConfig:
+    def __init__(
+        self,
+        minimum_size: int = 1024,
+        levels: Optional[Dict[str, int]] = None,
+        precompress_levels: Optional[Dict[str, int]] = None,
+    ):
+        self.minimum_size = minimum_size
+        # Per-request levels favour speed; bodies compressed once for the cache can afford more
+        self.levels = {"zstd": 3, "br": 4, "gzip": 6, **(levels or {})}
+        self.precompress_levels = {"zstd": 12, "br": 9, "gzip": 9, **(precompress_levels or {})}
+        # Server preference when the client weights encodings equally
+        self.encodings: List[str] = [
+            name for name, available in (("zstd", zstandard), ("br", brotli), ("gzip", zlib)) if available
+        ]
+
+    @classmethod
+    def from_env(cls) -> "CompressionConfig":
+        return cls(
+            minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+            levels={
+                "gzip": int(os.environ.get('GZIP_LEVEL', '6')),
+                "br": int(os.environ.get('BROTLI_QUALITY', '4')),
+                "zstd": int(os.environ.get('ZSTD_LEVEL', '3')),
+            },
+        )
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        weights: Dict[str, float] = {}
+        for part in accept_encoding.split(","):
+            token, _, params = part.strip().partition(";")
+            token = token.strip().lower()
+            if not token:
+                continue
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            weights[token] = q
+
+        best, best_q = None, 0.0
+        for name in self.encodings:
+            q = weights.get(name, weights.get("*", 0.0))
+            if q > best_q:
+                best, best_q = name, q
+        return best
+
+    def encoder(self, encoding: str, precompress: bool = False):
+        levels = self.precompress_levels if precompress else self.levels
+        return _ENCODERS[encoding](levels[encoding])
+
+    def compress(self, encoding: str, data: bytes, precompress: bool = False) -> bytes:
+        enc = self.encoder(encoding, precompress)
+        return enc.compress(data) + enc.finish()
+
+    def payload(self, body: bytes, media_type: str = "application/json") -> "PrecompressedPayload":
+        return PrecompressedPayload(self, body, media_type)
+
+
+def _compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class PrecompressedPayload:
+    # A serialized response body kept in a cache together with its compressed
+    # variants, so repeated hits skip both serialization and compression
+
+    def __init__(self, config: CompressionConfig, body: bytes, media_type: str):
+        self.config = config
+        self.body = body
+        self.media_type = media_type
+        self._variants: Dict[str, bytes] = {}
+
+    async def response(self, accept_encoding: str) -> Response:
+        encoding = self.config.negotiate(accept_encoding)
+        headers = {"Vary": "Accept-Encoding"}
+        if encoding is None or len(self.body) < self.config.minimum_size:
+            return Response(self.body, media_type=self.media_type, headers=headers)
+
+        variant = self._variants.get(encoding)
+        if variant is None:
+            # High-level compression of a large body would stall the event loop
+            variant = await asyncio.to_thread(self.config.compress, encoding, self.body, True)
+            self._variants[encoding] = variant
+        headers["Content-Encoding"] = encoding
+        return Response(variant, media_type=self.media_type, headers=headers)
+
+
+class CompressionMiddleware:
+    # Negotiated gzip/brotli/zstd compression. Single-message bodies below the
+    # minimum size pass through untouched; streaming bodies are compressed
+    # chunk by chunk and flushed so nothing is buffered. Responses that
+    # already carry a Content-Encoding (e.g. precompressed payloads) are left alone.
+
+    def __init__(self, app, config: CompressionConfig):
+        self.app = app
+        self.config = config
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.config.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressionResponder(self.config, encoding, send).run(self.app, scope, receive)
+
+
+class _CompressionResponder:
+    def __init__(self, config: CompressionConfig, encoding: str, send):
+        self.config = config
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def run(self, app, scope, receive):
+        await app(scope, receive, self.send_wrapper)
+
+    async def send_wrapper(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the headers until the first body chunk tells us how to respond
+            self.start_message = message
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            if (
+                "content-encoding" in headers
+                or start["status"] < 200
+                or start["status"] in (204, 304)
+                or not _compressible(headers.get("content-type"))
+                or (not more_body and len(body) < self.config.minimum_size)
+            ):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.encoder = self.config.encoder(self.encoding)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                data = self.encoder.compress(body) + self.encoder.flush()
+            else:
+                data = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(data))
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if more_body:
+            data = self.encoder.compress(body) + self.encoder.flush()
+        else:
+            data = self.encoder.compress(body) + self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
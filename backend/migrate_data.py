@@ -0,0 +1,182 @@
+"""One-off data migrations, run explicitly rather than on worker startup.
+
+Run from the backend directory:
+
+    python migrate_data.py status
+    python migrate_data.py dedupe-enrollments --dry-run
+    python migrate_data.py dedupe-enrollments
+    python migrate_data.py backfill-helpful-counts
+    python migrate_data.py backfill-blog-excerpts
+    python migrate_data.py purge-legacy-sessions
+    python migrate_data.py drop-cache-bus-state
+
+Every change is printed as it is made, and each finished run is recorded in
+`migration_checkpoints`. Migrations are safe to re-run: a second run finds
+nothing left to do.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from server import blog_excerpt  # noqa: E402
+
+CHECKPOINT_PREFIX = "migrate_data"
+
+
+async def dedupe_enrollments(db, args) -> Dict[str, int]:
+    # Enrollments retried before the unique (user_id, course_id) key existed.
+    # The most advanced copy is kept. Removed copies are archived to
+    # enrollment_duplicates, and idempotent payment replays that handed out
+    # a removed id are pointed at the surviving one.
+    stats = {"groups": 0, "removed": 0, "courses": 0}
+    affected = set()
+    async for group in db.enrollments.aggregate([
+        {"$sort": {"progress": -1, "enrolled_at": 1, "_id": 1}},
+        {"$group": {"_id": {"user_id": "$user_id", "course_id": "$course_id"}, "docs": {"$push": "$$ROOT"}}},
+        {"$match": {"docs.1": {"$exists": True}}}
+    ], allowDiskUse=True):
+        keep, duplicates = group["docs"][0], group["docs"][1:]
+        removed_ids = [d.get("id") for d in duplicates]
+        print(f"  user {group['_id']['user_id']} / course {group['_id']['course_id']}: "
+              f"keeping {keep.get('id')} (progress {keep.get('progress', 0)}), removing {', '.join(map(str, removed_ids))}")
+        stats["groups"] += 1
+        stats["removed"] += len(duplicates)
+        affected.add(group["_id"]["course_id"])
+        if args.dry_run:
+            continue
+
+        archived_at = datetime.now(timezone.utc)
+        await db.enrollment_duplicates.insert_many([
+            {**d, "kept_id": keep.get("id"), "archived_at": archived_at} for d in duplicates
+        ])
+        await db.idempotency_keys.update_many(
+            {"response.enrollment_id": {"$in": removed_ids}},
+            {"$set": {"response.enrollment_id": keep.get("id")}}
+        )
+        await db.enrollments.delete_many({"_id": {"$in": [d["_id"] for d in duplicates]}})
+
+    for course_id in affected:
+        count = await db.enrollments.count_documents({"course_id": course_id})
+        print(f"  course {course_id}: total_enrollments -> {count}")
+        if not args.dry_run:
+            await db.courses.update_one({"id": course_id}, {"$set": {"total_enrollments": count}})
+    stats["courses"] = len(affected)
+
+    if not args.dry_run:
+        await db.enrollments.create_index([("user_id", 1), ("course_id", 1)], unique=True)
+        print("  unique (user_id, course_id) index in place")
+    return stats
+
+
+async def backfill_helpful_counts(db, args) -> Dict[str, int]:
+    # Reviews written before helpful votes existed. Until a course has none
+    # left, its review pages are cut by offset rather than keyset cursors.
+    query = {"helpful_count": {"$exists": False}}
+    if args.dry_run:
+        count = await db.reviews.count_documents(query)
+    else:
+        count = (await db.reviews.update_many(query, {"$set": {"helpful_count": 0}})).modified_count
+    print(f"  reviews: helpful_count -> 0 on {count}")
+    return {"reviews": count}
+
+
+async def backfill_blog_excerpts(db, args) -> Dict[str, int]:
+    # Blog lists serve the stored excerpt; posts from before it existed have none
+    count = 0
+    async for post in db.blog_posts.find({"excerpt": {"$exists": False}}, {"_id": 1, "id": 1, "content": 1}):
+        excerpt = blog_excerpt(post.get("content") or "")
+        print(f"  post {post.get('id')}: {excerpt[:60]!r}")
+        count += 1
+        if not args.dry_run:
+            await db.blog_posts.update_one({"_id": post["_id"]}, {"$set": {"excerpt": excerpt}})
+    return {"posts": count}
+
+
+async def purge_legacy_sessions(db, args) -> Dict[str, int]:
+    # Expired sessions whose expires_at is still an ISO string; the TTL index
+    # only reads native dates, so these are never purged on their own
+    query = {"expires_at": {"$type": "string", "$lt": datetime.now(timezone.utc).isoformat()}}
+    if args.dry_run:
+        count = await db.user_sessions.count_documents(query)
+    else:
+        count = (await db.user_sessions.delete_many(query)).deleted_count
+    print(f"  user_sessions: removing {count} expired legacy sessions")
+    return {"sessions": count}
+
+
+async def drop_cache_bus_state(db, args) -> Dict[str, int]:
+    # Resume tokens the invalidation bus used to persist, one document per
+    # worker process ever started; nothing reads them any more
+    count = await db.cache_bus_state.count_documents({})
+    print(f"  cache_bus_state: dropping {count} documents")
+    if not args.dry_run:
+        await db.drop_collection("cache_bus_state")
+    return {"documents": count}
+
+
+MIGRATIONS = {
+    "dedupe-enrollments": (dedupe_enrollments, "Remove duplicate enrollments and add the unique (user_id, course_id) index"),
+    "backfill-helpful-counts": (backfill_helpful_counts, "Set helpful_count on reviews from before helpful votes"),
+    "backfill-blog-excerpts": (backfill_blog_excerpts, "Store excerpts for blog posts from before they existed"),
+    "purge-legacy-sessions": (purge_legacy_sessions, "Delete expired sessions with ISO-string expiry dates"),
+    "drop-cache-bus-state": (drop_cache_bus_state, "Drop the cache bus resume tokens left by old worker processes"),
+}
+
+
+async def run_migration(db, name: str, args) -> Dict[str, int]:
+    migrate, _ = MIGRATIONS[name]
+    started = time.monotonic()
+    print(f"{name}{' (dry run)' if args.dry_run else ''}:")
+    stats = await migrate(db, args)
+    print(f"{name}: done in {time.monotonic() - started:.1f}s {stats}")
+    if not args.dry_run:
+        await db.migration_checkpoints.update_one(
+            {"_id": f"{CHECKPOINT_PREFIX}:{name}"},
+            {"$set": {"done": True, "finished_at": datetime.now(timezone.utc), "stats": stats}},
+            upsert=True
+        )
+    return stats
+
+
+async def print_status(db):
+    for name, (_, description) in MIGRATIONS.items():
+        checkpoint = await db.migration_checkpoints.find_one({"_id": f"{CHECKPOINT_PREFIX}:{name}"})
+        state = f"last run {checkpoint['finished_at']:%Y-%m-%d %H:%M} UTC" if checkpoint else "never run"
+        print(f"{name:<24} {state:<30} {description}")
+
+
+async def main(args):
+    client = AsyncIOMotorClient(args.mongo_url or os.environ['MONGO_URL'], tz_aware=True)
+    db = client[args.db_name or os.environ['DB_NAME']]
+    try:
+        if args.migration == "status":
+            await print_status(db)
+        else:
+            await run_migration(db, args.migration, args)
+    except OperationFailure as e:
+        raise SystemExit(f"{args.migration} failed: {e}")
+    finally:
+        client.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run one-off data migrations")
+    parser.add_argument("migration", choices=["status", *MIGRATIONS])
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--db-name", default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
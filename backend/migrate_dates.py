@@ -0,0 +1,188 @@
+"""Online migration of ISO-string timestamps to native BSON dates.
+
+Run from the backend directory while the app keeps serving traffic:
+
+    python migrate_dates.py                       # every collection
+    python migrate_dates.py --collections users,courses --batch-size 500 --max-rate 2000
+    python migrate_dates.py --restart             # ignore saved checkpoints
+
+Documents are walked in _id order in small batches. Each rewrite is
+conditional on the field still holding the string that was read, so
+concurrent app writes always win. Progress is checkpointed per collection
+in `migration_checkpoints`, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+MIGRATION_NAME = "iso_dates_to_bson"
+
+DATE_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at"],
+    "user_sessions": ["expires_at", "created_at"],
+    "courses": ["created_at"],
+    "lessons": ["created_at"],
+    "study_materials": ["created_at"],
+    "quizzes": ["created_at"],
+    "quiz_results": ["completed_at"],
+    "enrollments": ["enrolled_at"],
+    "reviews": ["created_at"],
+    "certificates": ["issued_at"],
+    "payments": ["created_at"],
+    "blog_posts": ["published_at"],
+    "video_progress": ["last_watched"],
+    "assignments": ["created_at", "due_date"],
+    "assignment_submissions": ["submitted_at"],
+}
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        # The app always wrote UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class Throttle:
+    def __init__(self, max_rate: float, pause: float):
+        self.max_rate = max_rate
+        self.pause = pause
+        self.started = time.monotonic()
+        self.done = 0
+
+    async def wait(self, processed: int):
+        self.done += processed
+        if self.max_rate > 0:
+            # Sleep until the average rate drops back under max_rate
+            ahead = self.done / self.max_rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+        if self.pause > 0:
+            await asyncio.sleep(self.pause)
+
+
+async def migrate_collection(db, name: str, fields: List[str], args) -> Dict[str, int]:
+    collection = db[name]
+    checkpoint_id = f"{MIGRATION_NAME}:{name}"
+    string_filter = {"$or": [{f: {"$type": "string"}} for f in fields]}
+
+    checkpoint = None if args.restart else await db.migration_checkpoints.find_one({"_id": checkpoint_id})
+    if checkpoint and checkpoint.get("done"):
+        print(f"{name}: already migrated")
+        return {"scanned": 0, "updated": 0, "failed": 0}
+    last_id = checkpoint.get("last_id") if checkpoint else None
+
+    total = None
+    if not args.no_count:
+        count_filter = dict(string_filter)
+        if last_id is not None:
+            count_filter["_id"] = {"$gt": last_id}
+        total = await collection.count_documents(count_filter)
+        print(f"{name}: {total:,} documents to migrate")
+
+    stats = {"scanned": 0, "updated": 0, "failed": 0}
+    throttle = Throttle(args.max_rate, args.pause_ms / 1000.0)
+    started = time.monotonic()
+
+    while True:
+        query = dict(string_filter)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, {"_id": 1, **{f: 1 for f in fields}}).sort("_id", 1).limit(args.batch_size).to_list(args.batch_size)
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            for f in fields:
+                value = doc.get(f)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_timestamp(value)
+                if parsed is None:
+                    stats["failed"] += 1
+                    continue
+                # Only rewrite if nobody changed the field since we read it
+                ops.append(UpdateOne({"_id": doc["_id"], f: value}, {"$set": {f: parsed}}))
+
+        if ops and not args.dry_run:
+            result = await collection.bulk_write(ops, ordered=False)
+            stats["updated"] += result.modified_count
+        elif ops:
+            stats["updated"] += len(ops)
+
+        stats["scanned"] += len(batch)
+        last_id = batch[-1]["_id"]
+        if not args.dry_run:
+            await db.migration_checkpoints.update_one(
+                {"_id": checkpoint_id},
+                {"$set": {"last_id": last_id, "updated_at": datetime.now(timezone.utc)}, "$inc": {"updated": len(ops)}},
+                upsert=True
+            )
+
+        elapsed = time.monotonic() - started
+        rate = stats["scanned"] / elapsed if elapsed else 0.0
+        if total:
+            eta = (total - stats["scanned"]) / rate if rate else 0.0
+            print(f"  {name}: {stats['scanned']:,}/{total:,} ({stats['scanned'] / total * 100:.1f}%) {rate:,.0f} docs/s, ETA {eta:,.0f}s")
+        else:
+            print(f"  {name}: {stats['scanned']:,} scanned, {rate:,.0f} docs/s")
+
+        await throttle.wait(len(batch))
+
+    if not args.dry_run:
+        await db.migration_checkpoints.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"done": True, "finished_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    print(f"{name}: done ({stats['updated']:,} fields rewritten, {stats['failed']:,} unparseable)")
+    return stats
+
+
+async def main(args):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(args.mongo_url or os.environ['MONGO_URL'], tz_aware=True)
+    db = client[args.db_name or os.environ['DB_NAME']]
+
+    names = args.collections.split(",") if args.collections else list(DATE_FIELDS)
+    unknown = [n for n in names if n not in DATE_FIELDS]
+    if unknown:
+        raise SystemExit(f"Unknown collections: {', '.join(unknown)}")
+
+    # Collections are migrated one after another to keep the extra load predictable
+    try:
+        for name in names:
+            await migrate_collection(db, name, DATE_FIELDS[name], args)
+    finally:
+        client.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rewrite ISO-string timestamps as native BSON dates")
+    parser.add_argument("--collections", default=None, help="Comma-separated subset of collections")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-rate", type=float, default=5000, help="Documents per second (0 = unthrottled)")
+    parser.add_argument("--pause-ms", type=float, default=0, help="Extra pause after every batch")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved checkpoints")
+    parser.add_argument("--dry-run", action="store_true", help="Scan and report without writing")
+    parser.add_argument("--no-count", action="store_true", help="Skip the up-front count used for ETA")
+    parser.add_argument("--mongo-url", default=None)
+    parser.add_argument("--db-name", default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
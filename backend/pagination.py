@@ -0,0 +1,53 @@
+import base64
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId, json_util
+
+SortSpec = List[Tuple[str, int]]
+
+# Decode dates as aware UTC, matching what the tz_aware client hands back
+_JSON_OPTIONS = json_util.JSONOptions(tz_aware=True, tzinfo=timezone.utc)
+
+# The only types a sort key can hold. Cursors come from the client, and
+# anything else ({"$ne": null}, a $regex, ...) would turn into a query operator.
+_KEY_TYPES = (str, int, float, datetime, ObjectId)
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    # Extended JSON keeps dates and ObjectIds typed through the round trip
+    return base64.urlsafe_b64encode(json_util.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        state = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")), json_options=_JSON_OPTIONS)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(state, dict):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def keyset_cursor(doc: Dict[str, Any], sort: SortSpec) -> str:
+    return encode_cursor({"after": [doc.get(field) for field, _ in sort]})
+
+
+def offset_cursor(offset: int) -> str:
+    return encode_cursor({"offset": offset})
+
+
+def keyset_filter(values: Any, sort: SortSpec) -> Dict[str, Any]:
+    # (a, b, c) after (x, y, z): a past x, or a == x and b past y, or ...
+    # Only correct when each sort field holds a single BSON type: Mongo compares
+    # across types by type order, so mixed fields skip or repeat rows.
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError("Invalid cursor")
+    if any(isinstance(v, bool) or not isinstance(v, _KEY_TYPES) for v in values):
+        raise ValueError("Invalid cursor")
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
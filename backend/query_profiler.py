@@ -0,0 +1,265 @@
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Route that issued the current Mongo command. Motor copies the context into
+# its executor threads, so the listener below can read it.
+current_route: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_route", default=None)
+
+# Commands we never record (handshakes, our own explains, cursor plumbing)
+IGNORED_COMMANDS = {
+    "hello", "isMaster", "ismaster", "ping", "buildInfo", "saslStart", "saslContinue",
+    "endSessions", "explain", "getMore", "killCursors", "listIndexes", "createIndexes",
+}
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Driver-added fields that must be stripped before re-running a command under explain
+_DRIVER_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def normalize_shape(value: Any) -> Any:
+    # Replace literal values with "?" while keeping field names and operators
+    if isinstance(value, dict):
+        return {k: normalize_shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(v, dict) for v in value):
+            return [normalize_shape(v) for v in value]
+        return ["?"]
+    return "?"
+
+
+def command_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    shape: Dict[str, Any] = {}
+    if command_name == "find":
+        shape["filter"] = normalize_shape(command.get("filter", {}))
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+    elif command_name == "aggregate":
+        shape["pipeline"] = normalize_shape(command.get("pipeline", []))
+    elif command_name == "count":
+        shape["query"] = normalize_shape(command.get("query", {}))
+    elif command_name == "distinct":
+        shape["key"] = command.get("key")
+        shape["query"] = normalize_shape(command.get("query", {}))
+    elif command_name == "update":
+        updates = command.get("updates") or [{}]
+        shape["q"] = normalize_shape(updates[0].get("q", {}))
+        shape["upsert"] = bool(updates[0].get("upsert"))
+    elif command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        shape["q"] = normalize_shape(deletes[0].get("q", {}))
+    elif command_name == "findAndModify":
+        shape["query"] = normalize_shape(command.get("query", {}))
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+    return shape
+
+
+def shape_key(collection: str, command_name: str, shape: Dict[str, Any]) -> str:
+    return f"{collection}.{command_name} {_render(shape)}"
+
+
+def _render(value: Any) -> str:
+    # Deterministic, compact rendering (json.dumps chokes on bson types in sort specs)
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{k}: {_render(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, list):
+        return "[" + ", ".join(_render(v) for v in value) + "]"
+    return str(value)
+
+
+def _returned_count(command_name: str, reply: Dict[str, Any]) -> Optional[int]:
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", []))
+    if command_name in ("count", "update", "delete"):
+        return reply.get("n")
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    return None
+
+
+def _find_key(doc: Any, key: str) -> Any:
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        for v in doc.values():
+            found = _find_key(v, key)
+            if found is not None:
+                return found
+    elif isinstance(doc, list):
+        for v in doc:
+            found = _find_key(v, key)
+            if found is not None:
+                return found
+    return None
+
+
+def _plan_stages(plan: Any, stages: List[str]) -> List[str]:
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for k in ("inputStage", "queryPlan"):
+            if k in plan:
+                _plan_stages(plan[k], stages)
+        for child in plan.get("inputStages", []):
+            _plan_stages(child, stages)
+    return stages
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100.0, explain_sample_rate: float = 0.0, max_shapes: int = 500):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_shapes = max_shapes
+        self._pending: Dict[Any, tuple] = {}
+        self._shapes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, client, loop: asyncio.AbstractEventLoop):
+        # Explains are run through the app's own Motor client on the app loop
+        self._client = client
+        self._loop = loop
+
+    # ---- pymongo CommandListener interface ----
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command, current_route.get())
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        if duration_ms < self.threshold_ms:
+            return
+        database_name, command, route = pending
+        self._record(event.command_name, database_name, command, route, duration_ms, event.reply)
+
+    def failed(self, event):
+        self._pending.pop((event.connection_id, event.request_id), None)
+
+    # ---- aggregation ----
+
+    def _record(self, command_name, database_name, command, route, duration_ms, reply):
+        collection = command.get(command_name)
+        if not isinstance(collection, str):
+            collection = "?"
+        shape = command_shape(command_name, command)
+        key = shape_key(collection, command_name, shape)
+        n_returned = _returned_count(command_name, reply or {})
+
+        logger.warning(
+            "Slow query %.1fms route=%s shape=%s nReturned=%s",
+            duration_ms, route or "-", key, n_returned
+        )
+
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                entry = {
+                    "shape": key,
+                    "collection": collection,
+                    "command": command_name,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "n_returned": 0,
+                    "explained": 0,
+                    "docs_examined": 0,
+                    "keys_examined": 0,
+                    "explain_n_returned": 0,
+                    "plan_stages": None,
+                    "routes": {},
+                    "last_seen": None,
+                }
+                self._shapes[key] = entry
+                if len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            else:
+                self._shapes.move_to_end(key)
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["n_returned"] += n_returned or 0
+            route_key = route or "-"
+            entry["routes"][route_key] = entry["routes"].get(route_key, 0) + 1
+            entry["last_seen"] = time.time()
+
+        if (
+            command_name in EXPLAINABLE_COMMANDS
+            and self.explain_sample_rate > 0
+            and self._client is not None
+            and self._loop is not None
+            and random.random() < self.explain_sample_rate
+        ):
+            explain_cmd = {k: v for k, v in command.items() if not k.startswith("$") and k not in _DRIVER_FIELDS}
+            asyncio.run_coroutine_threadsafe(self._explain(key, database_name, explain_cmd), self._loop)
+
+    async def _explain(self, key: str, database_name: str, command: Dict[str, Any]):
+        try:
+            result = await self._client[database_name].command(
+                {"explain": command, "verbosity": "executionStats"}
+            )
+        except Exception as e:
+            logger.debug(f"Slow query explain failed for {key}: {e}")
+            return
+
+        stats = _find_key(result, "executionStats") or {}
+        winning_plan = _find_key(result, "winningPlan") or {}
+        stages = _plan_stages(winning_plan, [])
+
+        docs_examined = stats.get("totalDocsExamined", 0)
+        n_returned = stats.get("nReturned", 0)
+        logger.warning(
+            "Slow query explain shape=%s docsExamined=%s keysExamined=%s nReturned=%s plan=%s",
+            key, docs_examined, stats.get("totalKeysExamined", 0), n_returned, ">".join(stages)
+        )
+
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                return
+            entry["explained"] += 1
+            entry["docs_examined"] += docs_examined
+            entry["keys_examined"] += stats.get("totalKeysExamined", 0)
+            entry["explain_n_returned"] += n_returned
+            entry["plan_stages"] = stages
+
+    # ---- reporting ----
+
+    def report(self, limit: int = 20, sort: str = "total_ms") -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [dict(e, routes=dict(e["routes"])) for e in self._shapes.values()]
+
+        for e in entries:
+            e["avg_ms"] = e["total_ms"] / e["count"] if e["count"] else 0.0
+            # Examined-to-returned ratio from sampled explains; high values point at missing indexes
+            if e["explained"]:
+                e["examined_per_returned"] = e["docs_examined"] / max(e["explain_n_returned"], 1)
+            else:
+                e["examined_per_returned"] = None
+            e["collscan"] = bool(e["plan_stages"]) and "COLLSCAN" in e["plan_stages"]
+
+        if sort not in ("total_ms", "max_ms", "avg_ms", "count"):
+            sort = "total_ms"
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
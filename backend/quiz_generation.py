@@ -0,0 +1,131 @@
+import json
+import re
+from typing import List, Optional, Sequence
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from retrieval import chunk_text, estimate_tokens, tokenize
+
+LETTERS = "ABCD"
+
+SYSTEM_MESSAGE = (
+    "You are an educational quiz generator. Write multiple choice questions that can be answered "
+    "from the provided excerpt alone. Reply with a JSON array only, no prose."
+)
+
+PROMPT_TEMPLATE = (
+    "Write {count} multiple choice questions from this excerpt of a longer chapter "
+    "(part {part} of {parts}).\n\n{excerpt}\n\n"
+    'Reply with a JSON array of objects shaped like {{"question": "...", "options": ["...", "...", "...", "..."], '
+    '"correct": "A", "explanation": "..."}} with exactly four options and "correct" one of A, B, C, D.'
+)
+
+
+class GeneratedQuestion(BaseModel):
+    # Shaped like QuestionCreate minus quiz_id, so it can be saved as-is
+    question_text: str
+    type: str = "mcq"
+    options: List[str]
+    correct_answer: str
+    explanation: Optional[str] = None
+    marks: int = 1
+    source_chunk: int = 0
+
+    @field_validator("options")
+    @classmethod
+    def four_distinct_options(cls, options: List[str]) -> List[str]:
+        options = [o.strip() for o in options]
+        if len(options) != 4 or len({o.lower() for o in options}) != 4 or not all(options):
+            raise ValueError("expected four distinct options")
+        return options
+
+
+def split_content(content: str, max_tokens: int, overlap_tokens: int = 50) -> List[str]:
+    if estimate_tokens(content) <= max_tokens:
+        return [content]
+    return chunk_text(content, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+
+def allocate_quotas(chunks: Sequence[str], total: int) -> List[int]:
+    # Largest-remainder split proportional to chunk size, so dense sections get
+    # more questions and the quotas always sum to `total`
+    sizes = [estimate_tokens(c) for c in chunks]
+    whole = sum(sizes)
+    exact = [total * s / whole for s in sizes]
+    quotas = [int(e) for e in exact]
+    by_remainder = sorted(range(len(chunks)), key=lambda i: exact[i] - quotas[i], reverse=True)
+    for i in by_remainder[:total - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+
+def _json_array(text: str) -> Optional[list]:
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        value = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, list) else None
+
+
+_TEXT_QUESTION_RE = re.compile(
+    r"Q:\s*(?P<q>.+?)\s*A\)\s*(?P<a>.+?)\s*B\)\s*(?P<b>.+?)\s*C\)\s*(?P<c>.+?)\s*D\)\s*(?P<d>.+?)\s*Correct:\s*(?P<correct>[ABCD])",
+    re.S,
+)
+
+
+def parse_questions(text: str, chunk_index: int = 0) -> List[GeneratedQuestion]:
+    raw = _json_array(text)
+    if raw is None:
+        # Models sometimes fall back to the plain "Q: / A) / Correct:" layout
+        raw = [
+            {"question": m["q"], "options": [m["a"], m["b"], m["c"], m["d"]], "correct": m["correct"]}
+            for m in _TEXT_QUESTION_RE.finditer(text)
+        ]
+
+    questions = []
+    for item in raw:
+        if not isinstance(item, dict):
+            continue
+        options = item.get("options") or []
+        correct = str(item.get("correct", "")).strip().upper()[:1]
+        if correct not in LETTERS or not isinstance(options, list) or len(options) != 4:
+            continue
+        try:
+            questions.append(GeneratedQuestion(
+                question_text=str(item.get("question", "")).strip(),
+                options=[str(o) for o in options],
+                correct_answer=str(options[LETTERS.index(correct)]).strip(),
+                explanation=item.get("explanation"),
+                source_chunk=chunk_index,
+            ))
+        except ValidationError:
+            continue
+    return [q for q in questions if q.question_text]
+
+
+def deduplicate(questions: Sequence[GeneratedQuestion], threshold: float = 0.8) -> List[GeneratedQuestion]:
+    # Overlapping chunks tend to yield the same question twice with slightly
+    # different wording; drop anything too close to one already kept
+    kept: List[GeneratedQuestion] = []
+    kept_terms: List[set] = []
+    for question in questions:
+        terms = set(tokenize(question.question_text))
+        if not terms:
+            continue
+        duplicate = any(len(terms & other) / len(terms | other) >= threshold for other in kept_terms)
+        if not duplicate:
+            kept.append(question)
+            kept_terms.append(terms)
+    return kept
+
+
+def merge(per_chunk: Sequence[List[GeneratedQuestion]], quotas: Sequence[int], total: int) -> List[GeneratedQuestion]:
+    # Each chunk's own quota comes first; the spare questions every chunk was
+    # asked for only fill gaps left by duplicates or short replies
+    primary = [q for questions, quota in zip(per_chunk, quotas) for q in questions[:quota]]
+    spare = [q for questions, quota in zip(per_chunk, quotas) for q in questions[quota:]]
+    selected = deduplicate(primary + spare)[:total]
+    return sorted(selected, key=lambda q: q.source_chunk)
@@ -0,0 +1,269 @@
+import bisect
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+RANKING_LISTS = ("popular", "trending", "top_rated")
+
+# Slice wildcard: ("*", "*") is the whole catalogue, ("JEE", "*") one category, ...
+ANY = "*"
+
+Slice = Tuple[str, str]
+
+
+@dataclass
+class _CourseStats:
+    course_id: str
+    category: str
+    language: str
+    enrollments: int
+    rating: float
+    ratings: int
+    card: Dict[str, Any]
+    # Enrollment counts per time bucket inside the trending window
+    recent: Dict[int, int] = field(default_factory=dict)
+    recent_total: int = 0
+
+    @property
+    def slices(self) -> List[Slice]:
+        return [(ANY, ANY), (self.category, ANY), (ANY, self.language), (self.category, self.language)]
+
+
+class CourseRankings:
+    # Top-K course lists (popular, trending, top rated) for every category,
+    # language and category+language slice, served from memory in O(K).
+    # Each slice keeps a sorted buffer of up to 2K entries that is always the
+    # true head of the ranking; writes reposition one course in its four
+    # slices, and a slice is only rebuilt from scratch when departures shrink
+    # its buffer below K.
+
+    def __init__(self, k: int = 50, window_seconds: float = 7 * 86400, bucket_seconds: float = 3600,
+                 rating_prior: float = 10.0):
+        self.k = k
+        self.capacity = 2 * k
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = max(int(window_seconds // bucket_seconds), 1)
+        # Weight of the catalogue-wide mean in the Bayesian average, in votes
+        self.rating_prior = rating_prior
+        self.ready = False
+        self.rebuilds = 0
+        self._reset()
+
+    def _reset(self):
+        self._courses: Dict[str, _CourseStats] = {}
+        self._by_oid: Dict[str, str] = {}
+        self._slice_members: Dict[Slice, Set[str]] = {}
+        self._entries: Dict[str, Dict[Slice, List[tuple]]] = {name: {} for name in RANKING_LISTS}
+        self._keys: Dict[str, Dict[Slice, Dict[str, tuple]]] = {name: {} for name in RANKING_LISTS}
+        self._dirty: Set[Tuple[str, Slice]] = set()
+        self._rating_sum = 0.0
+        self._rating_count = 0
+        # Catalogue mean as of the last load/advance. Stored keys embed it, so
+        # it only moves when every list is rebuilt; a live mean would leave
+        # untouched keys stale and the sorted buffers out of order.
+        self._prior_mean = 0.0
+        self._current_bucket: Optional[int] = None
+
+    def _bucket(self, at: datetime) -> int:
+        return int(at.timestamp() // self.bucket_seconds)
+
+    @property
+    def mean_rating(self) -> float:
+        return self._rating_sum / self._rating_count if self._rating_count else 0.0
+
+    def bayesian_rating(self, stats: _CourseStats) -> float:
+        prior = self.rating_prior
+        return (prior * self._prior_mean + stats.rating * stats.ratings) / (prior + stats.ratings) if prior + stats.ratings else 0.0
+
+    def _key(self, list_name: str, stats: _CourseStats) -> tuple:
+        # Ascending sort order: best first, course id as the final tie-break
+        if list_name == "popular":
+            return (-stats.enrollments, -self.bayesian_rating(stats), stats.course_id)
+        if list_name == "trending":
+            return (-stats.recent_total, -stats.enrollments, stats.course_id)
+        return (-self.bayesian_rating(stats), -stats.ratings, stats.course_id)
+
+    def _place(self, list_name: str, slc: Slice, course_id: str, key: Optional[tuple]):
+        # key=None removes the course from the slice
+        entries = self._entries[list_name].setdefault(slc, [])
+        keys = self._keys[list_name].setdefault(slc, {})
+        old = keys.pop(course_id, None)
+        if old is not None:
+            del entries[bisect.bisect_left(entries, old)]
+
+        members = self._slice_members.get(slc, ())
+        outside = len(members) - len(keys) - (1 if course_id in members else 0)
+        # Only admit a course if nothing outside the buffer can outrank it
+        if key is not None and (outside == 0 or (entries and key < entries[-1])):
+            bisect.insort(entries, key)
+            keys[course_id] = key
+            if len(entries) > self.capacity:
+                dropped = entries.pop()
+                del keys[dropped[-1]]
+
+        if len(entries) < self.k and len(members) > len(entries):
+            self._dirty.add((list_name, slc))
+
+    def _rebuild(self, list_name: str, slc: Slice):
+        members = self._slice_members.get(slc, set())
+        entries = heapq.nsmallest(self.capacity, (self._key(list_name, self._courses[c]) for c in members))
+        self._entries[list_name][slc] = entries
+        self._keys[list_name][slc] = {key[-1]: key for key in entries}
+        self._dirty.discard((list_name, slc))
+        self.rebuilds += 1
+
+    def _rebuild_list(self, list_name: str):
+        for slc in list(self._slice_members):
+            self._rebuild(list_name, slc)
+
+    def _reposition(self, stats: _CourseStats):
+        for list_name in RANKING_LISTS:
+            key = self._key(list_name, stats)
+            for slc in stats.slices:
+                self._place(list_name, slc, stats.course_id, key)
+
+    def _add_rating(self, stats: _CourseStats, sign: int):
+        self._rating_sum += sign * stats.rating * stats.ratings
+        self._rating_count += sign * stats.ratings
+
+    def _add_recent(self, stats: _CourseStats, bucket: int, count: int):
+        if self._current_bucket is not None and bucket <= self._current_bucket - self.window_buckets:
+            return
+        stats.recent[bucket] = stats.recent.get(bucket, 0) + count
+        stats.recent_total += count
+
+    def _stats(self, doc: Dict[str, Any]) -> Tuple[_CourseStats, Optional[str]]:
+        card = dict(doc)
+        oid = card.pop("_id", None)
+        stats = _CourseStats(
+            course_id=card["id"],
+            category=card.get("category") or "",
+            language=card.get("language") or "",
+            enrollments=int(card.get("total_enrollments") or 0),
+            rating=float(card.get("rating") or 0.0),
+            ratings=int(card.get("total_ratings") or 0),
+            card=card,
+        )
+        return stats, str(oid) if oid is not None else None
+
+    def load(self, courses: Iterable[Dict[str, Any]], recent_enrollments: Iterable[Tuple[str, datetime]], now: datetime):
+        self._reset()
+        self._current_bucket = self._bucket(now)
+        for doc in courses:
+            stats, oid = self._stats(doc)
+            self._courses[stats.course_id] = stats
+            if oid is not None:
+                self._by_oid[oid] = stats.course_id
+            self._add_rating(stats, 1)
+            for slc in stats.slices:
+                self._slice_members.setdefault(slc, set()).add(stats.course_id)
+        for course_id, enrolled_at in recent_enrollments:
+            stats = self._courses.get(course_id)
+            if stats is not None and enrolled_at is not None:
+                self._add_recent(stats, self._bucket(enrolled_at), 1)
+        self._prior_mean = self.mean_rating
+        for list_name in RANKING_LISTS:
+            self._rebuild_list(list_name)
+        self.ready = True
+
+    def upsert_course(self, doc: Dict[str, Any], now: datetime):
+        # Called with the stored course card; growth in total_enrollments since
+        # we last saw it counts as recent enrollments, which is how writes made
+        # by other workers reach the trending list
+        stats, oid = self._stats(doc)
+        existing = self._courses.get(stats.course_id)
+        if existing is not None:
+            if (existing.category, existing.language) != (stats.category, stats.language):
+                self.remove(stats.course_id)
+                existing = None
+            else:
+                growth = stats.enrollments - existing.enrollments
+                stats.recent, stats.recent_total = existing.recent, existing.recent_total
+                if growth > 0:
+                    self._add_recent(stats, self._bucket(now), growth)
+                self._add_rating(existing, -1)
+
+        self._courses[stats.course_id] = stats
+        if oid is not None:
+            self._by_oid[oid] = stats.course_id
+        self._add_rating(stats, 1)
+        for slc in stats.slices:
+            self._slice_members.setdefault(slc, set()).add(stats.course_id)
+        self._reposition(stats)
+
+    def record_enrollment(self, course_id: str, now: datetime, count: int = 1):
+        stats = self._courses.get(course_id)
+        if stats is None:
+            return
+        stats.enrollments += count
+        stats.card["total_enrollments"] = stats.enrollments
+        self._add_recent(stats, self._bucket(now), count)
+        self._reposition(stats)
+
+    def record_rating(self, course_id: str, rating: float, ratings: int):
+        stats = self._courses.get(course_id)
+        if stats is None:
+            return
+        self._add_rating(stats, -1)
+        stats.rating, stats.ratings = rating, ratings
+        stats.card["rating"], stats.card["total_ratings"] = rating, ratings
+        self._add_rating(stats, 1)
+        self._reposition(stats)
+
+    def remove(self, course_id: str):
+        stats = self._courses.pop(course_id, None)
+        if stats is None:
+            return
+        self._add_rating(stats, -1)
+        for slc in stats.slices:
+            members = self._slice_members.get(slc)
+            if members is not None:
+                members.discard(course_id)
+            for list_name in RANKING_LISTS:
+                self._place(list_name, slc, course_id, None)
+
+    def remove_oid(self, oid: str):
+        course_id = self._by_oid.pop(oid, None)
+        if course_id is not None:
+            self.remove(course_id)
+
+    def advance(self, now: datetime) -> bool:
+        # Slide the trending window when a bucket boundary passes. Scores of
+        # courses nobody touched change too, so every list is rebuilt
+        # (O(catalogue), once per bucket) and the rating prior catches up
+        # with the drifting mean.
+        bucket = self._bucket(now)
+        if self._current_bucket is not None and bucket == self._current_bucket:
+            return False
+        self._current_bucket = bucket
+        oldest = bucket - self.window_buckets
+        for stats in self._courses.values():
+            expired = [b for b in stats.recent if b <= oldest]
+            for b in expired:
+                stats.recent_total -= stats.recent.pop(b)
+        self._prior_mean = self.mean_rating
+        for list_name in RANKING_LISTS:
+            self._rebuild_list(list_name)
+        return True
+
+    def top(self, list_name: str, category: Optional[str] = None, language: Optional[str] = None,
+            limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        slc = (category or ANY, language or ANY)
+        if (list_name, slc) in self._dirty:
+            self._rebuild(list_name, slc)
+        entries = self._entries[list_name].get(slc, [])
+        count = min(limit or self.k, self.k)
+        return [self._courses[key[-1]].card for key in entries[:count]]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "courses": len(self._courses),
+            "slices": len(self._slice_members),
+            "k": self.k,
+            "mean_rating": round(self.mean_rating, 3),
+            "prior_mean": round(self._prior_mean, 3),
+            "rebuilds": self.rebuilds,
+            "dirty": len(self._dirty),
+        }
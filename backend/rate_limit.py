@@ -0,0 +1,145 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    name: str
+    capacity: int  # burst size
+    per_seconds: float  # time to refill the whole bucket
+    key: str = "user"  # user, ip, or account (checked inside the route)
+
+    @property
+    def refill_rate(self) -> float:
+        return self.capacity / self.per_seconds
+
+    @classmethod
+    def from_env(cls, name: str, capacity: int, per_seconds: float, key: str = "user") -> "RateLimitPolicy":
+        # RATE_LIMIT_AI_CHAT="20/60" -> 20 requests burst, refilled over 60 seconds
+        override = os.environ.get(f"RATE_LIMIT_{name.upper()}")
+        if override:
+            cap, _, per = override.partition("/")
+            capacity, per_seconds = int(cap), float(per)
+        return cls(name=name, capacity=capacity, per_seconds=per_seconds, key=key)
+
+
+class MemoryBucketBackend:
+    # Per-worker buckets: cheapest option, but each worker enforces the
+    # limit separately
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, policy: RateLimitPolicy, cost: int = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(policy.capacity), now))
+        tokens = min(policy.capacity, tokens + (now - updated) * policy.refill_rate)
+
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+        retry_after = 0.0 if allowed else (1 - tokens) / policy.refill_rate
+        return allowed, retry_after
+
+
+class MongoBucketBackend:
+    # Buckets shared by every worker. Refill and take happen in one atomic
+    # pipeline update evaluated against the server clock ($$NOW), so workers
+    # with skewed clocks still agree. Idle buckets expire via a TTL index.
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def _pipeline(self, policy: RateLimitPolicy, cost: int):
+        capacity = float(policy.capacity)
+        elapsed_seconds = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated", "$$NOW"]}]}, 1000]}
+        refilled = {"$min": [
+            capacity,
+            {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, policy.refill_rate]}]}
+        ]}
+        idle_ms = int(policy.per_seconds * 1000) + 60_000
+        return [
+            {"$set": {"tokens": refilled, "updated": "$$NOW"}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                "expires_at": {"$add": ["$$NOW", idle_ms]}
+            }},
+        ]
+
+    async def take(self, key: str, policy: RateLimitPolicy, cost: int = 1) -> Tuple[bool, float]:
+        for _ in range(2):
+            try:
+                doc = await self.collection.find_one_and_update(
+                    {"_id": key}, self._pipeline(policy, cost), upsert=True, return_document=ReturnDocument.AFTER
+                )
+                break
+            except DuplicateKeyError:
+                # Two workers created the same bucket at once; the retry updates it
+                continue
+        else:
+            return True, 0.0
+
+        if doc["allowed"]:
+            return True, 0.0
+        return False, (1 - doc["tokens"]) / policy.refill_rate
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = defaultdict(int)
+
+    async def check(self, policy: RateLimitPolicy, key: str, cost: int = 1):
+        # cost=0 only requires a token to be left; the caller spends it later
+        # with charge(), e.g. only for failed logins
+        try:
+            allowed, retry_after = await self.backend.take(f"{policy.name}:{key}", policy, cost)
+        except PyMongoError as e:
+            # Fail open: a limiter outage must not take logins down with it
+            logger.error(f"Rate limiter backend error: {e}")
+            return
+
+        if allowed:
+            self.allowed[policy.name] += 1
+            return
+
+        self.rejected[policy.name] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def charge(self, policy: RateLimitPolicy, key: str):
+        try:
+            await self.backend.take(f"{policy.name}:{key}", policy)
+        except PyMongoError as e:
+            logger.error(f"Rate limiter backend error: {e}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"allowed": self.allowed.get(name, 0), "rejected": self.rejected.get(name, 0)}
+            for name in sorted(set(self.allowed) | set(self.rejected))
+        }
@@ -0,0 +1,283 @@
+import functools
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Latin word characters plus the Indic script blocks (Devanagari .. Sinhala),
+# whose vowel signs \w alone would split words on
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0DFF]+")
+
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what when where which who why with "
+    "you your i me my we our can do does did will would should could".split()
+)
+
+# Rough size of a token for budgeting prompt context; close enough for English and Hinglish
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOP_WORDS]
+
+
+@functools.lru_cache(maxsize=200_000)
+def _feature(term: str, dim: int) -> Tuple[int, float]:
+    # crc32 rather than hash() so vectors agree across workers and restarts
+    h = zlib.crc32(term.encode("utf-8"))
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+class HashingEmbedder:
+    # Signed feature hashing over unigrams and bigrams with sublinear term
+    # frequency. No model to download, deterministic, and cheap enough to
+    # embed every lesson in the catalogue at startup.
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = tokenize(text)
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not terms:
+            return vector
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            index, sign = _feature(term, self.dim)
+            vector[index] += sign * (1.0 + np.log(count))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.embed(text)
+        return matrix
+
+
+def chunk_text(text: str, max_tokens: int = 160, overlap_tokens: int = 30) -> List[str]:
+    # Word windows sized by the token estimate; consecutive chunks overlap so
+    # a sentence cut at a boundary is still whole in one of them
+    words = text.split()
+    if not words:
+        return []
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+
+    chunks = []
+    start = 0
+    while start < len(words):
+        end, size = start, 0
+        while end < len(words) and (end == start or size + len(words[end]) + 1 <= max_chars):
+            size += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back over roughly overlap_chars worth of words
+        back, back_size = end, 0
+        while back > start + 1 and back_size + len(words[back - 1]) + 1 <= overlap_chars:
+            back -= 1
+            back_size += len(words[back]) + 1
+        start = back
+    return chunks
+
+
+@dataclass
+class Chunk:
+    source_type: str  # course, lesson or study_material
+    source_id: str
+    scope: str  # course id, or "category:<name>" for study materials
+    title: str
+    text: str
+    tokens: int
+
+
+@dataclass
+class SourceDocument:
+    source_type: str
+    source_id: str
+    scope: str
+    title: str
+    text: str
+    oid: Optional[str] = None  # Mongo _id, for deletes seen on the change stream
+
+
+class VectorIndex:
+    # Dense in-memory index: one float32 row per chunk, searched with a single
+    # matrix-vector product restricted to the caller's scopes. Sources are
+    # replaced in place as content changes; freed rows are reused.
+
+    def __init__(self, embedder: HashingEmbedder, max_chunk_tokens: int = 160):
+        self.embedder = embedder
+        self.max_chunk_tokens = max_chunk_tokens
+        self._vectors = np.zeros((1024, embedder.dim), dtype=np.float32)
+        self._scopes = np.full(1024, -1, dtype=np.int32)  # -1 marks a free row
+        self._chunks: List[Optional[Chunk]] = [None] * 1024
+        self._size = 0
+        self._free: List[int] = []
+        self._rows_by_source: Dict[Tuple[str, str], List[int]] = {}
+        self._scope_codes: Dict[str, int] = {}
+        # Mongo _id -> source key, so change stream deletes (which only carry _id) can be applied
+        self._source_by_oid: Dict[str, Tuple[str, str]] = {}
+        self._digests: Dict[Tuple[str, str], int] = {}
+        # Sources changed while a full build is in flight; the build must not overwrite them
+        self._touched: Optional[set] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return self._size - len(self._free)
+
+    def _scope_code(self, scope: str) -> int:
+        code = self._scope_codes.get(scope)
+        if code is None:
+            code = self._scope_codes[scope] = len(self._scope_codes)
+        return code
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._size == len(self._scopes):
+            capacity = len(self._scopes) * 2
+            vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+            vectors[:self._size] = self._vectors[:self._size]
+            scopes = np.full(capacity, -1, dtype=np.int32)
+            scopes[:self._size] = self._scopes[:self._size]
+            self._vectors, self._scopes = vectors, scopes
+            self._chunks.extend([None] * (capacity - len(self._chunks)))
+        self._size += 1
+        return self._size - 1
+
+    def split(self, doc: SourceDocument) -> List[Chunk]:
+        pieces = chunk_text(doc.text, self.max_chunk_tokens) or [""]
+        return [
+            Chunk(doc.source_type, doc.source_id, doc.scope, doc.title, piece, estimate_tokens(doc.title + piece))
+            for piece in pieces
+        ]
+
+    @staticmethod
+    def _digest(doc: SourceDocument) -> int:
+        return zlib.crc32(f"{doc.scope}\x00{doc.title}\x00{doc.text}".encode("utf-8"))
+
+    def prepare(self, docs: Iterable[SourceDocument]) -> Tuple[List[SourceDocument], List[List[Chunk]], np.ndarray]:
+        # Chunking and embedding are pure; callers run this off the event loop.
+        # Sources whose text has not changed are skipped (e.g. enrollment counter bumps)
+        docs = [d for d in docs if self._digests.get((d.source_type, d.source_id)) != self._digest(d)]
+        chunk_lists = [self.split(doc) for doc in docs]
+        texts = [f"{c.title}\n{c.text}" for chunks in chunk_lists for c in chunks]
+        return docs, chunk_lists, self.embedder.embed_many(texts)
+
+    def apply(
+        self,
+        prepared: Tuple[List[SourceDocument], List[List[Chunk]], np.ndarray],
+        from_build: bool = False,
+    ):
+        docs, chunk_lists, vectors = prepared
+        row = 0
+        for doc, chunks in zip(docs, chunk_lists):
+            key = (doc.source_type, doc.source_id)
+            if from_build and self._touched is not None and key in self._touched:
+                row += len(chunks)
+                continue
+            self.remove(*key)
+            rows = []
+            scope = self._scope_code(doc.scope)
+            for chunk in chunks:
+                slot = self._allocate()
+                self._vectors[slot] = vectors[row]
+                self._scopes[slot] = scope
+                self._chunks[slot] = chunk
+                rows.append(slot)
+                row += 1
+            self._rows_by_source[key] = rows
+            self._digests[key] = self._digest(doc)
+            if doc.oid is not None:
+                self._source_by_oid[doc.oid] = key
+
+    def begin_build(self):
+        self._touched = set()
+
+    def finish_build(self, seen: Optional[set] = None):
+        # A completed build also drops sources that no longer exist
+        if seen is not None:
+            for key in [k for k in self._rows_by_source if k not in seen and k not in self._touched]:
+                self.remove(*key)
+            self.ready = True
+        self._touched = None
+
+    def remove(self, source_type: str, source_id: str):
+        self._digests.pop((source_type, source_id), None)
+        if self._touched is not None:
+            self._touched.add((source_type, source_id))
+        for slot in self._rows_by_source.pop((source_type, source_id), ()):
+            self._vectors[slot] = 0.0
+            self._scopes[slot] = -1
+            self._chunks[slot] = None
+            self._free.append(slot)
+
+    def remove_oid(self, oid: str):
+        key = self._source_by_oid.pop(oid, None)
+        if key is not None:
+            self.remove(*key)
+
+    def remove_scope(self, scope: str):
+        keys = {(c.source_type, c.source_id) for c in self._chunks if c is not None and c.scope == scope}
+        for key in keys:
+            self.remove(*key)
+
+    def search(
+        self,
+        query: str,
+        scopes: Sequence[str],
+        k: int = 6,
+        token_budget: int = 800,
+        min_score: float = 0.05,
+    ) -> List[Tuple[float, Chunk]]:
+        codes = [self._scope_codes[s] for s in scopes if s in self._scope_codes]
+        if not codes or self._size == 0:
+            return []
+        query_vector = self.embedder.embed(query)
+        if not query_vector.any():
+            return []
+
+        candidates = np.flatnonzero(np.isin(self._scopes[:self._size], codes))
+        if candidates.size == 0:
+            return []
+        scores = self._vectors[candidates] @ query_vector
+        # Over-fetch so chunks dropped for the budget can be replaced by smaller ones
+        top = min(candidates.size, k * 3)
+        best = np.argpartition(-scores, top - 1)[:top]
+        best = best[np.argsort(-scores[best])]
+
+        results, used = [], 0
+        for i in best:
+            score = float(scores[i])
+            if score < min_score or len(results) >= k:
+                break
+            chunk = self._chunks[candidates[i]]
+            if used + chunk.tokens > token_budget:
+                continue
+            results.append((score, chunk))
+            used += chunk.tokens
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "chunks": len(self),
+            "sources": len(self._rows_by_source),
+            "scopes": len(self._scope_codes),
+            "capacity": len(self._scopes),
+            "bytes": int(self._vectors.nbytes),
+        }
@@ -1,29 +1,132 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Response, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Response, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
+from typing import List, Optional, Dict, Any, Tuple
+from collections import defaultdict
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import asyncio
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import aiohttp
+import tempfile
+import time
+import functools
+import socket
+import csv
+import io
+import json
+import re
+import zlib
+from pagination import decode_cursor, keyset_cursor, keyset_filter, offset_cursor
+from query_profiler import SlowQueryListener, current_route
+from session_tokens import SessionSigner, RevocationList, is_signed_token
+from cache_bus import InvalidationBus, LocalCache, doc_tag
+from compression import CompressionConfig, CompressionMiddleware
+from rate_limit import RateLimiter, RateLimitPolicy, MemoryBucketBackend, MongoBucketBackend
+from retrieval import HashingEmbedder, VectorIndex, SourceDocument
+import quiz_generation
+from certificates import CertificateStore, CERTIFICATE_FORMATS, file_response
+from storage import open_storage
+from rankings import CourseRankings, RANKING_LISTS
+from tracing import TraceCommandListener, TraceExporter, TracingMiddleware, TracedJSONResponse, TracedRoute, current_trace, span, traced
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection. STORAGE_BACKEND=memory swaps in a process-local engine
+# with the same API, for load tests and running without a MongoDB server
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'mongo')
+slow_query_listener = SlowQueryListener(
+    threshold_ms=float(os.environ.get('SLOW_QUERY_MS', '100')),
+    explain_sample_rate=float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', '0')),
+    max_shapes=int(os.environ.get('SLOW_QUERY_MAX_SHAPES', '500'))
+)
+storage = open_storage(
+    STORAGE_BACKEND,
+    os.environ['DB_NAME'],
+    mongo_url=os.environ.get('MONGO_URL'),
+    # tz_aware so native dates come back as UTC-aware datetimes, matching what we write
+    tz_aware=True,
+    event_listeners=[slow_query_listener, TraceCommandListener()]
+)
+client = storage.client
+db = storage.db
+
+async def tag_route(request: Request):
+    # Label Mongo commands with the route template that issued them
+    route = request.scope.get("route")
+    current_route.set(f"{request.method} {route.path if route else request.url.path}")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.route = current_route.get()
+
+app = FastAPI(default_response_class=TracedJSONResponse)
+compression_config = CompressionConfig.from_env()
+api_router = APIRouter(
+    prefix="/api",
+    dependencies=[Depends(tag_route)],
+    route_class=TracedRoute,
+    default_response_class=TracedJSONResponse
+)
 
-app = FastAPI()
-api_router = APIRouter(prefix="/api")
+# Sampled requests get a Server-Timing breakdown (auth, db, llm, serialize);
+# a smaller sample is also written out as JSON traces
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0.1'))
+TRACE_EXPORT_RATE = float(os.environ.get('TRACE_EXPORT_RATE', '0'))
+trace_exporter = TraceExporter(
+    os.environ.get('TRACE_EXPORT_PATH', str(Path(tempfile.gettempdir()) / 'padho-traces.ndjson'))
+) if TRACE_EXPORT_RATE > 0 else None
+
+# ==================== EXTERNAL CLIENTS ====================
+
+# App-lifetime HTTP client, opened on startup so every outbound call reuses
+# pooled keep-alive connections and cached DNS lookups
+http_session = None
+
+@functools.lru_cache(maxsize=None)
+def load_llm():
+    # emergentintegrations pulls in litellm, openai and the Google SDKs; only
+    # the AI routes need it, so keep it off the startup path
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    
+    class TracedLlmChat(LlmChat):
+        async def send_message(self, *args, **kwargs):
+            with span("llm"):
+                return await super().send_message(*args, **kwargs)
+    
+    return TracedLlmChat, UserMessage
+
+# ==================== CACHES ====================
+
+# Change streams keep per-worker caches coherent across workers and pods; if
+# the stream is down or lagging, entries fall back to a short TTL
+invalidation_bus = InvalidationBus(
+    ["courses", "lessons", "questions", "users", "user_sessions", "study_materials"],
+    # Names this process in bus stats and job leases; uvicorn workers on a host share the hostname
+    bus_id=f"{os.environ.get('CACHE_BUS_ID', socket.gethostname())}:{os.getpid()}",
+    max_lag_seconds=float(os.environ.get('CACHE_BUS_MAX_LAG_SECONDS', '5'))
+)
+session_cache = invalidation_bus.register(LocalCache("sessions", ttl=300, fallback_ttl=10, maxsize=50_000))
+# Stored profiles behind signed sessions, whose tokens only carry id and role
+user_profile_cache = invalidation_bus.register(LocalCache("user_profiles", ttl=3600, fallback_ttl=30, maxsize=100_000))
+answer_key_cache = invalidation_bus.register(LocalCache("answer_keys", ttl=3600, fallback_ttl=30))
+course_list_cache = invalidation_bus.register(LocalCache("course_lists", ttl=300, fallback_ttl=15, maxsize=1000))
+# Reviews, quizzes and assignments aren't on the bus, hence the short TTL
+course_detail_cache = invalidation_bus.register(LocalCache("course_details", ttl=60, fallback_ttl=15, maxsize=2000))
+lesson_course_cache = invalidation_bus.register(LocalCache("lesson_courses", ttl=3600, fallback_ttl=300, maxsize=100_000))
+# Quizzes never change course, so these need no invalidation
+quiz_course_cache = LocalCache("quiz_courses", ttl=3600, fallback_ttl=3600, maxsize=100_000)
+# (course, user, week) triples this worker already recorded as active
+activity_cache = LocalCache("course_activity", ttl=3600, fallback_ttl=3600, maxsize=200_000)
 
 # ==================== MODELS ====================
 
@@ -137,6 +240,7 @@ class Review(BaseModel):
     user_name: Optional[str] = None
     rating: float
     comment: str
+    helpful_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Certificate(BaseModel):
@@ -152,6 +256,7 @@ class Payment(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    course_id: Optional[str] = None
     amount: float
     type: str = "course"  # course, subscription
     status: str = "completed"  # completed, pending, failed
@@ -165,8 +270,43 @@ class BlogPost(BaseModel):
     author_id: str
     author_name: Optional[str] = None
     tags: List[str] = []
+    excerpt: Optional[str] = None
     published_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Default ("card") shapes of the list endpoints; their fields are the projections
+class CourseCard(BaseModel):
+    id: str
+    title: str
+    description: str
+    category: str
+    language: str
+    level: str = "beginner"
+    thumbnail: Optional[str] = None
+    instructor_name: Optional[str] = None
+    price: float = 0.0
+    rating: float = 0.0
+    total_ratings: int = 0
+    total_enrollments: int = 0
+    duration: str = "4 weeks"
+
+class BlogPostCard(BaseModel):
+    id: str
+    title: str
+    excerpt: Optional[str] = None
+    author_name: Optional[str] = None
+    tags: List[str] = []
+    published_at: datetime
+
+class StudyMaterialCard(BaseModel):
+    id: str
+    title: str
+    file_url: str
+    category: str
+    chapter: Optional[str] = None
+    tags: List[str] = []
+    preview_available: bool = False
+    downloads: int = 0
+
 # ==================== REQUEST MODELS ====================
 
 class RegisterRequest(BaseModel):
@@ -291,14 +431,26 @@ class AIRecommendationRequest(BaseModel):
 class AIChatRequest(BaseModel):
     message: str
     context: Optional[str] = None
+    course_id: Optional[str] = None
+    lesson_id: Optional[str] = None
 
 class AIQuizGenerateRequest(BaseModel):
-    content: str
-    num_questions: int = 5
+    content: str = Field(min_length=1)
+    num_questions: int = Field(default=5, ge=1, le=200)
 
 # ==================== AUTH HELPERS ====================
 
-async def get_current_user(request: Request, authorization: Optional[str] = Header(None)) -> Optional[User]:
+SESSION_TTL = timedelta(days=7)
+
+# "db" stores opaque tokens in user_sessions; "signed" issues HMAC-signed
+# tokens that are verified without touching the database
+SESSION_MODE = os.environ.get('SESSION_MODE', 'db')
+session_signer = SessionSigner.from_env(os.environ.get('SESSION_SIGNING_KEYS', ''))
+if SESSION_MODE == "signed" and session_signer is None:
+    raise RuntimeError("SESSION_MODE=signed requires SESSION_SIGNING_KEYS")
+revoked_sessions = RevocationList()
+
+def extract_session_token(request: Request, authorization: Optional[str]) -> Optional[str]:
     # Try cookie first
     session_token = request.cookies.get("session_token")
     
@@ -307,27 +459,96 @@ async def get_current_user(request: Request, authorization: Optional[str] = Head
         if authorization.startswith("Bearer "):
             session_token = authorization.replace("Bearer ", "")
     
+    return session_token
+
+async def create_session(user_doc: dict, session_token: Optional[str] = None) -> str:
+    expires_at = datetime.now(timezone.utc) + SESSION_TTL
+    
+    if SESSION_MODE == "signed":
+        token, _ = session_signer.issue(user_doc["id"], user_doc.get("role", "student"), expires_at)
+        return token
+    
+    session = UserSession(
+        user_id=user_doc["id"],
+        session_token=session_token or str(uuid.uuid4()),
+        expires_at=expires_at
+    )
+    
+    # Native dates so the TTL index on expires_at can purge expired sessions
+    await db.user_sessions.insert_one(session.model_dump())
+    return session.session_token
+
+async def load_user_profile(user_id: str) -> Optional[dict]:
+    profile = user_profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+    
+    user_doc = await db.users.find_one({"id": user_id}, {"password_hash": 0})
+    if not user_doc:
+        return None
+    user_oid = user_doc.pop("_id")
+    user_profile_cache.set(user_id, user_doc, tags=[doc_tag("users", "_id", user_oid), doc_tag("users", "id", user_id)])
+    return user_doc
+
+async def verify_signed_session(session_token: str) -> Optional[User]:
+    if session_signer is None:
+        return None
+    
+    claims = session_signer.verify(session_token)
+    if not claims or revoked_sessions.is_revoked(claims["j"]):
+        return None
+    
+    # Identity and role come from the token; the rest of the profile is the
+    # stored one, so signed and db sessions return the same user
+    profile = await load_user_profile(claims["u"])
+    if profile is None:
+        return None
+    return User(**{**profile, "id": claims["u"], "role": claims["r"]})
+
+@traced("auth")
+async def get_current_user(request: Request, authorization: Optional[str] = Header(None)) -> Optional[User]:
+    session_token = extract_session_token(request, authorization)
     if not session_token:
         return None
     
+    if is_signed_token(session_token):
+        return await verify_signed_session(session_token)
+    
+    cached = session_cache.get(session_token)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at >= datetime.now(timezone.utc):
+            return user
+        session_cache.invalidate(session_token)
+        return None
+    
     # Check session
     session = await db.user_sessions.find_one({"session_token": session_token})
     if not session:
         return None
     
-    # Check expiry
+    # Check expiry (legacy rows store ISO strings, Mongo hands back naive UTC dates)
     expires_at = session["expires_at"]
     if isinstance(expires_at, str):
         expires_at = datetime.fromisoformat(expires_at)
+    elif expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
     if expires_at < datetime.now(timezone.utc):
         return None
     
     # Get user
-    user_doc = await db.users.find_one({"id": session["user_id"]}, {"_id": 0})
+    user_doc = await db.users.find_one({"id": session["user_id"]})
     if not user_doc:
         return None
     
-    return User(**user_doc)
+    user_oid = user_doc.pop("_id")
+    user = User(**user_doc)
+    session_cache.set(session_token, (user, expires_at), tags=[
+        doc_tag("user_sessions", "_id", session["_id"]),
+        doc_tag("users", "_id", user_oid),
+        doc_tag("users", "id", user.id)
+    ])
+    return user
 
 async def require_auth(request: Request, authorization: Optional[str] = Header(None)) -> User:
     user = await get_current_user(request, authorization)
@@ -342,6 +563,304 @@ def require_role(roles: List[str]):
         return user
     return role_checker
 
+# ==================== RATE LIMITING ====================
+
+# "memory" limits per worker; "mongo" shares buckets across workers and pods
+# (its pipeline updates need the Mongo storage backend)
+if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == "mongo" and STORAGE_BACKEND == "mongo":
+    rate_limit_backend = MongoBucketBackend(db.rate_limits)
+else:
+    rate_limit_backend = MemoryBucketBackend()
+rate_limiter = RateLimiter(rate_limit_backend)
+
+LOGIN_IP_POLICY = RateLimitPolicy.from_env("login_ip", capacity=20, per_seconds=60, key="ip")
+LOGIN_ACCOUNT_POLICY = RateLimitPolicy.from_env("login_account", capacity=5, per_seconds=300, key="account")
+AI_CHAT_POLICY = RateLimitPolicy.from_env("ai_chat", capacity=10, per_seconds=60)
+AI_GENERATE_QUIZ_POLICY = RateLimitPolicy.from_env("ai_generate_quiz", capacity=5, per_seconds=600)
+AI_RECOMMENDATIONS_POLICY = RateLimitPolicy.from_env("ai_recommendations", capacity=5, per_seconds=300)
+
+def client_ip(request: Request) -> str:
+    if os.environ.get('TRUST_PROXY_HEADERS', 'false').lower() == 'true':
+        # Each proxy appends the address it was called from, so only the last
+        # TRUSTED_PROXY_HOPS entries are ours; anything left of them came from
+        # the client and can be anything
+        forwarded = [a.strip() for a in request.headers.get("x-forwarded-for", "").split(",") if a.strip()]
+        if forwarded:
+            hops = max(1, int(os.environ.get('TRUSTED_PROXY_HOPS', '1')))
+            return forwarded[-min(hops, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+def rate_limit(policy: RateLimitPolicy):
+    if policy.key == "ip":
+        async def ip_limiter(request: Request):
+            await rate_limiter.check(policy, f"ip:{client_ip(request)}")
+        return ip_limiter
+    
+    # require_auth is cached per request, so routes that also depend on it
+    # don't resolve the session twice
+    async def user_limiter(user: User = Depends(require_auth)):
+        await rate_limiter.check(policy, f"user:{user.id}")
+    return user_limiter
+
+# ==================== COURSE ANALYTICS ====================
+
+# course_analytics holds one rollup document per course, bumped with $inc
+# from the write paths and periodically rebuilt from the source collections
+# by reconcile_course_analytics() to correct any drift
+
+def analytics_week(now: Optional[datetime] = None) -> str:
+    year, week, _ = (now or datetime.now(timezone.utc)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+async def lookup_lesson_course(lesson_id: str) -> Optional[str]:
+    course_id = lesson_course_cache.get(lesson_id)
+    if course_id is None:
+        lesson = await db.lessons.find_one({"id": lesson_id}, {"_id": 0, "course_id": 1})
+        if not lesson:
+            return None
+        course_id = lesson["course_id"]
+        lesson_course_cache.set(lesson_id, course_id, tags=[doc_tag("lessons", "id", lesson_id)])
+    return course_id
+
+async def lookup_quiz_course(quiz_id: str) -> Optional[str]:
+    course_id = quiz_course_cache.get(quiz_id)
+    if course_id is None:
+        quiz = await db.quizzes.find_one({"id": quiz_id}, {"_id": 0, "course_id": 1})
+        if not quiz or not quiz.get("course_id"):
+            return None
+        course_id = quiz["course_id"]
+        quiz_course_cache.set(quiz_id, course_id)
+    return course_id
+
+async def record_course_activity(course_id: Optional[str], user_id: str, inc: Optional[Dict[str, float]] = None):
+    if not course_id:
+        return
+    
+    inc = dict(inc or {})
+    now = datetime.now(timezone.utc)
+    week = analytics_week(now)
+    
+    # Count each learner once per ISO week
+    activity_key = (course_id, user_id, week)
+    if activity_cache.get(activity_key) is None:
+        try:
+            result = await db.course_activity.update_one(
+                {"course_id": course_id, "user_id": user_id, "week": week},
+                {"$setOnInsert": {"first_active_at": now}},
+                upsert=True
+            )
+            if result.upserted_id is not None:
+                inc[f"active_learners.{week}"] = 1
+        except DuplicateKeyError:
+            pass
+        # Only once the row is known to exist; a failed write is retried next time
+        activity_cache.set(activity_key, True)
+    
+    if not inc:
+        return
+    
+    await db.course_analytics.update_one(
+        {"course_id": course_id},
+        {"$inc": inc, "$set": {"updated_at": now}},
+        upsert=True
+    )
+
+def progress_rollup_delta(previous: float, progress: float) -> Dict[str, float]:
+    # What an enrollment moving from previous to progress adds to its course rollup
+    inc = {"progress_sum": progress - previous}
+    if previous < 100 <= progress:
+        inc["completions"] = 1
+    elif progress < 100 <= previous:
+        inc["completions"] = -1
+    return inc
+
+def summarize_course_analytics(course_id: str, rollup: dict, week: str) -> dict:
+    enrollments = rollup.get("enrollments", 0)
+    quiz_attempts = rollup.get("quiz_attempts", 0)
+    return {
+        "course_id": course_id,
+        "enrollments": enrollments,
+        "completions": rollup.get("completions", 0),
+        "completion_rate": rollup.get("completions", 0) / enrollments * 100 if enrollments else 0.0,
+        "avg_progress": rollup.get("progress_sum", 0) / enrollments if enrollments else 0.0,
+        "quiz_attempts": quiz_attempts,
+        "avg_quiz_score": rollup.get("quiz_score_sum", 0) / quiz_attempts if quiz_attempts else 0.0,
+        "lessons_completed": rollup.get("lessons_completed", 0),
+        "active_learners_this_week": rollup.get("active_learners", {}).get(week, 0)
+    }
+
+async def reconcile_course_analytics():
+    now = datetime.now(timezone.utc)
+    rollups: Dict[str, dict] = defaultdict(lambda: {
+        "enrollments": 0,
+        "completions": 0,
+        "progress_sum": 0.0,
+        "quiz_attempts": 0,
+        "quiz_score_sum": 0.0,
+        "lessons_completed": 0,
+        "active_learners": {}
+    })
+    
+    async for row in db.enrollments.aggregate([
+        {"$group": {
+            "_id": "$course_id",
+            "enrollments": {"$sum": 1},
+            "completions": {"$sum": {"$cond": [{"$gte": ["$progress", 100]}, 1, 0]}},
+            "progress_sum": {"$sum": "$progress"}
+        }}
+    ], allowDiskUse=True):
+        rollup = rollups[row["_id"]]
+        rollup["enrollments"] = row["enrollments"]
+        rollup["completions"] = row["completions"]
+        rollup["progress_sum"] = row["progress_sum"]
+    
+    # Group before joining so $lookup runs once per quiz / lesson, not per row
+    async for row in db.quiz_results.aggregate([
+        {"$group": {"_id": "$quiz_id", "attempts": {"$sum": 1}, "score_sum": {"$sum": "$score"}}},
+        {"$lookup": {"from": "quizzes", "localField": "_id", "foreignField": "id", "as": "quiz"}},
+        {"$unwind": "$quiz"},
+        {"$match": {"quiz.course_id": {"$ne": None}}},
+        {"$group": {"_id": "$quiz.course_id", "attempts": {"$sum": "$attempts"}, "score_sum": {"$sum": "$score_sum"}}}
+    ], allowDiskUse=True):
+        rollup = rollups[row["_id"]]
+        rollup["quiz_attempts"] = row["attempts"]
+        rollup["quiz_score_sum"] = row["score_sum"]
+    
+    async for row in db.video_progress.aggregate([
+        {"$match": {"completed": True}},
+        {"$group": {"_id": "$lesson_id", "completed": {"$sum": 1}}},
+        {"$lookup": {"from": "lessons", "localField": "_id", "foreignField": "id", "as": "lesson"}},
+        {"$unwind": "$lesson"},
+        {"$group": {"_id": "$lesson.course_id", "lessons_completed": {"$sum": "$completed"}}}
+    ], allowDiskUse=True):
+        rollups[row["_id"]]["lessons_completed"] = row["lessons_completed"]
+    
+    async for row in db.course_activity.aggregate([
+        {"$group": {"_id": {"course_id": "$course_id", "week": "$week"}, "learners": {"$sum": 1}}}
+    ], allowDiskUse=True):
+        rollups[row["_id"]["course_id"]]["active_learners"][row["_id"]["week"]] = row["learners"]
+    
+    ops = [
+        UpdateOne(
+            {"course_id": course_id},
+            {"$set": {**rollup, "updated_at": now, "reconciled_at": now}},
+            upsert=True
+        )
+        for course_id, rollup in rollups.items() if course_id
+    ]
+    for i in range(0, len(ops), 1000):
+        await db.course_analytics.bulk_write(ops[i:i + 1000], ordered=False)
+    
+    return len(ops)
+
+# ==================== CONTENT INDEX ====================
+
+# Course text the AI tutor can retrieve from. Kept in memory per worker,
+# updated in place on content writes (locally and via the invalidation bus)
+content_index = VectorIndex(
+    HashingEmbedder(dim=int(os.environ.get('RAG_EMBEDDING_DIM', '256'))),
+    max_chunk_tokens=int(os.environ.get('RAG_CHUNK_TOKENS', '160'))
+)
+RAG_TOP_K = int(os.environ.get('RAG_TOP_K', '6'))
+RAG_TOKEN_BUDGET = int(os.environ.get('RAG_TOKEN_BUDGET', '800'))
+RAG_BUILD_BATCH = 2000
+
+CONTENT_PROJECTIONS = {
+    "courses": {"_id": 1, "id": 1, "title": 1, "description": 1, "syllabus": 1, "tags": 1, "level": 1},
+    "lessons": {"_id": 1, "id": 1, "course_id": 1, "title": 1, "description": 1},
+    "study_materials": {"_id": 1, "id": 1, "title": 1, "category": 1, "chapter": 1, "tags": 1},
+}
+
+def category_scope(category: str) -> str:
+    return f"category:{category}"
+
+def content_source(collection: str, doc: dict) -> Optional[SourceDocument]:
+    oid = str(doc["_id"]) if doc.get("_id") is not None else None
+    if collection == "courses":
+        parts = [doc.get("description") or "", doc.get("syllabus") or "", " ".join(doc.get("tags") or [])]
+        return SourceDocument("course", doc["id"], doc["id"], doc.get("title", ""), "\n".join(p for p in parts if p), oid)
+    if collection == "lessons":
+        return SourceDocument("lesson", doc["id"], doc["course_id"], doc.get("title", ""), doc.get("description") or "", oid)
+    if collection == "study_materials":
+        parts = [doc.get("chapter") or "", " ".join(doc.get("tags") or [])]
+        return SourceDocument(
+            "study_material", doc["id"], category_scope(doc.get("category", "")), doc.get("title", ""), " ".join(p for p in parts if p), oid
+        )
+    return None
+
+def index_content(collection: str, doc: dict):
+    source = content_source(collection, doc)
+    if source is not None:
+        content_index.apply(content_index.prepare([source]))
+
+async def build_content_index():
+    content_index.begin_build()
+    seen = None
+    try:
+        keys = set()
+        for collection, projection in CONTENT_PROJECTIONS.items():
+            cursor = db[collection].find({}, projection).batch_size(RAG_BUILD_BATCH)
+            while True:
+                docs = await cursor.to_list(RAG_BUILD_BATCH)
+                if not docs:
+                    break
+                sources = [content_source(collection, d) for d in docs]
+                keys.update((source.source_type, source.source_id) for source in sources)
+                # Embedding a few thousand chunks is milliseconds of CPU each batch; keep it off the loop
+                prepared = await asyncio.to_thread(content_index.prepare, sources)
+                content_index.apply(prepared, from_build=True)
+        seen = keys
+    finally:
+        content_index.finish_build(seen)
+    logging.info(f"Content index built: {content_index.stats()}")
+
+# (collection, field) -> values waiting to be re-read; batched so bursts of
+# writes to one course (enrollment counters, downloads) cost one query
+content_refresh_pending: Dict[tuple, set] = defaultdict(set)
+content_rebuild_requested = False
+
+def queue_content_refresh(collection: str, field: str, value: Any):
+    content_refresh_pending[(collection, field)].add(value)
+
+def on_content_change(event):
+    global content_rebuild_requested
+    if event.collection not in CONTENT_PROJECTIONS:
+        return
+    if event.is_reset:
+        content_rebuild_requested = True
+    elif event.operation == "delete":
+        content_index.remove_oid(str(event.document_id))
+    elif event.document_id is not None:
+        queue_content_refresh(event.collection, "_id", event.document_id)
+
+invalidation_bus.subscribe(on_content_change)
+
+async def refresh_content_index():
+    global content_rebuild_requested
+    if content_rebuild_requested:
+        content_rebuild_requested = False
+        content_refresh_pending.clear()
+        await build_content_index()
+        return
+    
+    pending = dict(content_refresh_pending)
+    content_refresh_pending.clear()
+    for (collection, field), values in pending.items():
+        docs = await db[collection].find({field: {"$in": list(values)}}, CONTENT_PROJECTIONS[collection]).to_list(len(values))
+        sources = [content_source(collection, d) for d in docs]
+        content_index.apply(await asyncio.to_thread(content_index.prepare, sources))
+
+async def retrieve_course_context(course_id: str, query: str) -> List[dict]:
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0, "category": 1})
+    if not course:
+        return []
+    
+    scopes = [course_id, category_scope(course.get("category", ""))]
+    return [
+        {"type": chunk.source_type, "id": chunk.source_id, "title": chunk.title, "text": chunk.text, "score": round(score, 3)}
+        for score, chunk in content_index.search(query, scopes, k=RAG_TOP_K, token_budget=RAG_TOKEN_BUDGET)
+    ]
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register")
@@ -363,39 +882,30 @@ async def register(req: RegisterRequest):
     )
     
     user_doc = user.model_dump()
-    user_doc["created_at"] = user_doc["created_at"].isoformat()
     await db.users.insert_one(user_doc)
     
     return {"message": "User registered successfully", "user_id": user.id}
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(rate_limit(LOGIN_IP_POLICY))])
 async def login(req: LoginRequest, response: Response):
+    # Cap guesses per account too, so spreading attempts over many IPs doesn't
+    # help. Only failures are charged: anyone can send an email address, and
+    # the owner's own logins must not use up its bucket.
+    account_key = f"email:{req.email.lower()}"
+    await rate_limiter.check(LOGIN_ACCOUNT_POLICY, account_key, cost=0)
+    
     # Find user
     user_doc = await db.users.find_one({"email": req.email}, {"_id": 0})
-    if not user_doc:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not user_doc.get("password_hash"):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    if not bcrypt.checkpw(req.password.encode('utf-8'), user_doc["password_hash"].encode('utf-8')):
+    if not user_doc or not user_doc.get("password_hash") or not bcrypt.checkpw(
+        req.password.encode('utf-8'), user_doc["password_hash"].encode('utf-8')
+    ):
+        await rate_limiter.charge(LOGIN_ACCOUNT_POLICY, account_key)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create session
-    session_token = str(uuid.uuid4())
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-    
-    session = UserSession(
-        user_id=user_doc["id"],
-        session_token=session_token,
-        expires_at=expires_at
-    )
-    
-    session_doc = session.model_dump()
-    session_doc["expires_at"] = session_doc["expires_at"].isoformat()
-    session_doc["created_at"] = session_doc["created_at"].isoformat()
-    await db.user_sessions.insert_one(session_doc)
+    session_token = await create_session(user_doc)
     
     # Set cookie
     response.set_cookie(
@@ -404,7 +914,7 @@ async def login(req: LoginRequest, response: Response):
         httponly=True,
         secure=True,
         samesite="none",
-        max_age=7*24*60*60,
+        max_age=int(SESSION_TTL.total_seconds()),
         path="/"
     )
     
@@ -418,15 +928,21 @@ async def login(req: LoginRequest, response: Response):
 @api_router.get("/auth/google")
 async def google_auth_callback(session_id: str, response: Response):
     # Call Emergent auth API
-    import aiohttp
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
+    if http_session is None:
+        # Startup hook hasn't run (or the worker is shutting down)
+        logging.error("Auth provider call attempted without an HTTP session")
+        raise HTTPException(status_code=503, detail="Auth provider unavailable")
+    try:
+        async with http_session.get(
             "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
             headers={"X-Session-ID": session_id}
         ) as resp:
             if resp.status != 200:
                 raise HTTPException(status_code=400, detail="Invalid session")
             data = await resp.json()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(f"Auth provider error: {e}")
+        raise HTTPException(status_code=502, detail="Auth provider unavailable")
     
     # Check if user exists
     user_doc = await db.users.find_one({"email": data["email"]}, {"_id": 0})
@@ -440,23 +956,10 @@ async def google_auth_callback(session_id: str, response: Response):
             role="student"
         )
         user_doc = user.model_dump()
-        user_doc["created_at"] = user_doc["created_at"].isoformat()
         await db.users.insert_one(user_doc)
     
     # Create session
-    session_token = data["session_token"]
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-    
-    session = UserSession(
-        user_id=user_doc["id"],
-        session_token=session_token,
-        expires_at=expires_at
-    )
-    
-    session_doc = session.model_dump()
-    session_doc["expires_at"] = session_doc["expires_at"].isoformat()
-    session_doc["created_at"] = session_doc["created_at"].isoformat()
-    await db.user_sessions.insert_one(session_doc)
+    session_token = await create_session(user_doc, data["session_token"])
     
     # Set cookie
     response.set_cookie(
@@ -465,7 +968,7 @@ async def google_auth_callback(session_id: str, response: Response):
         httponly=True,
         secure=True,
         samesite="none",
-        max_age=7*24*60*60,
+        max_age=int(SESSION_TTL.total_seconds()),
         path="/"
     )
     
@@ -481,22 +984,193 @@ async def get_me(user: User = Depends(require_auth)):
 
 @api_router.post("/auth/logout")
 async def logout(response: Response, user: User = Depends(require_auth), request: Request = None):
-    session_token = request.cookies.get("session_token")
-    if session_token:
+    session_token = extract_session_token(request, request.headers.get("authorization"))
+    if session_token and is_signed_token(session_token):
+        claims = session_signer.verify(session_token) if session_signer else None
+        if claims:
+            await revoked_sessions.revoke(db, claims)
+    elif session_token:
         await db.user_sessions.delete_one({"session_token": session_token})
+        session_cache.invalidate(session_token)
     
     response.delete_cookie("session_token", path="/")
     return {"message": "Logged out successfully"}
 
+# ==================== LIST PROJECTIONS ====================
+
+# List pages only render cards, so list endpoints default to the "card"
+# profile and push it down to Mongo as a projection. "full" returns whole
+# documents; fields= picks an explicit subset.
+COURSE_CARD_FIELDS = tuple(CourseCard.model_fields)
+LIST_PROFILES: Dict[str, Dict[str, Optional[Tuple[str, ...]]]] = {
+    "courses": {"card": COURSE_CARD_FIELDS, "full": None},
+    "blog_posts": {"card": tuple(BlogPostCard.model_fields), "full": None},
+    "study_materials": {"card": tuple(StudyMaterialCard.model_fields), "full": None},
+}
+LIST_RESPONSE_DESCRIPTION = "Cards by default; profile=full returns whole documents, fields= an explicit subset"
+LIST_FIELDS = {
+    "courses": set(Course.model_fields),
+    "blog_posts": set(BlogPost.model_fields),
+    "study_materials": set(StudyMaterial.model_fields),
+}
+# Projected documents are partial, so they are encoded as-is rather than validated
+sparse_list_adapter = TypeAdapter(List[Dict[str, Any]])
+
+BLOG_EXCERPT_CHARS = 240
+_MARKUP_RE = re.compile(r"<[^>]+>|!?\[([^\]]*)\]\([^)]*\)|[#*_`>~|]+")
+
+def resolve_fields(collection: str, profile: str, fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = sorted(requested - LIST_FIELDS[collection])
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return tuple(sorted(requested | {"id"}))
+    if profile not in LIST_PROFILES[collection]:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {', '.join(LIST_PROFILES[collection])}")
+    return LIST_PROFILES[collection][profile]
+
+def list_projection(selected: Optional[Tuple[str, ...]]) -> Dict[str, int]:
+    projection = {"_id": 0}
+    if selected is not None:
+        projection.update({field: 1 for field in selected})
+    return projection
+
+def dump_list(adapter: TypeAdapter, docs: List[dict], selected: Optional[Tuple[str, ...]]) -> bytes:
+    if selected is None:
+        return adapter.dump_json(adapter.validate_python(docs))
+    return sparse_list_adapter.dump_json(docs)
+
+def blog_excerpt(content: str, limit: int = BLOG_EXCERPT_CHARS) -> str:
+    # Plain text from markdown/HTML, cut on a word boundary
+    text = " ".join(_MARKUP_RE.sub(lambda m: m.group(1) or " ", content).split())
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip(" ,.;:") + "\u2026"
+
+# ==================== COURSE RANKINGS ====================
+
+# Popular, trending and top-rated lists per category/language, kept in memory
+# per worker. Local enrollments and reviews update them directly; other
+# workers' writes arrive through the invalidation bus, and a periodic full
+# rebuild bounds any drift.
+RANKING_TOP_K = int(os.environ.get('RANKING_TOP_K', '50'))
+RANKING_WINDOW = timedelta(hours=float(os.environ.get('RANKING_TRENDING_WINDOW_HOURS', '168')))
+RANKING_BUILD_BATCH = 2000
+RANKING_PROJECTION = {**list_projection(COURSE_CARD_FIELDS), "_id": 1}
+
+def new_course_rankings() -> CourseRankings:
+    return CourseRankings(
+        k=RANKING_TOP_K,
+        window_seconds=RANKING_WINDOW.total_seconds(),
+        bucket_seconds=float(os.environ.get('RANKING_BUCKET_SECONDS', '3600')),
+        rating_prior=float(os.environ.get('RANKING_RATING_PRIOR', '10'))
+    )
+
+course_rankings = new_course_rankings()
+
+async def build_course_rankings():
+    global course_rankings
+    now = datetime.now(timezone.utc)
+    courses = await db.courses.find({}, RANKING_PROJECTION).to_list(None)
+    recent = []
+    cursor = db.enrollments.find(
+        {"enrolled_at": {"$gte": now - RANKING_WINDOW}}, {"_id": 0, "course_id": 1, "enrolled_at": 1}
+    ).batch_size(RANKING_BUILD_BATCH)
+    async for enrollment in cursor:
+        if isinstance(enrollment.get("enrolled_at"), datetime):
+            recent.append((enrollment["course_id"], enrollment["enrolled_at"]))
+    # Sorting a few thousand courses per slice is CPU work, so it runs off the
+    # loop on a fresh instance that is swapped in whole once built
+    rankings = new_course_rankings()
+    await asyncio.to_thread(rankings.load, courses, recent, now)
+    course_rankings = rankings
+    logging.info(f"Course rankings built: {course_rankings.stats()}")
+
+# Same batching as the content index: (field, values) of courses to re-read
+ranking_refresh_pending: Dict[str, set] = defaultdict(set)
+ranking_rebuild_requested = False
+
+def queue_ranking_refresh(field: str, value: Any):
+    ranking_refresh_pending[field].add(value)
+
+def on_ranking_change(event):
+    global ranking_rebuild_requested
+    if event.collection != "courses":
+        return
+    if event.is_reset:
+        ranking_rebuild_requested = True
+    elif event.operation == "delete":
+        course_rankings.remove_oid(str(event.document_id))
+    elif event.document_id is not None:
+        queue_ranking_refresh("_id", event.document_id)
+
+invalidation_bus.subscribe(on_ranking_change)
+
+async def refresh_course_rankings(rebuild: bool = False):
+    global ranking_rebuild_requested
+    if rebuild or ranking_rebuild_requested:
+        ranking_rebuild_requested = False
+        ranking_refresh_pending.clear()
+        await build_course_rankings()
+        return
+    if not course_rankings.ready:
+        return
+    
+    now = datetime.now(timezone.utc)
+    pending = dict(ranking_refresh_pending)
+    ranking_refresh_pending.clear()
+    for field, values in pending.items():
+        docs = await db.courses.find({field: {"$in": list(values)}}, RANKING_PROJECTION).to_list(len(values))
+        for doc in docs:
+            course_rankings.upsert_course(doc, now)
+    course_rankings.advance(now)
+
+@api_router.get("/rankings/{list_name}")
+async def get_course_rankings(
+    list_name: str,
+    category: Optional[str] = None,
+    language: Optional[str] = None,
+    limit: int = Query(10, ge=1)
+):
+    if list_name not in RANKING_LISTS:
+        raise HTTPException(status_code=400, detail=f"list must be one of {', '.join(RANKING_LISTS)}")
+    if not course_rankings.ready:
+        raise HTTPException(status_code=503, detail="Rankings are still being built")
+    return {"list": list_name, "courses": course_rankings.top(list_name, category, language, min(limit, RANKING_TOP_K))}
+
 # ==================== COURSE ROUTES ====================
 
-@api_router.get("/courses", response_model=List[Course])
+course_list_adapter = TypeAdapter(List[Course])
+
+@api_router.get("/courses", response_model=List[CourseCard], response_description=LIST_RESPONSE_DESCRIPTION)
 async def get_courses(
+    request: Request,
+    category: Optional[str] = None,
+    level: Optional[str] = None,
+    language: Optional[str] = None,
+    search: Optional[str] = None,
+    profile: str = "card",
+    fields: Optional[str] = None
+):
+    selected = resolve_fields("courses", profile, fields)
+    payload = await load_course_list(category, level, language, search, selected)
+    return await payload.response(request.headers.get("accept-encoding", ""))
+
+async def load_course_list(
     category: Optional[str] = None,
     level: Optional[str] = None,
     language: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    selected: Optional[Tuple[str, ...]] = COURSE_CARD_FIELDS
 ):
+    # Cache the serialized body so hits skip validation, encoding and compression
+    cache_key = (category, level, language, search, selected)
+    payload = course_list_cache.get(cache_key)
+    if payload is not None:
+        return payload
+    
     query = {}
     if category:
         query["category"] = category
@@ -510,8 +1184,10 @@ async def get_courses(
             {"description": {"$regex": search, "$options": "i"}}
         ]
     
-    courses = await db.courses.find(query, {"_id": 0}).to_list(1000)
-    return courses
+    courses = await db.courses.find(query, list_projection(selected)).to_list(1000)
+    payload = compression_config.payload(dump_list(course_list_adapter, courses, selected))
+    course_list_cache.set(cache_key, payload, tags=["courses"])
+    return payload
 
 @api_router.get("/courses/{course_id}", response_model=Course)
 async def get_course(course_id: str):
@@ -529,8 +1205,10 @@ async def create_course(req: CourseCreate, user: User = Depends(require_role(["i
     )
     
     course_doc = course.model_dump()
-    course_doc["created_at"] = course_doc["created_at"].isoformat()
     await db.courses.insert_one(course_doc)
+    invalidate_course_caches()
+    index_content("courses", course_doc)
+    course_rankings.upsert_course({f: course_doc[f] for f in RANKING_PROJECTION if f in course_doc}, datetime.now(timezone.utc))
     
     return course
 
@@ -547,6 +1225,9 @@ async def update_course(course_id: str, req: CourseCreate, user: User = Depends(
         {"id": course_id},
         {"$set": req.model_dump()}
     )
+    invalidate_course_caches(course_id)
+    queue_content_refresh("courses", "id", course_id)
+    queue_ranking_refresh("id", course_id)
     
     return {"message": "Course updated successfully"}
 
@@ -560,29 +1241,120 @@ async def delete_course(course_id: str, user: User = Depends(require_role(["inst
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.courses.delete_one({"id": course_id})
+    invalidate_course_caches(course_id)
+    content_index.remove_scope(course_id)
+    course_rankings.remove(course_id)
     return {"message": "Course deleted successfully"}
 
+# Sizes of the embedded first pages on the course detail endpoint
+COURSE_DETAIL_REVIEWS = 10
+COURSE_DETAIL_LIMIT = 500
+
+def invalidate_course_caches(course_id: Optional[str] = None):
+    course_list_cache.invalidate_tags(["courses"])
+    if course_id:
+        course_detail_cache.invalidate(course_id)
+
+async def load_course_detail(course_id: str):
+    # Public part of the course page; cached together with its precompressed body
+    cached = course_detail_cache.get(course_id)
+    if cached is not None:
+        return cached
+    
+    course, lessons, reviews, quizzes, review_summary = await asyncio.gather(
+        db.courses.find_one({"id": course_id}),
+        db.lessons.find(
+            {"course_id": course_id},
+            {"id": 1, "title": 1, "description": 1, "order": 1, "duration": 1, "video_url": 1}
+        ).sort("order", 1).to_list(COURSE_DETAIL_LIMIT),
+        db.reviews.find(
+            {"course_id": course_id},
+            {"_id": 0, "id": 1, "user_name": 1, "rating": 1, "comment": 1, "created_at": 1}
+        ).sort(REVIEW_SORTS["newest"]).limit(COURSE_DETAIL_REVIEWS).to_list(COURSE_DETAIL_REVIEWS),
+        db.quizzes.find(
+            {"course_id": course_id},
+            {"_id": 0, "id": 1, "title": 1, "duration": 1, "total_marks": 1}
+        ).to_list(COURSE_DETAIL_LIMIT),
+        load_rating_summary(course_id)
+    )
+    if not course:
+        return None
+    
+    tags = [doc_tag("courses", "_id", course.pop("_id")), doc_tag("lessons", "course_id", course_id)]
+    tags += [doc_tag("lessons", "_id", lesson.pop("_id")) for lesson in lessons]
+    
+    detail = {
+        "course": Course(**course).model_dump(mode="json"),
+        "lessons": lessons,
+        "review_summary": review_summary,
+        "reviews": reviews,
+        "quizzes": quizzes,
+        "assignments": [],
+        "enrollment": None
+    }
+    entry = (detail, compression_config.payload(json.dumps(jsonable_encoder(detail)).encode("utf-8")))
+    course_detail_cache.set(course_id, entry, tags=tags)
+    return entry
+
+@api_router.get("/courses/{course_id}/detail")
+async def get_course_detail(course_id: str, request: Request, user: Optional[User] = Depends(get_current_user)):
+    if user is None:
+        entry = await load_course_detail(course_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Course not found")
+        return await entry[1].response(request.headers.get("accept-encoding", ""))
+    
+    entry, enrollment, assignments = await asyncio.gather(
+        load_course_detail(course_id),
+        db.enrollments.find_one(
+            {"user_id": user.id, "course_id": course_id},
+            {"_id": 0, "id": 1, "progress": 1, "last_watched_lesson_id": 1, "enrolled_at": 1}
+        ),
+        db.assignments.find(
+            {"course_id": course_id},
+            {"_id": 0, "id": 1, "lesson_id": 1, "title": 1, "description": 1, "max_score": 1, "due_date": 1}
+        ).to_list(COURSE_DETAIL_LIMIT)
+    )
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    return {**entry[0], "assignments": assignments, "enrollment": enrollment}
+
 # ==================== ENROLLMENT ROUTES ====================
 
-@api_router.post("/enrollments")
-async def enroll_course(course_id: str, user: User = Depends(require_auth)):
-    # Check if already enrolled
-    existing = await db.enrollments.find_one({"user_id": user.id, "course_id": course_id})
+async def upsert_enrollment(user_id: str, course_id: str):
+    # One round trip on the unique (user_id, course_id) key: the document
+    # returned is the one that existed before, or None if this call inserted it
+    enrollment = Enrollment(user_id=user_id, course_id=course_id)
+    try:
+        existing = await db.enrollments.find_one_and_update(
+            {"user_id": user_id, "course_id": course_id},
+            {"$setOnInsert": enrollment.model_dump()},
+            projection={"_id": 0, "id": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        # A concurrent retry inserted it between our match and insert
+        existing = await db.enrollments.find_one({"user_id": user_id, "course_id": course_id}, {"_id": 0, "id": 1})
     if existing:
-        return {"message": "Already enrolled"}
+        return existing["id"], False
     
-    enrollment = Enrollment(user_id=user.id, course_id=course_id)
-    enrollment_doc = enrollment.model_dump()
-    enrollment_doc["enrolled_at"] = enrollment_doc["enrolled_at"].isoformat()
-    await db.enrollments.insert_one(enrollment_doc)
-    
-    # Update course enrollment count
+    # Counters only move for the request that actually created the enrollment
     await db.courses.update_one(
         {"id": course_id},
         {"$inc": {"total_enrollments": 1}}
     )
-    
-    return {"message": "Enrolled successfully", "enrollment_id": enrollment.id}
+    course_rankings.record_enrollment(course_id, enrollment.enrolled_at)
+    await record_course_activity(course_id, user_id, {"enrollments": 1})
+    return enrollment.id, True
+
+@api_router.post("/enrollments")
+async def enroll_course(course_id: str, user: User = Depends(require_auth)):
+    enrollment_id, created = await upsert_enrollment(user.id, course_id)
+    if not created:
+        return {"message": "Already enrolled", "enrollment_id": enrollment_id}
+    return {"message": "Enrolled successfully", "enrollment_id": enrollment_id}
 
 @api_router.get("/enrollments/my", response_model=List[Enrollment])
 async def get_my_enrollments(user: User = Depends(require_auth)):
@@ -591,17 +1363,22 @@ async def get_my_enrollments(user: User = Depends(require_auth)):
 
 @api_router.put("/enrollments/{enrollment_id}/progress")
 async def update_progress(enrollment_id: str, progress: float, lesson_id: Optional[str] = None, user: User = Depends(require_auth)):
-    enrollment = await db.enrollments.find_one({"id": enrollment_id, "user_id": user.id})
-    if not enrollment:
-        raise HTTPException(status_code=404, detail="Enrollment not found")
-    
     update_data = {"progress": progress}
     if lesson_id:
         update_data["last_watched_lesson_id"] = lesson_id
     
-    await db.enrollments.update_one(
-        {"id": enrollment_id},
-        {"$set": update_data}
+    # The pre-update document gives the exact progress this write replaced
+    enrollment = await db.enrollments.find_one_and_update(
+        {"id": enrollment_id, "user_id": user.id},
+        {"$set": update_data},
+        projection={"_id": 0, "course_id": 1, "progress": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not enrollment:
+        raise HTTPException(status_code=404, detail="Enrollment not found")
+    
+    await record_course_activity(
+        enrollment["course_id"], user.id, progress_rollup_delta(enrollment.get("progress", 0), progress)
     )
     
     return {"message": "Progress updated"}
@@ -625,15 +1402,24 @@ async def create_lesson(req: LessonCreate, user: User = Depends(require_role(["i
     
     lesson = Lesson(**req.model_dump())
     lesson_doc = lesson.model_dump()
-    lesson_doc["created_at"] = lesson_doc["created_at"].isoformat()
     await db.lessons.insert_one(lesson_doc)
+    course_detail_cache.invalidate(req.course_id)
+    index_content("lessons", lesson_doc)
     
     return lesson
 
 # ==================== STUDY MATERIAL ROUTES ====================
 
-@api_router.get("/study-materials", response_model=List[StudyMaterial])
-async def get_study_materials(category: Optional[str] = None, search: Optional[str] = None):
+study_material_list_adapter = TypeAdapter(List[StudyMaterial])
+
+@api_router.get("/study-materials", response_model=List[StudyMaterialCard], response_description=LIST_RESPONSE_DESCRIPTION)
+async def get_study_materials(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    profile: str = "card",
+    fields: Optional[str] = None
+):
+    selected = resolve_fields("study_materials", profile, fields)
     query = {}
     if category:
         query["category"] = category
@@ -643,15 +1429,15 @@ async def get_study_materials(category: Optional[str] = None, search: Optional[s
             {"tags": {"$regex": search, "$options": "i"}}
         ]
     
-    materials = await db.study_materials.find(query, {"_id": 0}).to_list(1000)
-    return materials
+    materials = await db.study_materials.find(query, list_projection(selected)).to_list(1000)
+    return Response(dump_list(study_material_list_adapter, materials, selected), media_type="application/json")
 
 @api_router.post("/study-materials", response_model=StudyMaterial)
 async def upload_study_material(req: StudyMaterialCreate, user: User = Depends(require_role(["instructor", "admin"]))):
     material = StudyMaterial(**req.model_dump(), uploaded_by=user.id)
     material_doc = material.model_dump()
-    material_doc["created_at"] = material_doc["created_at"].isoformat()
     await db.study_materials.insert_one(material_doc)
+    index_content("study_materials", material_doc)
     
     return material
 
@@ -684,8 +1470,9 @@ async def get_quizzes(course_id: Optional[str] = None):
 async def create_quiz(req: QuizCreate, user: User = Depends(require_role(["instructor", "admin"]))):
     quiz = Quiz(**req.model_dump())
     quiz_doc = quiz.model_dump()
-    quiz_doc["created_at"] = quiz_doc["created_at"].isoformat()
     await db.quizzes.insert_one(quiz_doc)
+    if req.course_id:
+        course_detail_cache.invalidate(req.course_id)
     
     return quiz
 
@@ -693,6 +1480,7 @@ async def create_quiz(req: QuizCreate, user: User = Depends(require_role(["instr
 async def create_question(req: QuestionCreate, user: User = Depends(require_role(["instructor", "admin"]))):
     question = Question(**req.model_dump())
     await db.questions.insert_one(question.model_dump())
+    answer_key_cache.invalidate(req.quiz_id)
     return question
 
 @api_router.get("/quizzes/{quiz_id}/questions", response_model=List[Question])
@@ -700,10 +1488,30 @@ async def get_quiz_questions(quiz_id: str, user: User = Depends(require_auth)):
     questions = await db.questions.find({"quiz_id": quiz_id}, {"_id": 0, "correct_answer": 0}).to_list(1000)
     return questions
 
+async def load_answer_keys(quiz_ids: List[str]) -> Dict[str, List[dict]]:
+    keys = {quiz_id: answer_key_cache.get(quiz_id) for quiz_id in quiz_ids}
+    missing = [quiz_id for quiz_id, questions in keys.items() if questions is None]
+    if not missing:
+        return keys
+    
+    # One query for every missing quiz, then cached per quiz
+    fetched: Dict[str, List[dict]] = {quiz_id: [] for quiz_id in missing}
+    tags: Dict[str, List[str]] = {quiz_id: [doc_tag("questions", "quiz_id", quiz_id)] for quiz_id in missing}
+    async for question in db.questions.find(
+        {"quiz_id": {"$in": missing}}, {"id": 1, "quiz_id": 1, "correct_answer": 1, "marks": 1}
+    ):
+        quiz_id = question.pop("quiz_id")
+        tags[quiz_id].append(doc_tag("questions", "_id", question.pop("_id")))
+        fetched[quiz_id].append(question)
+    for quiz_id, questions in fetched.items():
+        answer_key_cache.set(quiz_id, questions, tags=tags[quiz_id])
+        keys[quiz_id] = questions
+    return keys
+
 @api_router.post("/quizzes/submit")
 async def submit_quiz(req: QuizSubmission, user: User = Depends(require_auth)):
-    # Get all questions
-    questions = await db.questions.find({"quiz_id": req.quiz_id}, {"_id": 0}).to_list(1000)
+    questions = await load_answer_keys([req.quiz_id])
+    questions = questions[req.quiz_id]
     
     # Calculate score
     total_marks = 0
@@ -725,9 +1533,12 @@ async def submit_quiz(req: QuizSubmission, user: User = Depends(require_auth)):
     )
     
     result_doc = result.model_dump()
-    result_doc["completed_at"] = result_doc["completed_at"].isoformat()
     await db.quiz_results.insert_one(result_doc)
     
+    await record_course_activity(
+        await lookup_quiz_course(req.quiz_id), user.id, {"quiz_attempts": 1, "quiz_score_sum": score}
+    )
+    
     return {
         "score": score,
         "earned_marks": earned_marks,
@@ -748,36 +1559,204 @@ async def get_leaderboard(quiz_id: str, limit: int = 10):
 
 # ==================== REVIEW ROUTES ====================
 
+REVIEW_PAGE_SIZE = 20
+MAX_REVIEW_PAGE_SIZE = 100
+
+# Every order ends in (created_at, id) so keyset cursors are unambiguous;
+# each one has a matching compound index in ensure_indexes
+REVIEW_SORTS = {
+    "newest": [("created_at", -1), ("id", -1)],
+    "highest": [("rating", -1), ("created_at", -1), ("id", -1)],
+    "lowest": [("rating", 1), ("created_at", -1), ("id", -1)],
+    "helpful": [("helpful_count", -1), ("created_at", -1), ("id", -1)],
+}
+
+def rating_bucket(rating: float) -> str:
+    return str(min(5, max(1, int(round(rating)))))
+
+def rating_summary(doc: Optional[dict]) -> dict:
+    counts = (doc or {}).get("counts", {})
+    total = (doc or {}).get("total", 0)
+    return {
+        "average_rating": round(doc["sum"] / total, 2) if total else 0.0,
+        "total_ratings": total,
+        "histogram": {str(star): counts.get(str(star), 0) for star in range(1, 6)}
+    }
+
+async def load_rating_summary(course_id: str) -> dict:
+    doc = await db.course_ratings.find_one({"course_id": course_id}, {"_id": 0})
+    if doc is None:
+        # Courses reviewed before the summary existed get it built once from their reviews
+        counts: Dict[str, int] = defaultdict(int)
+        total, rating_sum = 0, 0.0
+        async for row in db.reviews.aggregate([
+            {"$match": {"course_id": course_id}},
+            {"$group": {"_id": "$rating", "count": {"$sum": 1}}}
+        ]):
+            counts[rating_bucket(row["_id"])] += row["count"]
+            total += row["count"]
+            rating_sum += row["_id"] * row["count"]
+        doc = {"course_id": course_id, "counts": dict(counts), "total": total, "sum": rating_sum}
+        await db.course_ratings.update_one({"course_id": course_id}, {"$setOnInsert": doc}, upsert=True)
+    return rating_summary(doc)
+
+# Courses whose reviews all hold native created_at dates. New reviews always
+# do, so once a course qualifies it stays qualified.
+review_keyset_cache = LocalCache("review_keyset_courses", ttl=3600, fallback_ttl=3600, maxsize=100_000)
+
+async def review_keyset_ready(course_id: str) -> bool:
+    # Keyset cursors compare created_at, and Mongo brackets comparisons by type:
+    # until migrate_dates.py has converted a course's legacy ISO strings, its
+    # pages are cut by offset instead. Uses the (course_id, created_at) index.
+    if review_keyset_cache.get(course_id) is not None:
+        return True
+    if await db.reviews.find_one({"course_id": course_id, "created_at": {"$type": "string"}}, {"_id": 1}):
+        return False
+    # Likewise for reviews missing helpful_count (migrate_data.py backfill-helpful-counts)
+    if await db.reviews.find_one({"course_id": course_id, "helpful_count": {"$exists": False}}, {"_id": 1}):
+        return False
+    review_keyset_cache.set(course_id, True)
+    return True
+
 @api_router.post("/reviews", response_model=Review)
 async def create_review(req: ReviewCreate, user: User = Depends(require_auth)):
+    if not 1 <= req.rating <= 5:
+        raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
+    
     # Check if already reviewed
     existing = await db.reviews.find_one({"course_id": req.course_id, "user_id": user.id})
     if existing:
         raise HTTPException(status_code=400, detail="Already reviewed")
     
+    # Make sure pre-existing reviews are counted before this one is added on top
+    await load_rating_summary(req.course_id)
+    
     review = Review(**req.model_dump(), user_id=user.id, user_name=user.name)
     review_doc = review.model_dump()
-    review_doc["created_at"] = review_doc["created_at"].isoformat()
     await db.reviews.insert_one(review_doc)
     
-    # Update course rating
-    all_reviews = await db.reviews.find({"course_id": req.course_id}, {"_id": 0}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in all_reviews) / len(all_reviews)
-    
+    # Update the histogram and course rating without rereading every review
+    summary = await db.course_ratings.find_one_and_update(
+        {"course_id": req.course_id},
+        {"$inc": {f"counts.{rating_bucket(review.rating)}": 1, "total": 1, "sum": review.rating}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
     await db.courses.update_one(
         {"id": req.course_id},
-        {"$set": {"rating": avg_rating, "total_ratings": len(all_reviews)}}
+        {"$set": {"rating": summary["sum"] / summary["total"], "total_ratings": summary["total"]}}
     )
+    course_detail_cache.invalidate(req.course_id)
+    course_rankings.record_rating(req.course_id, summary["sum"] / summary["total"], summary["total"])
     
     return review
 
 @api_router.get("/reviews", response_model=List[Review])
 async def get_reviews(course_id: str):
-    reviews = await db.reviews.find({"course_id": course_id}, {"_id": 0}).to_list(1000)
-    return reviews
+    # Original contract: a bare list of up to 1000 reviews. Paged clients use /reviews/page.
+    return await db.reviews.find({"course_id": course_id}, {"_id": 0}).sort(REVIEW_SORTS["newest"]).to_list(1000)
+
+@api_router.get("/reviews/page")
+async def get_review_page(
+    course_id: str,
+    sort: str = "newest",
+    limit: int = REVIEW_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    include_summary: bool = True
+):
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(REVIEW_SORTS)}")
+    order = REVIEW_SORTS[sort]
+    limit = max(1, min(limit, MAX_REVIEW_PAGE_SIZE))
+    
+    query: Dict[str, Any] = {"course_id": course_id}
+    offset = 0
+    keyset = await review_keyset_ready(course_id)
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+            if "offset" in state:
+                offset = max(0, int(state["offset"]))
+            elif keyset:
+                query.update(keyset_filter(state.get("after"), order))
+            else:
+                raise ValueError("Invalid cursor")
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # One extra row tells us whether there is a next page
+    find_reviews = db.reviews.find(query, {"_id": 0}).sort(order).skip(offset).limit(limit + 1).to_list(limit + 1)
+    if include_summary and not cursor:
+        reviews, summary = await asyncio.gather(find_reviews, load_rating_summary(course_id))
+    else:
+        reviews, summary = await find_reviews, None
+    
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = keyset_cursor(reviews[-1], order) if keyset and not offset else offset_cursor(offset + limit)
+    
+    return {
+        "reviews": [Review(**r) for r in reviews],
+        "summary": summary,
+        "next_cursor": next_cursor
+    }
+
+@api_router.post("/reviews/{review_id}/helpful")
+async def mark_review_helpful(review_id: str, user: User = Depends(require_auth)):
+    review = await db.reviews.find_one({"id": review_id}, {"_id": 0, "user_id": 1})
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    if review["user_id"] == user.id:
+        raise HTTPException(status_code=400, detail="Cannot vote on your own review")
+    
+    # One vote per user; the counter only moves when the vote is new
+    result = await db.review_votes.update_one(
+        {"review_id": review_id, "user_id": user.id},
+        {"$setOnInsert": {"created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    if result.upserted_id is not None:
+        await db.reviews.update_one({"id": review_id}, {"$inc": {"helpful_count": 1}})
+    
+    return {"message": "Vote recorded", "counted": result.upserted_id is not None}
 
 # ==================== CERTIFICATE ROUTES ====================
 
+certificate_store = CertificateStore(
+    os.environ.get('CERTIFICATE_CACHE_DIR', str(Path(tempfile.gettempdir()) / 'padho-certificates')),
+    max_workers=int(os.environ.get('CERTIFICATE_RENDER_WORKERS', '2'))
+)
+CERTIFICATE_BATCH_SIZE = 500
+
+def certificate_download_url(certificate_id: str) -> str:
+    return f"/api/certificates/{certificate_id}/download"
+
+async def certificate_render_data(cert: dict, student_name: Optional[str] = None, instructor_name: Optional[str] = None) -> dict:
+    if student_name is None:
+        student = await db.users.find_one({"id": cert["user_id"]}, {"_id": 0, "name": 1})
+        student_name = student["name"] if student else "Student"
+    if instructor_name is None:
+        course = await db.courses.find_one({"id": cert["course_id"]}, {"_id": 0, "instructor_name": 1})
+        instructor_name = (course or {}).get("instructor_name") or ""
+    issued_at = cert["issued_at"]
+    if isinstance(issued_at, str):
+        issued_at = datetime.fromisoformat(issued_at)
+    return {
+        "certificate_id": cert["id"],
+        "student_name": student_name,
+        "course_title": cert.get("course_title") or "Unknown",
+        "instructor_name": instructor_name,
+        "issued_on": issued_at.strftime("%d %B %Y")
+    }
+
+async def prerender_certificate(cert: dict, student_name: str):
+    try:
+        data = await certificate_render_data(cert, student_name=student_name)
+        await certificate_store.get(cert["user_id"], cert["course_id"], "pdf", data)
+    except Exception as e:
+        logging.error(f"Certificate render error for {cert['id']}: {e}")
+
 @api_router.post("/certificates")
 async def generate_certificate(course_id: str, user: User = Depends(require_auth)):
     # Check if course is completed
@@ -786,8 +1765,9 @@ async def generate_certificate(course_id: str, user: User = Depends(require_auth
         raise HTTPException(status_code=400, detail="Course not completed")
     
     # Check if certificate already exists
-    existing = await db.certificates.find_one({"user_id": user.id, "course_id": course_id})
+    existing = await db.certificates.find_one({"user_id": user.id, "course_id": course_id}, {"_id": 0})
     if existing:
+        existing["certificate_url"] = certificate_download_url(existing["id"])
         return existing
     
     course = await db.courses.find_one({"id": course_id}, {"_id": 0})
@@ -795,33 +1775,166 @@ async def generate_certificate(course_id: str, user: User = Depends(require_auth
     certificate = Certificate(
         user_id=user.id,
         course_id=course_id,
-        course_title=course["title"] if course else "Unknown",
-        certificate_url=f"https://certificates.padhobadho.com/{user.id}/{course_id}"
+        course_title=course["title"] if course else "Unknown"
     )
+    certificate.certificate_url = certificate_download_url(certificate.id)
     
     cert_doc = certificate.model_dump()
-    cert_doc["issued_at"] = cert_doc["issued_at"].isoformat()
     await db.certificates.insert_one(cert_doc)
+    # Render now so the first download is a cache hit
+    schedule_certificate_render(cert_doc, user.name)
     
     return certificate
 
+certificate_render_tasks: set = set()
+
+def schedule_certificate_render(cert_doc: dict, student_name: str):
+    task = asyncio.create_task(prerender_certificate(cert_doc, student_name))
+    certificate_render_tasks.add(task)
+    task.add_done_callback(certificate_render_tasks.discard)
+
 @api_router.get("/certificates/my", response_model=List[Certificate])
 async def get_my_certificates(user: User = Depends(require_auth)):
     certificates = await db.certificates.find({"user_id": user.id}, {"_id": 0}).to_list(1000)
+    for cert in certificates:
+        # Older certificates still carry the placeholder external URL
+        cert["certificate_url"] = certificate_download_url(cert["id"])
     return certificates
 
+@api_router.get("/certificates/{certificate_id}/download")
+async def download_certificate(
+    certificate_id: str,
+    request: Request,
+    fmt: str = Query("pdf", alias="format"),
+    user: User = Depends(require_auth)
+):
+    if fmt not in CERTIFICATE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(CERTIFICATE_FORMATS)}")
+    cert = await db.certificates.find_one({"id": certificate_id}, {"_id": 0})
+    if not cert:
+        raise HTTPException(status_code=404, detail="Certificate not found")
+    if cert["user_id"] != user.id and user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    path = certificate_store.path(cert["user_id"], cert["course_id"], fmt)
+    if not path.exists():
+        data = await certificate_render_data(cert, student_name=user.name if cert["user_id"] == user.id else None)
+        path = await certificate_store.get(cert["user_id"], cert["course_id"], fmt, data)
+    return await file_response(
+        request.headers, path, CERTIFICATE_FORMATS[fmt], f"certificate-{certificate_id}.{fmt}"
+    )
+
+async def issue_course_certificates(job_id: str, course_id: str):
+    # Issues missing certificates to every student at 100% and renders them all,
+    # batch by batch, reporting progress on the job document
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0, "title": 1, "instructor_name": 1}) or {}
+    instructor_name = course.get("instructor_name") or ""
+    render_slots = asyncio.Semaphore(certificate_store.max_workers * 2)
+    counts = {"issued": 0, "rendered": 0, "failed": 0}
+    
+    async def render(cert: dict, student_name: str):
+        async with render_slots:
+            try:
+                data = await certificate_render_data(cert, student_name=student_name, instructor_name=instructor_name)
+                await certificate_store.get(cert["user_id"], cert["course_id"], "pdf", data)
+                counts["rendered"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                logging.error(f"Certificate render error for {cert['id']}: {e}")
+    
+    try:
+        cursor = db.enrollments.find(
+            {"course_id": course_id, "progress": {"$gte": 100}}, {"_id": 0, "user_id": 1}
+        ).batch_size(CERTIFICATE_BATCH_SIZE)
+        while True:
+            batch = await cursor.to_list(CERTIFICATE_BATCH_SIZE)
+            if not batch:
+                break
+            user_ids = [e["user_id"] for e in batch]
+            existing, users = await asyncio.gather(
+                db.certificates.find({"course_id": course_id, "user_id": {"$in": user_ids}}, {"_id": 0}).to_list(None),
+                db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+            )
+            names = {u["id"]: u["name"] for u in users}
+            have = {c["user_id"] for c in existing}
+            
+            new_docs = []
+            for user_id in user_ids:
+                if user_id in have:
+                    continue
+                certificate = Certificate(user_id=user_id, course_id=course_id, course_title=course.get("title", "Unknown"))
+                certificate.certificate_url = certificate_download_url(certificate.id)
+                new_docs.append(certificate.model_dump())
+            if new_docs:
+                await db.certificates.insert_many(new_docs, ordered=False)
+                counts["issued"] += len(new_docs)
+            
+            await asyncio.gather(*[render(c, names.get(c["user_id"], "Student")) for c in existing + new_docs])
+            await db.certificate_jobs.update_one({"_id": job_id}, {"$set": {**counts, "updated_at": datetime.now(timezone.utc)}})
+        status = "completed"
+    except Exception as e:
+        logging.error(f"Certificate batch job {job_id} failed: {e}")
+        status = "failed"
+    await db.certificate_jobs.update_one(
+        {"_id": job_id},
+        {"$set": {**counts, "status": status, "finished_at": datetime.now(timezone.utc)}}
+    )
+
+@api_router.post("/certificates/batch")
+async def start_certificate_batch(course_id: str, user: User = Depends(require_role(["instructor", "admin"]))):
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0, "instructor_id": 1})
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if user.role == "instructor" and course["instructor_id"] != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    job_id = str(uuid.uuid4())
+    await db.certificate_jobs.insert_one({
+        "_id": job_id,
+        "course_id": course_id,
+        "requested_by": user.id,
+        "status": "running",
+        "issued": 0,
+        "rendered": 0,
+        "failed": 0,
+        "started_at": datetime.now(timezone.utc)
+    })
+    task = asyncio.create_task(issue_course_certificates(job_id, course_id))
+    certificate_render_tasks.add(task)
+    task.add_done_callback(certificate_render_tasks.discard)
+    return {"job_id": job_id, "status": "running"}
+
+@api_router.get("/certificates/batch/{job_id}")
+async def get_certificate_batch(job_id: str, user: User = Depends(require_role(["instructor", "admin"]))):
+    job = await db.certificate_jobs.find_one({"_id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if user.role == "instructor" and job["requested_by"] != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    job["job_id"] = job.pop("_id")
+    return job
+
 # ==================== BLOG ROUTES ====================
 
-@api_router.get("/blog", response_model=List[BlogPost])
-async def get_blog_posts():
-    posts = await db.blog_posts.find({}, {"_id": 0}).sort("published_at", -1).to_list(1000)
-    return posts
+blog_list_adapter = TypeAdapter(List[BlogPost])
+
+@api_router.get("/blog", response_model=List[BlogPostCard], response_description=LIST_RESPONSE_DESCRIPTION)
+async def get_blog_posts(profile: str = "card", fields: Optional[str] = None):
+    selected = resolve_fields("blog_posts", profile, fields)
+    posts = await db.blog_posts.find({}, list_projection(selected)).sort("published_at", -1).to_list(1000)
+    return Response(dump_list(blog_list_adapter, posts, selected), media_type="application/json")
+
+@api_router.get("/blog/{post_id}", response_model=BlogPost)
+async def get_blog_post(post_id: str):
+    post = await db.blog_posts.find_one({"id": post_id}, {"_id": 0})
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return post
 
 @api_router.post("/blog", response_model=BlogPost)
 async def create_blog_post(req: BlogPostCreate, user: User = Depends(require_role(["admin", "instructor"]))):
-    post = BlogPost(**req.model_dump(), author_id=user.id, author_name=user.name)
+    post = BlogPost(**req.model_dump(), author_id=user.id, author_name=user.name, excerpt=blog_excerpt(req.content))
     post_doc = post.model_dump()
-    post_doc["published_at"] = post_doc["published_at"].isoformat()
     await db.blog_posts.insert_one(post_doc)
     
     return post
@@ -857,10 +1970,19 @@ async def get_instructor_dashboard(user: User = Depends(require_role(["instructo
     
     total_enrollments = sum(c.get("total_enrollments", 0) for c in courses)
     
+    # One small rollup document per course instead of scanning activity collections
+    course_ids = [c["id"] for c in courses]
+    rollups = await db.course_analytics.find({"course_id": {"$in": course_ids}}, {"_id": 0}).to_list(len(course_ids) or 1)
+    rollups_by_course = {r["course_id"]: r for r in rollups}
+    week = analytics_week()
+    analytics = [summarize_course_analytics(cid, rollups_by_course.get(cid, {}), week) for cid in course_ids]
+    
     return {
         "courses": courses,
         "total_courses": len(courses),
-        "total_enrollments": total_enrollments
+        "total_enrollments": total_enrollments,
+        "analytics": analytics,
+        "active_learners_this_week": sum(a["active_learners_this_week"] for a in analytics)
     }
 
 @api_router.get("/dashboard/admin")
@@ -879,9 +2001,11 @@ async def get_admin_dashboard(user: User = Depends(require_role(["admin"]))):
 
 # ==================== AI FEATURES ====================
 
-@api_router.post("/ai/recommendations")
+@api_router.post("/ai/recommendations", dependencies=[Depends(rate_limit(AI_RECOMMENDATIONS_POLICY))])
 async def get_ai_recommendations(req: AIRecommendationRequest, user: User = Depends(require_auth)):
     try:
+        LlmChat, UserMessage = load_llm()
+        
         # Get all courses
         all_courses = await db.courses.find({}, {"_id": 0}).to_list(1000)
         
@@ -914,48 +2038,212 @@ async def get_ai_recommendations(req: AIRecommendationRequest, user: User = Depe
         return {"recommendations": recommendations}
     except Exception as e:
         logging.error(f"AI recommendation error: {e}")
-        # Fallback: return popular courses
-        popular = await db.courses.find({}, {"_id": 0}).sort("total_enrollments", -1).limit(5).to_list(5)
-        return {"recommendations": popular}
+        # Fallback: popular courses the user hasn't finished, straight from the in-memory ranking
+        if course_rankings.ready:
+            popular = course_rankings.top("popular", limit=5 + len(req.completed_courses))
+        else:
+            popular = await db.courses.find({}, list_projection(COURSE_CARD_FIELDS)).sort("total_enrollments", -1).limit(5).to_list(5)
+        return {"recommendations": [c for c in popular if c["id"] not in req.completed_courses][:5]}
+
+# Tutor conversations keep the last few exchanges verbatim; older ones are
+# folded into a rolling summary in the background so prompts stay a fixed size
+CHAT_WINDOW_TURNS = 2 * int(os.environ.get('CHAT_MEMORY_WINDOW_EXCHANGES', '4'))
+CHAT_SUMMARIZE_AFTER_TURNS = 2 * int(os.environ.get('CHAT_MEMORY_SUMMARIZE_AFTER_EXCHANGES', '3'))
+# Hard cap in case summarization keeps failing
+CHAT_MAX_TURNS = 4 * (CHAT_WINDOW_TURNS + CHAT_SUMMARIZE_AFTER_TURNS)
+CHAT_TURN_MAX_CHARS = 2000
+CHAT_SUMMARY_MAX_CHARS = 1500
+CHAT_MEMORY_TTL = timedelta(days=float(os.environ.get('CHAT_MEMORY_TTL_DAYS', '7')))
+summary_tasks: Dict[str, asyncio.Task] = {}
+
+def conversation_id(user_id: str, course_id: Optional[str]) -> str:
+    return f"{user_id}:{course_id or 'general'}"
+
+def render_turns(turns: List[dict]) -> str:
+    return "\n".join(f"{'Student' if t['role'] == 'user' else 'Tutor'}: {t['text']}" for t in turns)
+
+def render_conversation(conversation: Optional[dict]) -> str:
+    if not conversation:
+        return ""
+    parts = []
+    if conversation.get("summary"):
+        parts.append(f"Summary of the conversation so far:\n{conversation['summary']}")
+    if conversation.get("turns"):
+        parts.append(f"Recent messages:\n{render_turns(conversation['turns'])}")
+    return "\n\n".join(parts)
+
+async def append_conversation_turns(conv_id: str, user_id: str, course_id: Optional[str], question: str, answer: str):
+    now = datetime.now(timezone.utc)
+    turns = [
+        {"role": "user", "text": question[:CHAT_TURN_MAX_CHARS], "at": now},
+        {"role": "assistant", "text": answer[:CHAT_TURN_MAX_CHARS], "at": now}
+    ]
+    conversation = await db.tutor_conversations.find_one_and_update(
+        {"_id": conv_id},
+        {
+            "$push": {"turns": {"$each": turns, "$slice": -CHAT_MAX_TURNS}},
+            "$set": {"updated_at": now, "expires_at": now + CHAT_MEMORY_TTL},
+            "$setOnInsert": {"user_id": user_id, "course_id": course_id, "summary": "", "summary_version": 0, "created_at": now}
+        },
+        projection={"turns.at": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if len(conversation["turns"]) > CHAT_WINDOW_TURNS + CHAT_SUMMARIZE_AFTER_TURNS:
+        schedule_conversation_summary(conv_id)
+
+def schedule_conversation_summary(conv_id: str):
+    if conv_id in summary_tasks:
+        return
+    task = asyncio.create_task(summarize_conversation(conv_id))
+    summary_tasks[conv_id] = task
+    task.add_done_callback(lambda _: summary_tasks.pop(conv_id, None))
+
+async def summarize_conversation(conv_id: str):
+    try:
+        conversation = await db.tutor_conversations.find_one(
+            {"_id": conv_id}, {"summary": 1, "turns": 1, "summary_version": 1}
+        )
+        if not conversation or len(conversation["turns"]) <= CHAT_WINDOW_TURNS:
+            return
+        # Turns are appended in (question, answer) pairs and the window is even,
+        # so this never splits an exchange
+        folded = conversation["turns"][:-CHAT_WINDOW_TURNS]
+        
+        LlmChat, UserMessage = load_llm()
+        llm = LlmChat(
+            api_key=os.environ["EMERGENT_LLM_KEY"],
+            session_id=f"chat_summary_{uuid.uuid4().hex}",
+            system_message="You keep short running notes of a tutoring conversation between a student and an AI tutor."
+        ).with_model("openai", "gpt-4o-mini")
+        message = UserMessage(
+            text=f"Current notes:\n{conversation.get('summary') or '(none)'}\n\nNew messages:\n{render_turns(folded)}\n\n"
+                 "Rewrite the notes to cover the new messages in at most 150 words. Keep the student's goals, "
+                 "misconceptions and what has already been explained."
+        )
+        summary = (await llm.send_message(message)).strip()[:CHAT_SUMMARY_MAX_CHARS]
+        
+        # Another worker may have folded the same turns meanwhile; only one update wins
+        await db.tutor_conversations.update_one(
+            {"_id": conv_id, "summary_version": conversation["summary_version"]},
+            {
+                "$set": {"summary": summary},
+                "$inc": {"summary_version": 1},
+                "$pull": {"turns": {"at": {"$lte": folded[-1]["at"]}}}
+            }
+        )
+    except Exception as e:
+        logging.error(f"Conversation summary error: {e}")
 
-@api_router.post("/ai/chat")
+@api_router.post("/ai/chat", dependencies=[Depends(rate_limit(AI_CHAT_POLICY))])
 async def ai_chat_tutor(req: AIChatRequest, user: User = Depends(require_auth)):
     try:
+        course_id = req.course_id
+        if not course_id and req.lesson_id:
+            course_id = await lookup_lesson_course(req.lesson_id)
+        conv_id = conversation_id(user.id, course_id)
+        
+        LlmChat, UserMessage = load_llm()
         llm = LlmChat(
             api_key=os.environ["EMERGENT_LLM_KEY"],
-            session_id=f"chat_{user.id}",
+            session_id=f"chat_{conv_id}",
             system_message="You are an educational AI tutor. Help students with their questions. Be concise and clear."
         ).with_model("openai", "gpt-4o-mini")
         
+        conversation, sources = await asyncio.gather(
+            db.tutor_conversations.find_one({"_id": conv_id}, {"summary": 1, "turns": 1}),
+            retrieve_course_context(course_id, req.message) if course_id else asyncio.sleep(0, [])
+        )
+        
         context_text = f"\nContext: {req.context}" if req.context else ""
-        message = UserMessage(text=f"{req.message}{context_text}")
+        if sources:
+            material = "\n\n".join(f"[{i}] {s['title']}\n{s['text']}" for i, s in enumerate(sources, 1))
+            context_text += f"\n\nRelevant course material (answer from it where it applies):\n{material}"
+        history = render_conversation(conversation)
+        if history:
+            message = UserMessage(text=f"{history}\n\nNew message from the student:\n{req.message}{context_text}")
+        else:
+            message = UserMessage(text=f"{req.message}{context_text}")
         
         response = await llm.send_message(message)
+        try:
+            await append_conversation_turns(conv_id, user.id, course_id, req.message, response)
+        except Exception as e:
+            # The reply is already paid for; losing one exchange from memory is the lesser harm
+            logging.error(f"Conversation memory error: {e}")
         
-        return {"response": response}
+        return {
+            "response": response,
+            "sources": [{"type": s["type"], "id": s["id"], "title": s["title"]} for s in sources]
+        }
     except Exception as e:
         logging.error(f"AI chat error: {e}")
         return {"response": "Sorry, I'm having trouble responding right now. Please try again later."}
 
-@api_router.post("/ai/generate-quiz")
-async def generate_quiz_from_content(req: AIQuizGenerateRequest, user: User = Depends(require_role(["instructor", "admin"]))):
+@api_router.get("/ai/chat/history")
+async def get_chat_history(course_id: Optional[str] = None, user: User = Depends(require_auth)):
+    conversation = await db.tutor_conversations.find_one(
+        {"_id": conversation_id(user.id, course_id)}, {"_id": 0, "summary": 1, "turns": 1, "updated_at": 1}
+    )
+    return conversation or {"summary": "", "turns": [], "updated_at": None}
+
+@api_router.delete("/ai/chat/history")
+async def clear_chat_history(course_id: Optional[str] = None, user: User = Depends(require_auth)):
+    await db.tutor_conversations.delete_one({"_id": conversation_id(user.id, course_id)})
+    return {"message": "Conversation cleared"}
+
+# Shared by all requests on this worker so a few large chapters can't flood the LLM provider
+QUIZ_GEN_CHUNK_TOKENS = int(os.environ.get('QUIZ_GEN_CHUNK_TOKENS', '1500'))
+QUIZ_GEN_TIMEOUT_SECONDS = float(os.environ.get('QUIZ_GEN_TIMEOUT_SECONDS', '90'))
+quiz_generation_slots = asyncio.Semaphore(int(os.environ.get('QUIZ_GEN_CONCURRENCY', '8')))
+
+async def generate_chunk_questions(user_id: str, chunk: str, index: int, parts: int, count: int):
     try:
+        LlmChat, UserMessage = load_llm()
+        # A session per chunk keeps the parallel conversations from sharing history
         llm = LlmChat(
             api_key=os.environ["EMERGENT_LLM_KEY"],
-            session_id=f"quiz_gen_{user.id}",
-            system_message="You are an educational quiz generator. Generate multiple choice questions from provided content."
+            session_id=f"quiz_gen_{user_id}_{uuid.uuid4().hex}",
+            system_message=quiz_generation.SYSTEM_MESSAGE
         ).with_model("openai", "gpt-4o-mini")
-        
         message = UserMessage(
-            text=f"Generate {req.num_questions} multiple choice questions from this content:\n\n{req.content}\n\nFormat each question as:\nQ: [question]\nA) [option]\nB) [option]\nC) [option]\nD) [option]\nCorrect: [A/B/C/D]"
+            text=quiz_generation.PROMPT_TEMPLATE.format(count=count, part=index + 1, parts=parts, excerpt=chunk)
         )
-        
-        response = await llm.send_message(message)
-        
-        return {"generated_quiz": response}
+        async with quiz_generation_slots:
+            response = await asyncio.wait_for(llm.send_message(message), QUIZ_GEN_TIMEOUT_SECONDS)
     except Exception as e:
-        logging.error(f"Quiz generation error: {e}")
-        return {"generated_quiz": "Error generating quiz. Please try again."}
+        logging.error(f"Quiz generation error on chunk {index + 1}/{parts}: {e}")
+        return []
+    return quiz_generation.parse_questions(response, index)
+
+@api_router.post("/ai/generate-quiz", dependencies=[Depends(rate_limit(AI_GENERATE_QUIZ_POLICY))])
+async def generate_quiz_from_content(req: AIQuizGenerateRequest, user: User = Depends(require_role(["instructor", "admin"]))):
+    chunks = quiz_generation.split_content(req.content, QUIZ_GEN_CHUNK_TOKENS)
+    quotas = quiz_generation.allocate_quotas(chunks, req.num_questions)
+    
+    # Every chunk runs at once (bounded by the shared slots), so wall time tracks
+    # the slowest chunk; each asks for a couple of spares to absorb duplicates
+    jobs = [(i, quota) for i, quota in enumerate(quotas) if quota > 0]
+    results = await asyncio.gather(*[
+        generate_chunk_questions(user.id, chunks[i], i, len(chunks), quota + max(1, quota // 5))
+        for i, quota in jobs
+    ])
+    
+    questions = quiz_generation.merge(results, [quota for _, quota in jobs], req.num_questions)
+    if not questions:
+        return {"questions": [], "generated_quiz": "Error generating quiz. Please try again."}
+    
+    generated_quiz = "\n\n".join(
+        f"Q: {q.question_text}\n" + "\n".join(f"{letter}) {option}" for letter, option in zip("ABCD", q.options))
+        + f"\nCorrect: {'ABCD'[q.options.index(q.correct_answer)]}"
+        for q in questions
+    )
+    return {
+        "questions": questions,
+        "requested": req.num_questions,
+        "chunks": len(chunks),
+        "generated_quiz": generated_quiz
+    }
 
 # ==================== VIDEO PROGRESS ROUTES ====================
 
@@ -976,7 +2264,7 @@ async def update_video_progress(req: VideoProgressUpdate, user: User = Depends(r
                 "progress_seconds": req.progress_seconds,
                 "total_seconds": req.total_seconds,
                 "completed": completed,
-                "last_watched": datetime.now(timezone.utc).isoformat()
+                "last_watched": datetime.now(timezone.utc)
             }}
         )
     else:
@@ -988,11 +2276,56 @@ async def update_video_progress(req: VideoProgressUpdate, user: User = Depends(r
             completed=completed
         )
         progress_doc = progress.model_dump()
-        progress_doc["last_watched"] = progress_doc["last_watched"].isoformat()
         await db.video_progress.insert_one(progress_doc)
     
+    newly_completed = completed and not (existing and existing.get("completed"))
+    await record_course_activity(
+        await lookup_lesson_course(req.lesson_id), user.id, {"lessons_completed": 1} if newly_completed else None
+    )
+    
     return {"message": "Progress updated", "completed": completed}
 
+# Field order of the per-lesson tuples returned by the batch endpoint
+VIDEO_PROGRESS_FIELDS = ["progress_seconds", "total_seconds", "completed"]
+MAX_BATCH_LESSONS = 500
+
+@api_router.get("/video-progress/batch")
+async def get_video_progress_batch(
+    course_id: Optional[str] = None,
+    lesson_ids: Optional[str] = None,
+    user: User = Depends(require_auth)
+):
+    # One request (and one indexed $in query) instead of one per lesson
+    if course_id:
+        lessons = await db.lessons.find({"course_id": course_id}, {"_id": 0, "id": 1}).sort("order", 1).to_list(MAX_BATCH_LESSONS)
+        ids = [lesson["id"] for lesson in lessons]
+    elif lesson_ids:
+        ids = list(dict.fromkeys(i for i in lesson_ids.split(",") if i))
+        if len(ids) > MAX_BATCH_LESSONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_LESSONS} lesson ids per request")
+    else:
+        raise HTTPException(status_code=400, detail="course_id or lesson_ids is required")
+    
+    rows = await db.video_progress.find(
+        {"user_id": user.id, "lesson_id": {"$in": ids}},
+        {"_id": 0, "lesson_id": 1, **{f: 1 for f in VIDEO_PROGRESS_FIELDS}}
+    ).to_list(len(ids) or 1)
+    
+    # Lessons without a row have no progress yet: [0, 0, false]
+    progress = {
+        row["lesson_id"]: [row.get("progress_seconds", 0), row.get("total_seconds", 0), row.get("completed", False)]
+        for row in rows
+    }
+    completed_lessons = sum(1 for p in progress.values() if p[2])
+    
+    return {
+        "fields": VIDEO_PROGRESS_FIELDS,
+        "lessons": progress,
+        "total_lessons": len(ids),
+        "completed_lessons": completed_lessons,
+        "percent_complete": completed_lessons / len(ids) * 100 if ids else 0.0
+    }
+
 @api_router.get("/video-progress/{lesson_id}")
 async def get_video_progress(lesson_id: str, user: User = Depends(require_auth)):
     progress = await db.video_progress.find_one({
@@ -1038,10 +2371,8 @@ async def create_assignment(
     )
     
     assignment_doc = assignment.model_dump()
-    assignment_doc["created_at"] = assignment_doc["created_at"].isoformat()
-    if assignment_doc.get("due_date"):
-        assignment_doc["due_date"] = assignment_doc["due_date"].isoformat()
     await db.assignments.insert_one(assignment_doc)
+    course_detail_cache.invalidate(course_id)
     
     return assignment
 
@@ -1064,6 +2395,7 @@ async def submit_assignment(req: AssignmentSubmitRequest, user: User = Depends(r
     # AI-powered feedback
     ai_feedback = ""
     try:
+        LlmChat, UserMessage = load_llm()
         llm = LlmChat(
             api_key=os.environ["EMERGENT_LLM_KEY"],
             session_id=f"assignment_{user.id}",
@@ -1088,7 +2420,6 @@ async def submit_assignment(req: AssignmentSubmitRequest, user: User = Depends(r
     )
     
     submission_doc = submission.model_dump()
-    submission_doc["submitted_at"] = submission_doc["submitted_at"].isoformat()
     await db.assignment_submissions.insert_one(submission_doc)
     
     return {
@@ -1177,36 +2508,244 @@ async def mark_lesson_complete(lesson_id: str, user: User = Depends(require_auth
             }}
         )
         
+        await record_course_activity(
+            lesson["course_id"], user.id, progress_rollup_delta(enrollment.get("progress", 0), progress)
+        )
+        
         return {"message": "Lesson marked complete", "progress": progress}
     
     return {"message": "Enrollment not found"}
 
 # ==================== MOCK PAYMENT ROUTES ====================
 
-@api_router.post("/payments/mock")
-async def mock_payment(course_id: str, amount: float, user: User = Depends(require_auth)):
-    payment = Payment(
-        user_id=user.id,
-        amount=amount,
-        type="course",
-        status="completed"
+IDEMPOTENCY_TTL = timedelta(hours=int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24')))
+
+async def claim_idempotency_key(user_id: str, key: str, fingerprint: str) -> Optional[dict]:
+    # Returns None when this request owns the key, else the stored record
+    now = datetime.now(timezone.utc)
+    try:
+        return await db.idempotency_keys.find_one_and_update(
+            {"_id": f"{user_id}:{key}"},
+            {"$setOnInsert": {"fingerprint": fingerprint, "status": "pending", "created_at": now, "expires_at": now + IDEMPOTENCY_TTL}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        return await db.idempotency_keys.find_one({"_id": f"{user_id}:{key}"})
+
+def replay_idempotent(record: dict, fingerprint: str):
+    if record["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with different parameters")
+    if record["status"] != "completed":
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress", headers={"Retry-After": "1"})
+    return Response(
+        content=json.dumps(record["response"]),
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"}
     )
+
+@api_router.post("/payments/mock")
+async def mock_payment(
+    course_id: str,
+    amount: float,
+    user: User = Depends(require_auth),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    fingerprint = f"payments/mock:{course_id}:{amount}"
+    if idempotency_key:
+        record = await claim_idempotency_key(user.id, idempotency_key, fingerprint)
+        if record is not None:
+            return replay_idempotent(record, fingerprint)
     
-    payment_doc = payment.model_dump()
-    payment_doc["created_at"] = payment_doc["created_at"].isoformat()
-    await db.payments.insert_one(payment_doc)
+    try:
+        payment = Payment(
+            user_id=user.id,
+            course_id=course_id,
+            amount=amount,
+            type="course",
+            status="completed"
+        )
+        
+        payment_doc = payment.model_dump()
+        await db.payments.insert_one(payment_doc)
+        
+        # Auto-enroll; a retried checkout without a key still can't double-enroll
+        enrollment_id, _ = await upsert_enrollment(user.id, course_id)
+    except Exception:
+        if idempotency_key:
+            # Let the client retry with the same key
+            await db.idempotency_keys.delete_one({"_id": f"{user.id}:{idempotency_key}", "status": "pending"})
+        raise
+    
+    result = {"message": "Payment successful", "payment_id": payment.id, "enrollment_id": enrollment_id}
+    if idempotency_key:
+        await db.idempotency_keys.update_one(
+            {"_id": f"{user.id}:{idempotency_key}"},
+            {"$set": {"status": "completed", "response": result}}
+        )
+    return result
+
+# ==================== EXPORT ROUTES ====================
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def ensure_course_access(course_id: Optional[str], user: User):
+    if user.role == "admin":
+        return
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0, "instructor_id": 1}) if course_id else None
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if course["instructor_id"] != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+async def stream_export(collection, query: dict, fields: List[str], csv_fields: List[str], export_format: str, compress: bool):
+    # Pulls one server-side batch at a time, resolves user names for that
+    # batch with a single $in lookup and emits it, so memory stays flat
+    # regardless of how many rows match
+    cursor = collection.find(query, {"_id": 0, **{f: 1 for f in fields}}).batch_size(EXPORT_BATCH_SIZE)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
     
-    # Auto-enroll
-    enrollment = Enrollment(user_id=user.id, course_id=course_id)
-    enrollment_doc = enrollment.model_dump()
-    enrollment_doc["enrolled_at"] = enrollment_doc["enrolled_at"].isoformat()
-    await db.enrollments.insert_one(enrollment_doc)
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
     
-    return {"message": "Payment successful", "payment_id": payment.id}
+    if export_format == "csv":
+        yield encode(",".join(csv_fields) + "\r\n")
+    
+    while True:
+        batch = await cursor.to_list(EXPORT_BATCH_SIZE)
+        if not batch:
+            break
+        
+        user_ids = list({doc["user_id"] for doc in batch})
+        users = await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1}).to_list(len(user_ids))
+        users_by_id = {u["id"]: u for u in users}
+        
+        buf = io.StringIO()
+        writer = csv.writer(buf) if export_format == "csv" else None
+        for doc in batch:
+            student = users_by_id.get(doc["user_id"], {})
+            doc["user_name"] = student.get("name", "Unknown")
+            doc["user_email"] = student.get("email", "Unknown")
+            if writer:
+                writer.writerow([_export_value(doc.get(f)) for f in csv_fields])
+            else:
+                buf.write(json.dumps(doc, default=_export_value))
+                buf.write("\n")
+        
+        chunk = encode(buf.getvalue())
+        if chunk:
+            yield chunk
+    
+    if compressor:
+        yield compressor.flush()
+
+def export_response(generator, name: str, export_format: str, compress: bool) -> StreamingResponse:
+    filename = f"{name}.{export_format}" + (".gz" if compress else "")
+    return StreamingResponse(
+        generator,
+        media_type="application/gzip" if compress else EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def validate_export_format(export_format: str):
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+@api_router.get("/exports/quiz-results")
+async def export_quiz_results(
+    quiz_id: str,
+    export_format: str = Query("ndjson", alias="format"),
+    gzip: bool = False,
+    user: User = Depends(require_role(["instructor", "admin"]))
+):
+    validate_export_format(export_format)
+    quiz = await db.quizzes.find_one({"id": quiz_id}, {"_id": 0, "course_id": 1})
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    await ensure_course_access(quiz.get("course_id"), user)
+    
+    fields = ["id", "quiz_id", "user_id", "score", "answers", "completed_at"]
+    csv_fields = ["id", "quiz_id", "user_id", "user_name", "user_email", "score", "completed_at"]
+    generator = stream_export(db.quiz_results, {"quiz_id": quiz_id}, fields, csv_fields, export_format, gzip)
+    return export_response(generator, f"quiz_results_{quiz_id}", export_format, gzip)
+
+@api_router.get("/exports/enrollments")
+async def export_enrollments(
+    course_id: str,
+    export_format: str = Query("ndjson", alias="format"),
+    gzip: bool = False,
+    user: User = Depends(require_role(["instructor", "admin"]))
+):
+    validate_export_format(export_format)
+    await ensure_course_access(course_id, user)
+    
+    fields = ["id", "course_id", "user_id", "progress", "last_watched_lesson_id", "enrolled_at"]
+    csv_fields = ["id", "course_id", "user_id", "user_name", "user_email", "progress", "last_watched_lesson_id", "enrolled_at"]
+    generator = stream_export(db.enrollments, {"course_id": course_id}, fields, csv_fields, export_format, gzip)
+    return export_response(generator, f"enrollments_{course_id}", export_format, gzip)
+
+@api_router.get("/exports/assignment-submissions")
+async def export_assignment_submissions(
+    assignment_id: str,
+    export_format: str = Query("ndjson", alias="format"),
+    gzip: bool = False,
+    user: User = Depends(require_role(["instructor", "admin"]))
+):
+    validate_export_format(export_format)
+    assignment = await db.assignments.find_one({"id": assignment_id}, {"_id": 0, "course_id": 1})
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    await ensure_course_access(assignment["course_id"], user)
+    
+    fields = ["id", "assignment_id", "user_id", "content", "file_urls", "submitted_at", "status", "score", "feedback", "ai_feedback"]
+    csv_fields = ["id", "assignment_id", "user_id", "user_name", "user_email", "submitted_at", "status", "score", "feedback"]
+    generator = stream_export(db.assignment_submissions, {"assignment_id": assignment_id}, fields, csv_fields, export_format, gzip)
+    return export_response(generator, f"submissions_{assignment_id}", export_format, gzip)
+
+# ==================== ADMIN DIAGNOSTICS ====================
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(limit: int = 20, sort: str = "total_ms", user: User = Depends(require_role(["admin"]))):
+    return {
+        "threshold_ms": slow_query_listener.threshold_ms,
+        "explain_sample_rate": slow_query_listener.explain_sample_rate,
+        "shapes": slow_query_listener.report(limit=limit, sort=sort)
+    }
+
+@api_router.post("/admin/analytics/reconcile")
+async def trigger_analytics_reconcile(user: User = Depends(require_role(["admin"]))):
+    updated = await reconcile_course_analytics()
+    return {"message": "Analytics reconciled", "courses": updated}
+
+@api_router.get("/admin/rate-limits")
+async def get_rate_limit_stats(user: User = Depends(require_role(["admin"]))):
+    return rate_limiter.stats()
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(user: User = Depends(require_role(["admin"]))):
+    return {**invalidation_bus.stats(), "content_index": content_index.stats(), "course_rankings": course_rankings.stats()}
+
+@api_router.delete("/admin/slow-queries")
+async def reset_slow_queries(user: User = Depends(require_role(["admin"]))):
+    slow_query_listener.reset()
+    return {"message": "Slow query stats cleared"}
 
 # Include router
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware, config=compression_config)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1215,12 +2754,285 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so Server-Timing's total covers compression too
+app.add_middleware(
+    TracingMiddleware,
+    sample_rate=TRACE_SAMPLE_RATE,
+    export_rate=TRACE_EXPORT_RATE,
+    exporter=trace_exporter
+)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_indexes():
+    await db.user_sessions.create_index("session_token")
+    # Mongo purges sessions itself once the native-date expires_at has passed
+    await db.user_sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.revoked_sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.revoked_sessions.create_index("revoked_at")
+    
+    await db.users.create_index("id")
+    await db.quiz_results.create_index("quiz_id")
+    await db.enrollments.create_index("course_id")
+    await db.enrollments.create_index("enrolled_at")
+    await db.courses.create_index([("total_enrollments", -1)])
+    await ensure_unique_enrollments()
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+    await db.assignment_submissions.create_index("assignment_id")
+    
+    await db.lessons.create_index("id")
+    await db.lessons.create_index([("course_id", 1), ("order", 1)])
+    for order in REVIEW_SORTS.values():
+        await db.reviews.create_index([("course_id", 1)] + order)
+    await db.reviews.create_index("id")
+    await db.review_votes.create_index([("review_id", 1), ("user_id", 1)], unique=True)
+    await db.course_ratings.create_index("course_id", unique=True)
+    await db.tutor_conversations.create_index("expires_at", expireAfterSeconds=0)
+    await db.certificates.create_index([("user_id", 1), ("course_id", 1)])
+    await db.certificates.create_index("id")
+    await db.quizzes.create_index("course_id")
+    await db.assignments.create_index("course_id")
+    await db.quizzes.create_index("id")
+    await db.video_progress.create_index([("user_id", 1), ("lesson_id", 1)])
+    await db.course_analytics.create_index("course_id", unique=True)
+    await db.course_activity.create_index([("course_id", 1), ("user_id", 1), ("week", 1)], unique=True)
+    await db.course_activity.create_index("first_active_at", expireAfterSeconds=60 * 60 * 24 * 35)
+    await db.blog_posts.create_index([("published_at", -1)])
+    await db.blog_posts.create_index("id")
+    if isinstance(rate_limit_backend, MongoBucketBackend):
+        await rate_limit_backend.ensure_indexes()
+
+async def ensure_unique_enrollments():
+    try:
+        await db.enrollments.create_index([("user_id", 1), ("course_id", 1)], unique=True)
+    except OperationFailure as e:
+        if e.code != 11000:
+            raise
+        # Removing duplicates is a data migration, never something a booting worker does
+        logging.error(
+            "enrollments has duplicate (user_id, course_id) pairs, so the unique index was not created; "
+            "run `python migrate_data.py dedupe-enrollments` to clean them up"
+        )
+
+async def sync_revoked_sessions():
+    interval = float(os.environ.get('REVOCATION_SYNC_SECONDS', '5'))
+    while True:
+        try:
+            await revoked_sessions.sync(db)
+        except Exception as e:
+            logging.error(f"Revocation sync error: {e}")
+        await asyncio.sleep(interval)
+
+background_tasks: List[asyncio.Task] = []
+
+async def acquire_job_lease(name: str, ttl_seconds: float) -> bool:
+    # Only one worker across the deployment runs a given periodic job per lease
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_leases.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=ttl_seconds), "holder": invalidation_bus.bus_id}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def run_analytics_reconciler():
+    interval = float(os.environ.get('ANALYTICS_RECONCILE_SECONDS', '3600'))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await acquire_job_lease("analytics_reconcile", interval * 0.9):
+                updated = await reconcile_course_analytics()
+                logging.info(f"Reconciled analytics for {updated} courses")
+        except Exception as e:
+            logging.error(f"Analytics reconcile error: {e}")
+
+@app.on_event("startup")
+async def start_analytics_reconciler():
+    background_tasks.append(asyncio.create_task(run_analytics_reconciler()))
+
+async def run_content_indexer():
+    # The initial build is part of warm-up; this only applies later changes
+    interval = float(os.environ.get('RAG_REFRESH_SECONDS', '2'))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_content_index()
+        except Exception as e:
+            logging.error(f"Content index refresh error: {e}")
+
+RAG_ENABLED = os.environ.get('RAG_ENABLED', 'true').lower() == 'true'
+
+@app.on_event("startup")
+async def start_content_indexer():
+    if RAG_ENABLED:
+        background_tasks.append(asyncio.create_task(run_content_indexer()))
+
+async def run_ranking_refresher():
+    # The initial build is part of warm-up; this applies changes and slides the window
+    interval = float(os.environ.get('RANKING_REFRESH_SECONDS', '5'))
+    rebuild_every = float(os.environ.get('RANKING_REBUILD_SECONDS', '900'))
+    last_rebuild = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            rebuild = time.monotonic() - last_rebuild >= rebuild_every
+            await refresh_course_rankings(rebuild)
+            if rebuild:
+                last_rebuild = time.monotonic()
+        except Exception as e:
+            logging.error(f"Course rankings refresh error: {e}")
+
+@app.on_event("startup")
+async def start_ranking_refresher():
+    background_tasks.append(asyncio.create_task(run_ranking_refresher()))
+
+@app.on_event("startup")
+async def start_invalidation_bus():
+    if os.environ.get('CACHE_BUS_ENABLED', 'true').lower() == 'true':
+        invalidation_bus.start(db)
+
+@app.on_event("startup")
+async def start_revocation_sync():
+    if session_signer is not None:
+        background_tasks.append(asyncio.create_task(sync_revoked_sessions()))
+
+@app.on_event("startup")
+async def attach_query_profiler():
+    if client is not None:
+        slow_query_listener.attach(client, asyncio.get_running_loop())
+
+@app.on_event("startup")
+async def start_trace_exporter():
+    if trace_exporter is not None:
+        trace_exporter.start()
+
+@app.on_event("startup")
+async def open_http_session():
+    global http_session
+    connector = aiohttp.TCPConnector(
+        limit=int(os.environ.get('HTTP_POOL_SIZE', '100')),
+        ttl_dns_cache=300,
+        keepalive_timeout=30
+    )
+    http_session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(
+            total=float(os.environ.get('HTTP_TIMEOUT_SECONDS', '10')),
+            connect=float(os.environ.get('HTTP_CONNECT_TIMEOUT_SECONDS', '3'))
+        )
+    )
+
+# ==================== WARM-UP & PROBES ====================
+
+# A worker only reports ready once its pool is open, indexes verified and hot
+# caches filled, so the load balancer never sends it cold traffic
+warmup_state: Dict[str, Any] = {"ready": False, "started_at": None, "completed_at": None, "steps": {}}
+WARMUP_DB_CONNECTIONS = int(os.environ.get('WARMUP_DB_CONNECTIONS', '10'))
+WARMUP_ANSWER_KEYS = int(os.environ.get('WARMUP_ANSWER_KEYS', '500'))
+
+async def open_db_pool():
+    # Concurrent commands force the driver to open that many pooled connections
+    await asyncio.gather(*[db.command("ping") for _ in range(WARMUP_DB_CONNECTIONS)])
+
+async def warm_course_catalog():
+    payload = await load_course_list()
+    for encoding in compression_config.encodings:
+        await payload.response(encoding)
+
+async def warm_answer_keys():
+    quizzes = await db.quizzes.find({}, {"_id": 0, "id": 1}).sort("created_at", -1).limit(WARMUP_ANSWER_KEYS).to_list(WARMUP_ANSWER_KEYS)
+    await load_answer_keys([q["id"] for q in quizzes])
+
+async def warm_llm_client():
+    try:
+        # Importing the SDK stack takes seconds of CPU; do it off the loop
+        await asyncio.to_thread(load_llm)
+    except ImportError as e:
+        logging.warning(f"LLM client unavailable: {e}")
+
+async def run_warmup_step(name: str, step, critical: bool = False):
+    backoff = 1.0
+    while True:
+        started = time.perf_counter()
+        try:
+            await step()
+            warmup_state["steps"][name] = {"status": "ok", "ms": round((time.perf_counter() - started) * 1000, 1)}
+            return
+        except Exception as e:
+            warmup_state["steps"][name] = {"status": "error", "error": str(e)}
+            logging.error(f"Warm-up step {name} failed: {e}")
+            if not critical:
+                return
+        # Without the database nothing else can work; keep trying rather than report ready
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
+
+async def run_warmup():
+    warmup_state["started_at"] = datetime.now(timezone.utc)
+    await run_warmup_step("mongo_pool", open_db_pool, critical=True)
+    await run_warmup_step("indexes", ensure_indexes, critical=True)
+    
+    steps = [
+        run_warmup_step("course_catalog", warm_course_catalog),
+        run_warmup_step("answer_keys", warm_answer_keys),
+        run_warmup_step("llm_client", warm_llm_client),
+        run_warmup_step("course_rankings", build_course_rankings),
+    ]
+    if RAG_ENABLED:
+        steps.append(run_warmup_step("content_index", build_content_index))
+    await asyncio.gather(*steps)
+    
+    warmup_state["completed_at"] = datetime.now(timezone.utc)
+    warmup_state["ready"] = True
+    logging.info(f"Warm-up complete: {warmup_state['steps']}")
+
+@app.on_event("startup")
+async def start_warmup():
+    background_tasks.append(asyncio.create_task(run_warmup()))
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness only: the process is up and its event loop is responsive
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    body = jsonable_encoder({"status": "ready" if warmup_state["ready"] else "warming_up", **warmup_state})
+    return JSONResponse(body, status_code=200 if warmup_state["ready"] else 503)
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    # Fail readiness first so the load balancer drains this worker
+    warmup_state["ready"] = False
+    await invalidation_bus.stop()
+    for task in background_tasks + list(summary_tasks.values()):
+        task.cancel()
+    await asyncio.gather(*background_tasks, *summary_tasks.values(), return_exceptions=True)
+    background_tasks.clear()
+
+@app.on_event("shutdown")
+async def stop_certificate_renderer():
+    for task in list(certificate_render_tasks):
+        task.cancel()
+    certificate_store.close()
+
+@app.on_event("shutdown")
+async def close_http_session():
+    if http_session is not None:
+        await http_session.close()
+
+@app.on_event("shutdown")
+async def stop_trace_exporter():
+    if trace_exporter is not None:
+        await asyncio.to_thread(trace_exporter.close)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    storage.close()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = "v1"
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(TOKEN_VERSION + ".")
+
+
+class SessionSigner:
+    # Tokens look like v1.<kid>.<payload>.<signature>. The first configured key
+    # signs new tokens; the rest are only accepted for verification so keys can
+    # be rotated without logging everyone out.
+
+    def __init__(self, keys: Dict[str, bytes], active_kid: str):
+        if active_kid not in keys:
+            raise ValueError(f"Unknown active signing key: {active_kid}")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_env(cls, value: str) -> Optional["SessionSigner"]:
+        # SESSION_SIGNING_KEYS="kid2:secret2,kid1:secret1"
+        keys: Dict[str, bytes] = {}
+        active_kid = None
+        for entry in filter(None, (part.strip() for part in value.split(","))):
+            kid, sep, secret = entry.partition(":")
+            if not sep or not kid or not secret:
+                raise ValueError("SESSION_SIGNING_KEYS entries must look like kid:secret")
+            if "." in kid:
+                raise ValueError("Signing key ids must not contain '.'")
+            keys[kid] = secret.encode("utf-8")
+            if active_kid is None:
+                active_kid = kid
+        if not keys:
+            return None
+        return cls(keys, active_kid)
+
+    def _sign(self, kid: str, payload: str) -> str:
+        mac = hmac.new(self.keys[kid], f"{TOKEN_VERSION}.{kid}.{payload}".encode("ascii"), hashlib.sha256)
+        return _b64encode(mac.digest())
+
+    def issue(self, user_id: str, role: str, expires_at: datetime) -> Tuple[str, Dict[str, Any]]:
+        # The payload is signed, not encrypted: keep profile data (name, email) out of it
+        claims = {
+            "u": user_id,
+            "r": role,
+            "e": int(expires_at.timestamp()),
+            "j": _b64encode(secrets.token_bytes(9)),
+        }
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        token = f"{TOKEN_VERSION}.{self.active_kid}.{payload}.{self._sign(self.active_kid, payload)}"
+        return token, claims
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        # Signature and expiry only; revocation is checked by the caller
+        parts = token.split(".")
+        if len(parts) != 4 or parts[0] != TOKEN_VERSION:
+            return None
+        _, kid, payload, signature = parts
+        if kid not in self.keys:
+            return None
+        if not hmac.compare_digest(signature, self._sign(kid, payload)):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if claims.get("e", 0) < time.time():
+            return None
+        return claims
+
+
+class RevocationList:
+    # In-memory set of revoked token ids, kept in sync with the
+    # revoked_sessions collection so logouts on one worker reach the others.
+    # Entries are dropped once the token would have expired anyway.
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._last_sync: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def add(self, jti: str, expires_epoch: float):
+        self._revoked[jti] = expires_epoch
+
+    def prune(self):
+        now = time.time()
+        for jti in [j for j, exp in self._revoked.items() if exp < now]:
+            del self._revoked[jti]
+
+    async def revoke(self, db, claims: Dict[str, Any]):
+        self.add(claims["j"], claims["e"])
+        await db.revoked_sessions.insert_one({
+            "jti": claims["j"],
+            "user_id": claims["u"],
+            "expires_at": datetime.fromtimestamp(claims["e"], tz=timezone.utc),
+            "revoked_at": datetime.now(timezone.utc),
+        })
+
+    async def sync(self, db):
+        query = {"revoked_at": {"$gt": self._last_sync}} if self._last_sync else {}
+        # Overlap consecutive windows so writes racing a sync are not missed
+        synced_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        async for doc in db.revoked_sessions.find(query, {"_id": 0, "jti": 1, "expires_at": 1}):
+            expires_at = doc["expires_at"]
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            self.add(doc["jti"], expires_at.timestamp())
+        self._last_sync = synced_at
+        self.prune()
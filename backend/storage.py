@@ -0,0 +1,1231 @@
+import asyncio
+import itertools
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId, Timestamp
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+STORAGE_BACKENDS = ("mongo", "memory")
+
+_MISSING = object()
+
+# Mongo's TTL monitor runs once a minute; the memory engine sweeps on the same cadence
+TTL_SWEEP_SECONDS = 60.0
+
+
+class MotorStorage:
+    # The production backend: a Motor client and its database
+
+    name = "mongo"
+
+    def __init__(self, url: str, db_name: str, **client_kwargs):
+        self.client = AsyncIOMotorClient(url, **client_kwargs)
+        self.db = self.client[db_name]
+
+    def close(self):
+        self.client.close()
+
+
+class MemoryStorage:
+    # Process-local engine implementing the slice of the Motor API the app
+    # uses. Deterministic and free of network hops, for load tests and
+    # running the app without a MongoDB server.
+
+    name = "memory"
+    client = None
+
+    def __init__(self, db_name: str):
+        self.db = MemoryDatabase(db_name)
+
+    def close(self):
+        self.db.close()
+
+
+def open_storage(backend: str, db_name: str, mongo_url: Optional[str] = None, **client_kwargs):
+    if backend == "memory":
+        return MemoryStorage(db_name)
+    if backend == "mongo":
+        if not mongo_url:
+            raise RuntimeError("STORAGE_BACKEND=mongo requires MONGO_URL")
+        return MotorStorage(mongo_url, db_name, **client_kwargs)
+    raise RuntimeError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}")
+
+
+# ==================== VALUES ====================
+
+def _copy(value: Any) -> Any:
+    # Documents handed out must not alias stored state, as with a real driver
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _store(value: Any) -> Any:
+    # What a BSON round trip would do: tuples become arrays and dates become
+    # UTC-aware with millisecond precision
+    if isinstance(value, dict):
+        return {k: _store(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_store(v) for v in value]
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+
+def _hkey(value: Any) -> Any:
+    if value is _MISSING or value is None:
+        return None
+    if isinstance(value, dict):
+        return ("{}", tuple((k, _hkey(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("[]", tuple(_hkey(v) for v in value))
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    # BSON comparison order, reduced to the types the app stores
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_value(value: Any) -> Tuple[int, Any]:
+    rank = _type_rank(value)
+    if rank == 0:
+        return (0, 0)
+    if rank in (3, 4, 10):
+        return (rank, repr(_hkey(value)))
+    return (rank, value)
+
+
+def _compare(a: Any, b: Any) -> Optional[int]:
+    # None when the values are of different types, which never satisfy a range query
+    if _type_rank(a) != _type_rank(b) or _type_rank(a) == 0:
+        return None
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return None
+
+
+def _get(doc: Any, path: str) -> Any:
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and part.isdigit():
+            index = int(part)
+            value = value[index] if index < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _candidates(value: Any, parts: List[str]) -> List[Any]:
+    # Every value a dotted path can reach, descending through arrays of subdocuments
+    if not parts:
+        return [value]
+    if isinstance(value, dict):
+        return _candidates(value[parts[0]], parts[1:]) if parts[0] in value else [_MISSING]
+    if isinstance(value, list):
+        if parts[0].isdigit():
+            index = int(parts[0])
+            return _candidates(value[index], parts[1:]) if index < len(value) else [_MISSING]
+        found = [v for item in value if isinstance(item, dict) for v in _candidates(item, parts) if v is not _MISSING]
+        return found or [_MISSING]
+    return [_MISSING]
+
+
+def _set_path(doc: dict, path: str, value: Any):
+    parts = path.split(".")
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            target = target[int(part)]
+            continue
+        child = target.get(part)
+        if not isinstance(child, (dict, list)):
+            child = target[part] = {}
+        target = child
+    if isinstance(target, list) and parts[-1].isdigit():
+        index = int(parts[-1])
+        target.extend([None] * (index + 1 - len(target)))
+        target[index] = value
+    else:
+        target[parts[-1]] = value
+
+
+def _unset_path(doc: dict, path: str):
+    parts = path.split(".")
+    target = _get(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+
+
+# ==================== QUERIES ====================
+
+_TYPE_ALIASES: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "date": lambda v: isinstance(v, datetime),
+    "bool": lambda v: isinstance(v, bool),
+    "int": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "long": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "double": lambda v: isinstance(v, float),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "null": lambda v: v is None,
+    "objectId": lambda v: isinstance(v, ObjectId),
+}
+
+
+def _is_operator_doc(cond: Any) -> bool:
+    return isinstance(cond, dict) and bool(cond) and all(k.startswith("$") for k in cond)
+
+
+def _expand(candidates: List[Any]) -> Iterable[Any]:
+    # A condition on an array field matches the array itself or any element
+    for value in candidates:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _equals(candidates: List[Any], target: Any) -> bool:
+    if target is None:
+        return any(v is None or v is _MISSING for v in candidates)
+    key = _hkey(target)
+    return any(v is not _MISSING and _type_rank(v) == _type_rank(target) and _hkey(v) == key for v in _expand(candidates))
+
+
+def _regex(cond: Any, options: str = "") -> re.Pattern:
+    if isinstance(cond, re.Pattern):
+        return cond
+    flags = 0
+    for flag, value in (("i", re.I), ("m", re.M), ("s", re.S), ("x", re.X)):
+        if flag in options:
+            flags |= value
+    return re.compile(cond, flags)
+
+
+def _match_value(candidates: List[Any], cond: Any) -> bool:
+    if isinstance(cond, re.Pattern):
+        return any(isinstance(v, str) and cond.search(v) for v in _expand(candidates))
+    if not _is_operator_doc(cond):
+        return _equals(candidates, cond)
+    for op, arg in cond.items():
+        if op == "$options":
+            continue
+        if op == "$eq":
+            ok = _equals(candidates, arg)
+        elif op == "$ne":
+            ok = not _equals(candidates, arg)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = any(_range_ok(op, _compare(v, arg)) for v in _expand(candidates))
+        elif op == "$in":
+            ok = any(_match_value(candidates, a) if isinstance(a, re.Pattern) else _equals(candidates, a) for a in arg)
+        elif op == "$nin":
+            ok = not any(_equals(candidates, a) for a in arg)
+        elif op == "$exists":
+            ok = any(v is not _MISSING for v in candidates) == bool(arg)
+        elif op == "$regex":
+            pattern = _regex(arg, cond.get("$options", ""))
+            ok = any(isinstance(v, str) and pattern.search(v) for v in _expand(candidates))
+        elif op == "$type":
+            checks = [_TYPE_ALIASES[t] for t in (arg if isinstance(arg, list) else [arg])]
+            ok = any(v is not _MISSING and any(check(v) for check in checks) for v in candidates)
+        elif op == "$not":
+            ok = not _match_value(candidates, arg)
+        elif op == "$size":
+            ok = any(isinstance(v, list) and len(v) == arg for v in candidates)
+        elif op == "$all":
+            ok = all(_equals(candidates, a) for a in arg)
+        elif op == "$elemMatch":
+            ok = any(
+                isinstance(v, list) and any(
+                    _matches(item, arg) if isinstance(item, dict) and not _is_operator_doc(arg) else _match_value([item], arg)
+                    for item in v
+                )
+                for v in candidates
+            )
+        else:
+            raise OperationFailure(f"Query operator {op} is not supported by the memory backend")
+        if not ok:
+            return False
+    return True
+
+
+def _range_ok(op: str, result: Optional[int]) -> bool:
+    if result is None:
+        return False
+    return {"$gt": result > 0, "$gte": result >= 0, "$lt": result < 0, "$lte": result <= 0}[op]
+
+
+def _matches(doc: dict, query: Optional[dict]) -> bool:
+    if not query:
+        return True
+    for key, cond in query.items():
+        if key == "$and":
+            ok = all(_matches(doc, q) for q in cond)
+        elif key == "$or":
+            ok = any(_matches(doc, q) for q in cond)
+        elif key == "$nor":
+            ok = not any(_matches(doc, q) for q in cond)
+        elif key.startswith("$"):
+            raise OperationFailure(f"Query operator {key} is not supported by the memory backend")
+        else:
+            ok = _match_value(_candidates(doc, key.split(".")), cond)
+        if not ok:
+            return False
+    return True
+
+
+def _sort_docs(docs: List[dict], spec: List[Tuple[str, int]]) -> List[dict]:
+    # Stable sorts from the last key to the first give mixed directions for free
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda d: _sort_value(_get(d, field)), reverse=direction < 0)
+    return docs
+
+
+def _sort_spec(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction if direction is not None else 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(k, d) for k, d in key_or_list]
+
+
+def _include(source: dict, target: dict, parts: List[str]):
+    # Copy one inclusion path; through an array every subdocument keeps its own
+    # sub-field (or stays as {}), and scalar elements are dropped, as in Mongo
+    key, rest = parts[0], parts[1:]
+    if key not in source:
+        return
+    value = source[key]
+    if not rest:
+        target[key] = _copy(value)
+    elif isinstance(value, dict):
+        child = target.get(key)
+        if not isinstance(child, dict):
+            child = target[key] = {}
+        _include(value, child, rest)
+    elif isinstance(value, list):
+        items = [item for item in value if isinstance(item, dict)]
+        child = target.get(key)
+        if not isinstance(child, list) or len(child) != len(items):
+            child = target[key] = [{} for _ in items]
+        for item, out in zip(items, child):
+            _include(item, out, rest)
+
+
+def _project(doc: dict, projection: Any) -> dict:
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = bool(projection.get("_id", 1))
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if any(fields.values()):
+        out = {"_id": doc["_id"]} if include_id and "_id" in doc else {}
+        for path, include in fields.items():
+            if include:
+                _include(doc, out, path.split("."))
+        return out
+    out = _copy(doc)
+    for path in fields:
+        _unset_path(out, path)
+    if not include_id:
+        out.pop("_id", None)
+    return out
+
+
+# ==================== UPDATES ====================
+
+def _apply_update(doc: dict, update: Any, inserting: bool = False):
+    if isinstance(update, list):
+        raise OperationFailure("Pipeline updates are not supported by the memory backend")
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, arg in fields.items():
+            current = _get(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                _set_path(doc, path, _store(arg))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                _set_path(doc, path, (0 if current is _MISSING else current) + arg)
+            elif op == "$mul":
+                _set_path(doc, path, (0 if current is _MISSING else current) * arg)
+            elif op in ("$min", "$max"):
+                result = _compare(_store(arg), current)
+                if current is _MISSING or (result is not None and (result < 0 if op == "$min" else result > 0)):
+                    _set_path(doc, path, _store(arg))
+            elif op in ("$push", "$addToSet"):
+                items = arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]
+                array = list(current) if isinstance(current, list) else []
+                for item in _store(items):
+                    if op == "$push" or _hkey(item) not in {_hkey(v) for v in array}:
+                        array.append(item)
+                if op == "$push" and isinstance(arg, dict) and "$slice" in arg:
+                    size = arg["$slice"]
+                    array = array[size:] if size < 0 else array[:size]
+                _set_path(doc, path, array)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    _set_path(doc, path, [item for item in current if not _pull_matches(item, arg)])
+            elif op == "$pop":
+                if isinstance(current, list) and current:
+                    _set_path(doc, path, current[1:] if arg < 0 else current[:-1])
+            else:
+                raise OperationFailure(f"Update operator {op} is not supported by the memory backend")
+
+
+def _pull_matches(item: Any, cond: Any) -> bool:
+    if isinstance(cond, dict) and not _is_operator_doc(cond) and isinstance(item, dict):
+        return _matches(item, cond)
+    return _match_value([item], cond)
+
+
+def _upsert_seed(query: dict) -> dict:
+    # Equality conditions in the filter become fields of the inserted document
+    doc: Dict[str, Any] = {}
+    for key, cond in query.items():
+        if key == "$and":
+            for part in cond:
+                doc.update(_upsert_seed(part))
+        elif not key.startswith("$"):
+            if _is_operator_doc(cond):
+                if "$eq" in cond:
+                    _set_path(doc, key, _store(cond["$eq"]))
+            elif not isinstance(cond, re.Pattern):
+                _set_path(doc, key, _store(cond))
+    return doc
+
+
+def _is_replacement(update: Any) -> bool:
+    return isinstance(update, dict) and not any(k.startswith("$") for k in update)
+
+
+# ==================== EXPRESSIONS ====================
+
+def _eval(expr: Any, doc: dict) -> Any:
+    if isinstance(expr, str) and expr.startswith("$"):
+        if expr == "$$NOW":
+            return datetime.now(timezone.utc)
+        if expr in ("$$ROOT", "$$CURRENT"):
+            return doc
+        value = _get(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, list):
+        return [_eval(e, doc) for e in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op, arg = next(iter(expr.items()))
+            if op.startswith("$"):
+                return _eval_operator(op, arg, doc)
+        return {k: _eval(v, doc) for k, v in expr.items()}
+    return expr
+
+
+def _numbers(values: Iterable[Any]) -> List[Any]:
+    return [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+def _eval_operator(op: str, arg: Any, doc: dict) -> Any:
+    if op == "$literal":
+        return arg
+    if op == "$cond":
+        if isinstance(arg, dict):
+            arg = [arg["if"], arg["then"], arg["else"]]
+        return _eval(arg[1], doc) if _truthy(_eval(arg[0], doc)) else _eval(arg[2], doc)
+    args = arg if isinstance(arg, list) else [arg]
+    values = [_eval(a, doc) for a in args]
+    if op == "$ifNull":
+        return next((v for v in values if v is not None), None)
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        a, b = values
+        if op in ("$eq", "$ne"):
+            equal = _hkey(a) == _hkey(b) and _type_rank(a) == _type_rank(b)
+            return equal if op == "$eq" else not equal
+        result = _compare(a, b)
+        if result is None:
+            result = (_type_rank(a) > _type_rank(b)) - (_type_rank(a) < _type_rank(b))
+        return _range_ok(op, result)
+    if op == "$and":
+        return all(_truthy(v) for v in values)
+    if op == "$or":
+        return any(_truthy(v) for v in values)
+    if op == "$not":
+        return not _truthy(values[0])
+    if op in ("$sum", "$max", "$min", "$avg"):
+        flat = [x for v in values for x in (v if isinstance(v, list) else [v])]
+        numbers = _numbers(flat)
+        if op == "$sum":
+            return sum(numbers)
+        if op == "$avg":
+            return sum(numbers) / len(numbers) if numbers else None
+        present = [v for v in flat if v is not None]
+        if not present:
+            return None
+        return max(present, key=_sort_value) if op == "$max" else min(present, key=_sort_value)
+    if op == "$add":
+        if any(v is None for v in values):
+            return None
+        dates = [v for v in values if isinstance(v, datetime)]
+        total = sum(_numbers(values))
+        return dates[0] + timedelta(milliseconds=total) if dates else total
+    if op == "$subtract":
+        a, b = values
+        if a is None or b is None:
+            return None
+        if isinstance(a, datetime) and isinstance(b, datetime):
+            return (a - b) / timedelta(milliseconds=1)
+        if isinstance(a, datetime):
+            return a - timedelta(milliseconds=b)
+        return a - b
+    if op == "$multiply":
+        if any(v is None for v in values):
+            return None
+        product = 1
+        for v in values:
+            product *= v
+        return product
+    if op == "$divide":
+        a, b = values
+        return None if a is None or b is None else a / b
+    if op == "$size":
+        return len(values[0])
+    if op == "$in":
+        return _hkey(values[0]) in {_hkey(v) for v in values[1]}
+    if op == "$concat":
+        return None if any(v is None for v in values) else "".join(values)
+    if op in ("$toLower", "$toUpper"):
+        text = values[0] or ""
+        return text.lower() if op == "$toLower" else text.upper()
+    if op == "$arrayElemAt":
+        array, index = values
+        return array[index] if isinstance(array, list) and -len(array) <= index < len(array) else None
+    raise OperationFailure(f"Expression operator {op} is not supported by the memory backend")
+
+
+def _truthy(value: Any) -> bool:
+    return value not in (None, False, 0) and value is not _MISSING
+
+
+_ACCUMULATORS = {"$sum", "$avg", "$min", "$max", "$push", "$addToSet", "$first", "$last", "$count"}
+
+
+def _group(docs: List[dict], spec: dict) -> List[dict]:
+    groups: Dict[Any, dict] = {}
+    fields = {k: v for k, v in spec.items() if k != "_id"}
+    for doc in docs:
+        group_id = _eval(spec["_id"], doc)
+        key = _hkey(group_id)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = {"_id": group_id, **{name: [] for name in fields}}
+        for name, acc in fields.items():
+            (op, expr), = acc.items()
+            if op not in _ACCUMULATORS:
+                raise OperationFailure(f"Accumulator {op} is not supported by the memory backend")
+            state[name].append(1 if op == "$count" else _eval(expr, doc))
+
+    out = []
+    for state in groups.values():
+        row = {"_id": state["_id"]}
+        for name, acc in fields.items():
+            op = next(iter(acc))
+            values = state[name]
+            if op in ("$sum", "$count"):
+                row[name] = sum(_numbers(values))
+            elif op == "$avg":
+                numbers = _numbers(values)
+                row[name] = sum(numbers) / len(numbers) if numbers else None
+            elif op in ("$min", "$max"):
+                present = [v for v in values if v is not None]
+                chooser = min if op == "$min" else max
+                row[name] = chooser(present, key=_sort_value) if present else None
+            elif op == "$push":
+                row[name] = values
+            elif op == "$addToSet":
+                seen = {}
+                for v in values:
+                    seen.setdefault(_hkey(v), v)
+                row[name] = list(seen.values())
+            elif op == "$first":
+                row[name] = values[0] if values else None
+            else:
+                row[name] = values[-1] if values else None
+        out.append(row)
+    return out
+
+
+# ==================== COLLECTIONS ====================
+
+class _Index:
+    def __init__(self, name: str, keys: List[Tuple[str, int]], unique: bool, expire_after: Optional[float]):
+        self.name = name
+        self.keys = keys
+        self.fields = [field for field, _ in keys]
+        self.unique = unique
+        self.expire_after = expire_after
+        # Hash buckets on the leading field serve equality and $in lookups
+        self.buckets: Dict[Any, set] = {}
+        self.unique_keys: Dict[Any, Any] = {}
+
+    def leading_keys(self, doc: dict) -> List[Any]:
+        value = _get(doc, self.fields[0])
+        keys = [_hkey(value)]
+        if isinstance(value, list):
+            keys.extend(_hkey(v) for v in value)
+        return keys
+
+    def unique_key(self, doc: dict) -> Any:
+        return tuple(_hkey(_get(doc, field)) for field in self.fields)
+
+    def add(self, doc_key: Any, doc: dict):
+        for key in self.leading_keys(doc):
+            self.buckets.setdefault(key, set()).add(doc_key)
+        if self.unique:
+            self.unique_keys[self.unique_key(doc)] = doc_key
+
+    def remove(self, doc_key: Any, doc: dict):
+        for key in self.leading_keys(doc):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_key)
+                if not bucket:
+                    del self.buckets[key]
+        if self.unique and self.unique_keys.get(self.unique_key(doc)) == doc_key:
+            del self.unique_keys[self.unique_key(doc)]
+
+    def conflict(self, doc_key: Any, doc: dict) -> bool:
+        if not self.unique:
+            return False
+        owner = self.unique_keys.get(self.unique_key(doc))
+        return owner is not None and owner != doc_key
+
+
+class MemoryCursor:
+    # Lazily evaluated, resumable like a Motor cursor: to_list(n) hands out
+    # the next n documents and can be called again
+
+    def __init__(self, loader: Callable[[], List[dict]], projection: Any = None):
+        self._loader = loader
+        self._projection = projection
+        self._docs: Optional[List[dict]] = None
+        self._position = 0
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "MemoryCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "MemoryCursor":
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int) -> "MemoryCursor":
+        return self
+
+    def _materialize(self) -> List[dict]:
+        if self._docs is None:
+            docs = self._loader()
+            if self._sort:
+                docs = _sort_docs(list(docs), self._sort)
+            end = self._skip + self._limit if self._limit else None
+            self._docs = docs[self._skip:end]
+        return self._docs
+
+    def _take(self, count: Optional[int]) -> List[dict]:
+        docs = self._materialize()
+        end = len(docs) if count is None else min(len(docs), self._position + count)
+        batch = [_project(doc, self._projection) for doc in docs[self._position:end]]
+        self._position = end
+        return batch
+
+    @property
+    def alive(self) -> bool:
+        return self._docs is None or self._position < len(self._docs)
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        return self._take(length)
+
+    async def next(self) -> dict:
+        batch = self._take(1)
+        if not batch:
+            raise StopAsyncIteration
+        return batch[0]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self.next()
+
+    def close(self):
+        self._docs = []
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.database = database
+        self.name = name
+        self._docs: Dict[Any, dict] = {}
+        # Insertion sequence, so index-served results come back in natural order
+        self._order: Dict[Any, int] = {}
+        self._counter = itertools.count()
+        self._indexes: Dict[str, _Index] = {}
+        self._last_sweep = time.monotonic()
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database.name}.{self.name}"
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---- internals ----
+
+    def _plan(self, query: Optional[dict]) -> Iterable[dict]:
+        # Narrow to index buckets when the filter pins an indexed leading field
+        if not query:
+            return list(self._docs.values())
+        if "_id" in query:
+            keys = self._equality_keys(query["_id"])
+            if keys is not None:
+                return self._ordered({k for k in keys if k in self._docs})
+        for index in self._indexes.values():
+            field = index.fields[0]
+            if field in query:
+                keys = self._equality_keys(query[field])
+                if keys is not None:
+                    doc_keys = set()
+                    for key in keys:
+                        doc_keys |= index.buckets.get(key, set())
+                    return self._ordered(doc_keys)
+        return list(self._docs.values())
+
+    def _ordered(self, doc_keys: set) -> List[dict]:
+        return [self._docs[k] for k in sorted(doc_keys, key=self._order.__getitem__)]
+
+    @staticmethod
+    def _equality_keys(cond: Any) -> Optional[List[Any]]:
+        if isinstance(cond, re.Pattern):
+            return None
+        if not isinstance(cond, dict) or not _is_operator_doc(cond):
+            return [_hkey(cond)]
+        if set(cond) == {"$eq"}:
+            return [_hkey(cond["$eq"])]
+        if set(cond) == {"$in"} and not any(isinstance(v, re.Pattern) for v in cond["$in"]):
+            return [_hkey(v) for v in cond["$in"]]
+        return None
+
+    def _select(self, query: Optional[dict]) -> List[dict]:
+        self._sweep()
+        docs = self._plan(query)
+        if query:
+            docs = [doc for doc in docs if _matches(doc, query)]
+        return docs
+
+    def _first(self, query: Optional[dict], sort: Any = None) -> Optional[dict]:
+        docs = self._select(query)
+        if sort:
+            docs = _sort_docs(docs, _sort_spec(sort))
+        return docs[0] if docs else None
+
+    def _duplicate(self, index: _Index, doc: dict) -> DuplicateKeyError:
+        key_value = {field: _get(doc, field) for field in index.fields}
+        key_value = {k: (None if v is _MISSING else v) for k, v in key_value.items()}
+        message = f"E11000 duplicate key error collection: {self.full_name} index: {index.name} dup key: {key_value}"
+        return DuplicateKeyError(message, 11000, {"code": 11000, "errmsg": message, "keyValue": key_value})
+
+    def _insert(self, doc: dict) -> Any:
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        stored = _store(doc)
+        key = _hkey(stored["_id"])
+        if key in self._docs:
+            raise self._duplicate(_Index("_id_", [("_id", 1)], True, None), stored)
+        for index in self._indexes.values():
+            if index.conflict(key, stored):
+                raise self._duplicate(index, stored)
+        self._docs[key] = stored
+        self._order[key] = next(self._counter)
+        for index in self._indexes.values():
+            index.add(key, stored)
+        self.database._emit("insert", self.name, stored)
+        return stored["_id"]
+
+    def _rewrite(self, stored: dict, new: dict) -> bool:
+        # Swap in an updated copy, keeping indexes consistent; False when nothing changed
+        if new == stored:
+            return False
+        key = _hkey(stored["_id"])
+        new["_id"] = stored["_id"]
+        for index in self._indexes.values():
+            if index.conflict(key, new):
+                raise self._duplicate(index, new)
+        for index in self._indexes.values():
+            index.remove(key, stored)
+            index.add(key, new)
+        self._docs[key] = new
+        self.database._emit("update", self.name, new)
+        return True
+
+    def _update(self, stored: dict, update: Any) -> bool:
+        new = _copy(stored)
+        if _is_replacement(update):
+            new = {"_id": stored["_id"], **_store(update)}
+        else:
+            _apply_update(new, update)
+        return self._rewrite(stored, new)
+
+    def _upsert(self, query: dict, update: Any) -> Any:
+        doc = _upsert_seed(query)
+        if _is_replacement(update):
+            doc.update(_store(update))
+        else:
+            _apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def _delete(self, stored: dict):
+        key = _hkey(stored["_id"])
+        for index in self._indexes.values():
+            index.remove(key, stored)
+        del self._docs[key]
+        del self._order[key]
+        self.database._emit("delete", self.name, None, stored["_id"])
+
+    def _update_matching(self, query: dict, update: Any, upsert: bool, many: bool) -> Dict[str, Any]:
+        targets = self._select(query)
+        if not many:
+            targets = targets[:1]
+        if not targets:
+            if upsert:
+                return {"n": 1, "nModified": 0, "upserted": self._upsert(query, update)}
+            return {"n": 0, "nModified": 0}
+        modified = sum(1 for stored in targets if self._update(stored, update))
+        return {"n": len(targets), "nModified": modified}
+
+    def _sweep(self):
+        # TTL indexes: documents whose date field is older than expireAfterSeconds go away
+        now = time.monotonic()
+        if now - self._last_sweep < TTL_SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        wall = datetime.now(timezone.utc)
+        for index in self._indexes.values():
+            if index.expire_after is None:
+                continue
+            cutoff = wall - timedelta(seconds=index.expire_after)
+            for stored in list(self._docs.values()):
+                value = _get(stored, index.fields[0])
+                dates = [v for v in (value if isinstance(value, list) else [value]) if isinstance(v, datetime)]
+                if dates and min(dates) <= cutoff:
+                    self._delete(stored)
+
+    # ---- Motor API ----
+
+    def find(self, filter: Optional[dict] = None, projection: Any = None, sort: Any = None,
+             skip: int = 0, limit: int = 0, **kwargs) -> MemoryCursor:
+        cursor = MemoryCursor(lambda: self._select(filter), projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def find_one(self, filter: Any = None, projection: Any = None, sort: Any = None, **kwargs) -> Optional[dict]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        doc = self._first(filter, sort)
+        return _project(doc, projection) if doc is not None else None
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        ids, errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                ids.append(self._insert(document))
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(ids),
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+            })
+        return InsertManyResult(ids, True)
+
+    async def update_one(self, filter: dict, update: Any, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update_matching(filter, update, upsert, many=False), True)
+
+    async def update_many(self, filter: dict, update: Any, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update_matching(filter, update, upsert, many=True), True)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self._update_matching(filter, replacement, upsert, many=False), True)
+
+    async def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        doc = self._first(filter)
+        if doc is not None:
+            self._delete(doc)
+        return DeleteResult({"n": int(doc is not None)}, True)
+
+    async def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        docs = self._select(filter)
+        for doc in docs:
+            self._delete(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    async def count_documents(self, filter: dict, skip: int = 0, limit: int = 0, **kwargs) -> int:
+        total = len(self._docs) if not filter else len(self._select(filter))
+        count = max(total - skip, 0)
+        return min(count, limit) if limit else count
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self._docs)
+
+    async def distinct(self, key: str, filter: Optional[dict] = None, **kwargs) -> List[Any]:
+        seen: Dict[Any, Any] = {}
+        for doc in self._select(filter):
+            for value in _expand(_candidates(doc, key.split("."))):
+                if value is not _MISSING and not isinstance(value, list):
+                    seen.setdefault(_hkey(value), value)
+        return [_copy(v) for v in seen.values()]
+
+    async def find_one_and_update(self, filter: dict, update: Any, projection: Any = None, sort: Any = None,
+                                  upsert: bool = False, return_document: bool = ReturnDocument.BEFORE,
+                                  **kwargs) -> Optional[dict]:
+        stored = self._first(filter, sort)
+        if stored is None:
+            if not upsert:
+                return None
+            oid = self._upsert(filter, update)
+            if return_document == ReturnDocument.BEFORE:
+                return None
+            return _project(self._docs[_hkey(oid)], projection)
+        before = _project(stored, projection) if return_document == ReturnDocument.BEFORE else None
+        self._update(stored, update)
+        if before is not None:
+            return before
+        return _project(self._docs[_hkey(stored["_id"])], projection)
+
+    async def find_one_and_replace(self, filter: dict, replacement: dict, **kwargs) -> Optional[dict]:
+        return await self.find_one_and_update(filter, replacement, **kwargs)
+
+    async def find_one_and_delete(self, filter: dict, projection: Any = None, sort: Any = None, **kwargs) -> Optional[dict]:
+        stored = self._first(filter, sort)
+        if stored is None:
+            return None
+        self._delete(stored)
+        return _project(stored, projection)
+
+    async def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+                  "writeErrors": [], "writeConcernErrors": []}
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result["nInserted"] += 1
+                    continue
+                if isinstance(request, (DeleteOne, DeleteMany)):
+                    docs = self._select(request._filter)
+                    if isinstance(request, DeleteOne):
+                        docs = docs[:1]
+                    for doc in docs:
+                        self._delete(doc)
+                    result["nRemoved"] += len(docs)
+                    continue
+                if isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    raw = self._update_matching(
+                        request._filter, request._doc, bool(request._upsert), many=isinstance(request, UpdateMany)
+                    )
+                    if "upserted" in raw:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": i, "_id": raw["upserted"]})
+                    else:
+                        result["nMatched"] += raw["n"]
+                        result["nModified"] += raw["nModified"]
+                    continue
+                raise OperationFailure(f"Unsupported bulk operation {type(request).__name__}")
+            except DuplicateKeyError as e:
+                result["writeErrors"].append({"index": i, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline: List[dict], **kwargs) -> MemoryCursor:
+        return MemoryCursor(lambda: self._aggregate(pipeline))
+
+    def _aggregate(self, pipeline: List[dict]) -> List[dict]:
+        stages = list(pipeline)
+        # A leading $match can use indexes like find does
+        if stages and "$match" in stages[0]:
+            docs = [_copy(d) for d in self._select(stages.pop(0)["$match"])]
+        else:
+            self._sweep()
+            docs = [_copy(d) for d in self._docs.values()]
+
+        for stage in stages:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [d for d in docs if _matches(d, spec)]
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$sort":
+                docs = _sort_docs(docs, _sort_spec(spec))
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$skip":
+                docs = docs[spec:]
+            elif name == "$count":
+                docs = [{spec: len(docs)}]
+            elif name in ("$addFields", "$set"):
+                for doc in docs:
+                    for path, expr in spec.items():
+                        _set_path(doc, path, _eval(expr, doc))
+            elif name == "$project":
+                docs = [self._project_stage(doc, spec) for doc in docs]
+            elif name == "$unwind":
+                docs = self._unwind(docs, spec)
+            elif name == "$lookup":
+                foreign = self.database[spec["from"]]
+                for doc in docs:
+                    local = _get(doc, spec["localField"])
+                    local = None if local is _MISSING else local
+                    cond = {"$in": local} if isinstance(local, list) else local
+                    doc[spec["as"]] = [_copy(d) for d in foreign._select({spec["foreignField"]: cond})]
+            else:
+                raise OperationFailure(f"Aggregation stage {name} is not supported by the memory backend")
+        return docs
+
+    @staticmethod
+    def _project_stage(doc: dict, spec: dict) -> dict:
+        # 0/1 flags include or exclude; anything else is an expression
+        computed = {k: v for k, v in spec.items() if not isinstance(v, (bool, int))}
+        plain = {k: v for k, v in spec.items() if k not in computed}
+        out = _project(doc, plain) if plain else {"_id": doc.get("_id")}
+        for path, expr in computed.items():
+            _set_path(out, path, _eval(expr, doc))
+        return out
+
+    @staticmethod
+    def _unwind(docs: List[dict], spec: Any) -> List[dict]:
+        path = (spec if isinstance(spec, str) else spec["path"])[1:]
+        preserve = isinstance(spec, dict) and spec.get("preserveNullAndEmptyArrays", False)
+        out = []
+        for doc in docs:
+            value = _get(doc, path)
+            if isinstance(value, list) and value:
+                for item in value:
+                    copy = dict(doc)
+                    _set_path(copy, path, item)
+                    out.append(copy)
+            elif isinstance(value, list) or value is _MISSING or value is None:
+                if preserve:
+                    out.append(doc)
+            else:
+                out.append(doc)
+        return out
+
+    async def create_index(self, keys: Any, unique: bool = False, expireAfterSeconds: Optional[float] = None,
+                           name: Optional[str] = None, **kwargs) -> str:
+        spec = _sort_spec(keys, 1)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in spec)
+        if name in self._indexes:
+            return name
+        index = _Index(name, spec, unique, expireAfterSeconds)
+        for key, stored in self._docs.items():
+            if index.conflict(key, stored):
+                raise self._duplicate(index, stored)
+            index.add(key, stored)
+        self._indexes[name] = index
+        return name
+
+    async def drop_index(self, name: str, **kwargs):
+        if self._indexes.pop(name, None) is None:
+            raise OperationFailure(f"index not found with name [{name}]", 27)
+
+    async def index_information(self) -> Dict[str, Any]:
+        info = {"_id_": {"key": [("_id", 1)]}}
+        for index in self._indexes.values():
+            entry: Dict[str, Any] = {"key": index.keys}
+            if index.unique:
+                entry["unique"] = True
+            if index.expire_after is not None:
+                entry["expireAfterSeconds"] = index.expire_after
+            info[index.name] = entry
+        return info
+
+    async def drop(self):
+        for stored in list(self._docs.values()):
+            self.database._emit("delete", self.name, None, stored["_id"])
+        self._docs.clear()
+        self._order.clear()
+        self._indexes.clear()
+
+
+# ==================== DATABASE & CHANGE STREAMS ====================
+
+class MemoryChangeStream:
+    # Delivers this process's own writes in change stream shape, so the
+    # invalidation bus works unchanged on the memory backend
+
+    def __init__(self, database: "MemoryDatabase", pipeline: Optional[List[dict]], max_await_time_ms: Optional[int]):
+        self.database = database
+        self._match = next((stage["$match"] for stage in pipeline or [] if "$match" in stage), None)
+        self._timeout = (max_await_time_ms or 1000) / 1000.0
+        self._changes: deque = deque()
+        self._arrived = asyncio.Event()
+        self.resume_token = None
+        self.alive = True
+
+    def _push(self, change: dict):
+        if self._match is None or _matches(change, self._match):
+            self._changes.append(change)
+            self._arrived.set()
+
+    async def try_next(self) -> Optional[dict]:
+        if self._changes:
+            # Still a suspension point, like a real getMore
+            await asyncio.sleep(0)
+        else:
+            # asyncio.wait, unlike wait_for, never swallows a cancellation that
+            # lands as the wait completes, and nothing is dequeued until it returns
+            self._arrived.clear()
+            waiter = asyncio.ensure_future(self._arrived.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self._timeout)
+            finally:
+                waiter.cancel()
+            if not self._changes:
+                return None
+        change = self._changes.popleft()
+        self.resume_token = change["_id"]
+        return change
+
+    async def next(self) -> dict:
+        while self.alive:
+            change = await self.try_next()
+            if change is not None:
+                return change
+        raise StopAsyncIteration
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self.next()
+
+    async def close(self):
+        self.alive = False
+        self.database._streams.discard(self)
+
+    async def __aenter__(self) -> "MemoryChangeStream":
+        self.database._streams.add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class MemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._streams: set = set()
+        self._sequence = itertools.count(1)
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = MemoryCollection(self, name)
+        return collection
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    async def list_collection_names(self, **kwargs) -> List[str]:
+        return [name for name, collection in self._collections.items() if len(collection)]
+
+    async def drop_collection(self, name: str, **kwargs):
+        await self[name].drop()
+
+    async def command(self, command: Any, **kwargs) -> Dict[str, Any]:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ("ping", "hello", "isMaster", "ismaster"):
+            return {"ok": 1.0}
+        if name == "buildInfo":
+            return {"version": "memory", "ok": 1.0}
+        raise OperationFailure(f"Command {name} is not supported by the memory backend", 59)
+
+    def watch(self, pipeline: Optional[List[dict]] = None, full_document: Optional[str] = None,
+              resume_after: Any = None, max_await_time_ms: Optional[int] = None, **kwargs) -> MemoryChangeStream:
+        return MemoryChangeStream(self, pipeline, max_await_time_ms)
+
+    def _emit(self, operation: str, collection: str, doc: Optional[dict], document_id: Any = None):
+        if not self._streams:
+            return
+        sequence = next(self._sequence)
+        change = {
+            "_id": {"_data": f"{sequence:016x}"},
+            "operationType": operation,
+            "ns": {"db": self.name, "coll": collection},
+            "documentKey": {"_id": doc["_id"] if doc is not None else document_id},
+            "clusterTime": Timestamp(int(time.time()), sequence % (1 << 31)),
+        }
+        if doc is not None:
+            change["fullDocument"] = _copy(doc)
+        for stream in list(self._streams):
+            stream._push(change)
+
+    def close(self):
+        for stream in list(self._streams):
+            stream.alive = False
+        self._streams.clear()
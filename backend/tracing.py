@@ -0,0 +1,278 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+
+# Server-Timing metric names, in header order
+CATEGORIES = ("auth", "db", "llm", "serialize")
+
+# Driver plumbing that says nothing about the request
+_IGNORED_COMMANDS = {
+    "hello", "isMaster", "ismaster", "ping", "buildInfo", "saslStart", "saslContinue", "endSessions",
+}
+
+
+class Trace:
+    # Per-request timings. Totals are always kept (a few dict updates per
+    # span); the individual spans only for requests sampled for export.
+
+    __slots__ = ("trace_id", "method", "path", "route", "started", "wall_start", "totals", "spans",
+                 "max_spans", "endpoint_done", "_lock")
+
+    def __init__(self, trace_id: str, method: str, path: str, record_spans: bool, max_spans: int = 200):
+        self.trace_id = trace_id
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self.totals: Dict[str, List[float]] = {}
+        self.spans: Optional[List[Dict[str, Any]]] = [] if record_spans else None
+        self.max_spans = max_spans
+        self.endpoint_done: Optional[float] = None
+        # Mongo spans are reported from Motor's executor threads
+        self._lock = threading.Lock()
+
+    def add(self, category: str, start: float, duration_ms: float, detail: Optional[str] = None):
+        with self._lock:
+            total = self.totals.get(category)
+            if total is None:
+                total = self.totals[category] = [0, 0.0]
+            total[0] += 1
+            total[1] += duration_ms
+            if self.spans is not None and len(self.spans) < self.max_spans:
+                self.spans.append({
+                    "name": category,
+                    "detail": detail,
+                    "start_ms": round((start - self.started) * 1000, 3),
+                    "duration_ms": round(duration_ms, 3),
+                })
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        # Spans can nest (db inside auth), so metrics overlap rather than sum to total
+        metrics = []
+        for category in CATEGORIES + tuple(c for c in self.totals if c not in CATEGORIES):
+            total = self.totals.get(category)
+            if total is not None:
+                count, ms = total
+                metrics.append(f'{category};dur={ms:.1f};desc="{int(count)}x"')
+        metrics.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def to_dict(self, status: Optional[int], total_ms: float) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "start": datetime.fromtimestamp(self.wall_start, tz=timezone.utc).isoformat(),
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": status,
+            "duration_ms": round(total_ms, 3),
+            "totals": {k: {"count": int(v[0]), "ms": round(v[1], 3)} for k, v in self.totals.items()},
+            "spans": self.spans or [],
+        }
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextlib.contextmanager
+def span(category: str, detail: Optional[str] = None):
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(category, start, (time.perf_counter() - start) * 1000, detail)
+
+
+def traced(category: str):
+    # For async functions, including FastAPI dependencies: functools.wraps keeps
+    # the signature FastAPI inspects
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(category):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def mark_endpoint_done():
+    trace = current_trace.get()
+    if trace is not None:
+        trace.endpoint_done = time.perf_counter()
+
+
+class TracedJSONResponse(JSONResponse):
+    # Serialization is everything between the endpoint returning and the body
+    # being rendered: response_model validation, jsonable_encoder and json.dumps
+    def render(self, content: Any) -> bytes:
+        trace = current_trace.get()
+        if trace is None:
+            return super().render(content)
+        body = super().render(content)
+        now = time.perf_counter()
+        start = trace.endpoint_done if trace.endpoint_done is not None else now
+        trace.add("serialize", start, (now - start) * 1000)
+        trace.endpoint_done = None
+        return body
+
+
+class TracedRoute(APIRoute):
+    # Marks when the endpoint itself returns so TracedJSONResponse can time
+    # what comes after it
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _marking_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _marking_endpoint(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        result = await fn(*args, **kwargs)
+        mark_endpoint_done()
+        return result
+    return wrapper
+
+
+class TraceCommandListener(monitoring.CommandListener):
+    # Motor runs commands in executor threads with the caller's context copied
+    # in, so the request's trace is visible here
+
+    def __init__(self):
+        self._pending: Dict[Any, tuple] = {}
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace is None or event.command_name in _IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        detail = f"{collection}.{event.command_name}" if isinstance(collection, str) else event.command_name
+        self._pending[(event.connection_id, event.request_id)] = (trace, time.perf_counter(), detail)
+
+    def succeeded(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            trace, start, detail = pending
+            trace.add("db", start, event.duration_micros / 1000.0, detail)
+
+    def failed(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is not None:
+            trace, start, detail = pending
+            trace.add("db", start, event.duration_micros / 1000.0, f"{detail} failed")
+
+
+class TraceExporter:
+    # Appends finished traces to a JSON-lines file from a background thread so
+    # requests never wait on disk. Drops traces rather than queueing without bound.
+
+    def __init__(self, path: str, max_queue: int = 10_000):
+        self.path = path
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self.exported = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def submit(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as handle:
+            stopping = False
+            while not stopping:
+                records = [self._queue.get()]
+                # Drain whatever else is waiting so one write covers a burst
+                while len(records) < 500:
+                    try:
+                        records.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = None in records
+                records = [r for r in records if r is not None]
+                if records:
+                    handle.write("".join(json.dumps(r, default=str) + "\n" for r in records))
+                    handle.flush()
+                    self.exported += len(records)
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class TracingMiddleware:
+    # Opens a trace for a sampled fraction of requests, reports it in a
+    # Server-Timing header and hands an even smaller fraction to the exporter.
+    # Unsampled requests pay for two random() calls.
+
+    def __init__(self, app, sample_rate: float = 0.1, export_rate: float = 0.0,
+                 exporter: Optional[TraceExporter] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.export_rate = export_rate if exporter is not None else 0.0
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        export = self.export_rate > 0 and random.random() < self.export_rate
+        if not export and random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(os.urandom(8).hex(), scope["method"], scope["path"], record_spans=export)
+        token = current_trace.set(trace)
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", trace.server_timing(trace.elapsed_ms()))
+                if export:
+                    headers.append("X-Trace-Id", trace.trace_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            if export:
+                self.exporter.submit(trace.to_dict(status, trace.elapsed_ms()))
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other as top-level modules (server.py is run
+# from backend/), so the tests do the same
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Route tests run the app on the in-memory engine. Set before anything imports
+# server (migrate_data does), since it picks its storage at import time.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+
+@pytest.fixture
+def server():
+    # The server module on the memory engine, with the benchmark stand-in for
+    # the LLM client
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+
+    from benchmarks.fake_llm import install_fake_llm
+    install_fake_llm(latency_ms=0, jitter=0)
+    import server
+    from storage import MemoryDatabase
+
+    if not isinstance(server.db, MemoryDatabase):
+        pytest.skip("route tests need STORAGE_BACKEND=memory")
+    return server
+
+
+@pytest.fixture
+def api(server, monkeypatch):
+    # A started app over an emptied database and fresh rate limit buckets
+    from fastapi.testclient import TestClient
+
+    from rate_limit import MemoryBucketBackend
+
+    async def empty():
+        for name in await server.db.list_collection_names():
+            await server.db.drop_collection(name)
+
+    asyncio.run(empty())
+    server.invalidation_bus.clear_all()
+    monkeypatch.setattr(server.rate_limiter, "backend", MemoryBucketBackend())
+    # Minimum bcrypt cost: the tests log in a lot and the hash strength is irrelevant here
+    gensalt = server.bcrypt.gensalt
+    monkeypatch.setattr(server.bcrypt, "gensalt", lambda *args, **kwargs: gensalt(4))
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def signup(api):
+    # signup(email, role=...) registers and logs in, returning auth headers
+    def register(email: str, role: str = "student", password: str = "secret-pw") -> dict:
+        response = api.post("/api/auth/register", json={"email": email, "password": password, "name": email.split("@")[0], "role": role})
+        assert response.status_code == 200, response.text
+        response = api.post("/api/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['session_token']}"}
+
+    return register
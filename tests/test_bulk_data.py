@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("dotenv")
+pytest.importorskip("fastapi")
+
+from bulk_data import export_collection, import_collection, parse_args
+from storage import MemoryDatabase
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def course(id, **fields):
+    return {"id": id, "title": f"Course {id}", "description": "d", "category": "science", "language": "en",
+            "instructor_id": "i1", "created_at": T0, **fields}
+
+
+def export(db, name, directory, *flags):
+    args = parse_args(["export", str(directory), "--batch-size", "2", *flags])
+    return asyncio.run(export_collection(db, name, directory, args))
+
+
+def load(db, path, *flags):
+    args = parse_args(["import", str(path.parent), "--batch-size", "2", "--writers", "2", *flags])
+    name = path.name.split(".")[0]
+    return asyncio.run(import_collection(db, name, path, args))
+
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_export_round_trips_through_import(tmp_path):
+    source = MemoryDatabase("bulk_source")
+    asyncio.run(source.courses.insert_many([course(f"c{n}", price=n) for n in range(5)]))
+
+    assert export(source, "courses", tmp_path) == 5
+    path = tmp_path / "courses.ndjson"
+    assert [doc["id"] for doc in read_lines(path)] == ["c0", "c1", "c2", "c3", "c4"]
+    assert not list(tmp_path.glob("*.tmp*"))
+
+    target = MemoryDatabase("bulk_target")
+    assert load(target, path) == {"written": 5, "skipped": 0, "rejected": 0}
+    copied = asyncio.run(target.courses.find_one({"id": "c3"}, {"_id": 0}))
+    assert (copied["price"], copied["created_at"], copied["level"]) == (3, T0, "beginner")
+
+    # Same file again: the finished checkpoint short-circuits the import
+    assert load(target, path) == {"written": 0, "skipped": 0, "rejected": 0}
+    # A forced re-run matches every line and changes nothing
+    assert load(target, path, "--restart") == {"written": 0, "skipped": 5, "rejected": 0}
+
+
+def test_users_export_leaves_out_password_hashes(tmp_path):
+    db = MemoryDatabase("bulk_users")
+    asyncio.run(db.users.insert_one({"id": "u1", "email": "a@x.io", "name": "A", "password_hash": "$2b$..."}))
+
+    export(db, "users", tmp_path, "--gzip")
+    with gzip.open(tmp_path / "users.ndjson.gz", "rt") as handle:
+        assert "password_hash" not in json.loads(handle.readline())
+
+    export(db, "users", tmp_path, "--include-secrets")
+    assert read_lines(tmp_path / "users.ndjson")[0]["password_hash"] == "$2b$..."
+
+
+def test_invalid_lines_are_rejected_and_saved(tmp_path):
+    path = tmp_path / "courses.ndjson"
+    lines = [course("c1"), {"id": "c2", "title": "no required fields"}, course("c3")]
+    path.write_text("".join(json.dumps(doc, default=str) + "\n" for doc in lines) + "\n")
+
+    db = MemoryDatabase("bulk_rejects")
+    assert load(db, path) == {"written": 2, "skipped": 0, "rejected": 1}
+
+    (reject,) = read_lines(tmp_path / "courses.ndjson.rejects.ndjson")
+    assert reject["line"] == 2
+    assert json.loads(reject["raw"])["id"] == "c2"
+
+
+def test_upsert_only_overwrites_fields_present_in_the_file(tmp_path):
+    db = MemoryDatabase("bulk_upsert")
+    asyncio.run(db.courses.insert_one(course("c1", rating=4.5, total_enrollments=12)))
+    path = tmp_path / "courses.ndjson"
+    path.write_text(json.dumps({**course("c1", title="Renamed"), "created_at": T0.isoformat()}) + "\n")
+
+    assert load(db, path)["written"] == 1
+    stored = asyncio.run(db.courses.find_one({"id": "c1"}))
+    assert (stored["title"], stored["rating"], stored["total_enrollments"]) == ("Renamed", 4.5, 12)
+
+
+def test_interrupted_import_resumes_after_the_checkpoint(tmp_path):
+    path = tmp_path / "courses.ndjson"
+    path.write_text("".join(json.dumps(course(f"c{n}"), default=str) + "\n" for n in range(6)))
+    db = MemoryDatabase("bulk_resume")
+    stat = path.stat()
+    checkpoint_id = f"courses:{path.name}:{stat.st_size}:{int(stat.st_mtime)}"
+    asyncio.run(db.bulk_import_checkpoints.insert_one({"_id": checkpoint_id, "lines_done": 4}))
+
+    assert load(db, path, "--mode", "insert") == {"written": 2, "skipped": 0, "rejected": 0}
+    assert sorted(asyncio.run(db.courses.distinct("id"))) == ["c4", "c5"]
+    checkpoint = asyncio.run(db.bulk_import_checkpoints.find_one({"_id": checkpoint_id}))
+    assert checkpoint["done"] and checkpoint["lines_done"] == 6
+
+
+def test_insert_mode_skips_rows_already_imported(tmp_path):
+    path = tmp_path / "courses.ndjson"
+    path.write_text("".join(json.dumps(course(f"c{n}"), default=str) + "\n" for n in range(3)))
+    db = MemoryDatabase("bulk_insert")
+
+    async def unique_ids():
+        await db.courses.create_index("id", unique=True)
+        await db.courses.insert_one(course("c1"))
+
+    asyncio.run(unique_ids())
+    assert load(db, path, "--mode", "insert") == {"written": 2, "skipped": 1, "rejected": 0}
@@ -0,0 +1,118 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("motor")
+
+import cache_bus
+from cache_bus import InvalidationBus, InvalidationEvent, LocalCache, doc_tag
+from storage import MemoryDatabase
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the cache module's clock moves
+    fake = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache_bus, "time", types.SimpleNamespace(monotonic=lambda: fake.now, time=lambda: fake.now))
+    return fake
+
+
+def test_entries_expire_after_the_fallback_ttl_without_a_healthy_bus(clock):
+    cache = LocalCache("c", ttl=60, fallback_ttl=5)
+    cache.set("k", "v")
+    clock.now += 4
+    assert cache.get("k") == "v"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.stats()["max_age"] == 5
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = LocalCache("c", ttl=60, fallback_ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert [cache.get(k) for k in "abc"] == [1, None, 3]
+
+
+def test_tags_invalidate_every_entry_carrying_them(clock):
+    cache = LocalCache("c", ttl=60, fallback_ttl=60)
+    cache.set("list", [1, 2], tags=["courses"])
+    cache.set("c1", {"id": "c1"}, tags=["courses", doc_tag("courses", "id", "c1")])
+    cache.set("c2", {"id": "c2"}, tags=[doc_tag("courses", "id", "c2")])
+
+    cache.invalidate_tags([doc_tag("courses", "id", "c1")])
+    assert (cache.get("list"), cache.get("c1"), cache.get("c2")) == ([1, 2], None, {"id": "c2"})
+
+    # Re-setting a key drops its old tags
+    cache.set("list", [3])
+    cache.invalidate_tags(["courses"])
+    assert cache.get("list") == [3]
+    assert cache.invalidations == 1
+
+
+def test_event_from_change():
+    event = InvalidationEvent.from_change({
+        "operationType": "update",
+        "ns": {"db": "app", "coll": "lessons"},
+        "documentKey": {"_id": "oid1"},
+        "fullDocument": {"id": "l1", "course_id": "c1", "title": "ignored", "user_id": None},
+    })
+    assert not event.is_reset
+    assert event.tags() == ["lessons", "lessons/_id/oid1", "lessons/id/l1", "lessons/course_id/c1"]
+    assert InvalidationEvent.from_change({"operationType": "drop", "ns": {"coll": "lessons"}}).is_reset
+
+
+def test_publish_invalidates_resets_and_isolates_handlers(clock):
+    bus = InvalidationBus(["courses"], bus_id="test")
+    cache = bus.register(LocalCache("c", ttl=60, fallback_ttl=60))
+    seen = []
+    bus.subscribe(lambda event: 1 / 0)
+    bus.subscribe(seen.append)
+
+    cache.set("c1", 1, tags=[doc_tag("courses", "id", "c1")])
+    cache.set("c2", 2, tags=[doc_tag("courses", "id", "c2")])
+    bus.publish(InvalidationEvent("courses", "update", fields={"id": "c1"}))
+    assert (cache.get("c1"), cache.get("c2")) == (None, 2)
+
+    bus.publish(InvalidationEvent("courses", "dropDatabase"))
+    assert len(cache) == 0
+    assert [e.operation for e in seen] == ["update", "dropDatabase"]
+
+
+def test_bus_keeps_caches_coherent_with_writes():
+    db = MemoryDatabase("bus")
+    bus = InvalidationBus(["courses", "lessons"], bus_id="test", heartbeat_ms=50)
+    cache = bus.register(LocalCache("detail", ttl=60, fallback_ttl=1))
+
+    async def settle(predicate):
+        for _ in range(200):
+            if predicate():
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    async def scenario():
+        await db.courses.insert_one({"id": "c1", "title": "Optics"})
+        bus.start(db)
+        assert await settle(lambda: bus.healthy)
+        assert cache.stats()["max_age"] == 60
+
+        cache.set("c1", "page", tags=[doc_tag("courses", "id", "c1"), doc_tag("lessons", "course_id", "c1")])
+        cache.set("c2", "page", tags=[doc_tag("courses", "id", "c2")])
+        await db.lessons.insert_one({"id": "l1", "course_id": "c1"})
+        assert await settle(lambda: cache.get("c1") is None)
+        assert cache.get("c2") == "page"
+
+        await db.courses.update_one({"id": "c2"}, {"$set": {"title": "x"}}, upsert=True)
+        assert await settle(lambda: cache.get("c2") is None)
+
+        await bus.stop()
+        assert not bus.healthy
+        assert cache.stats()["max_age"] == 1
+        assert bus.stats()["events_seen"] >= 2
+
+    asyncio.run(scenario())
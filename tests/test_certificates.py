@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+pytest.importorskip("PIL")
+pytest.importorskip("starlette")
+
+from certificates import CertificateStore, _parse_range, file_response, render_certificate
+
+BODY = bytes(range(256)) * 4  # 1024 bytes
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=-0", (1024, 1024)),
+    ("bytes=2000-", (2000, 1023)),
+    (" bytes=5-4 ", (5, 4)),
+    # Multiple ranges and other units fall back to the whole file
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=-", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, len(BODY)) == expected
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "cert.pdf"
+    path.write_bytes(BODY)
+    return path
+
+
+def respond(path, **headers):
+    return asyncio.run(file_response({k.replace("_", "-"): v for k, v in headers.items()}, path, "application/pdf", "cert.pdf"))
+
+
+def test_full_response_carries_validators(artifact):
+    response = respond(artifact)
+    assert response.status_code == 200
+    assert response.body == BODY
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"].startswith('"')
+    assert 'filename="cert.pdf"' in response.headers["content-disposition"]
+
+
+def test_conditional_requests_get_304(artifact):
+    etag = respond(artifact).headers["etag"]
+    assert respond(artifact, if_none_match=etag).status_code == 304
+    assert respond(artifact, if_none_match=f'"other", {etag}').status_code == 304
+    assert respond(artifact, if_none_match="*").status_code == 304
+
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(hours=1), usegmt=True)
+    earlier = format_datetime(datetime.now(timezone.utc) - timedelta(days=1), usegmt=True)
+    assert respond(artifact, if_modified_since=later).status_code == 304
+    assert respond(artifact, if_modified_since=earlier).status_code == 200
+    assert respond(artifact, if_modified_since="not a date").status_code == 200
+    # If-None-Match wins over If-Modified-Since
+    assert respond(artifact, if_none_match='"other"', if_modified_since=later).status_code == 200
+
+
+def test_range_requests(artifact):
+    partial = respond(artifact, range="bytes=100-199")
+    assert partial.status_code == 206
+    assert partial.body == BODY[100:200]
+    assert partial.headers["content-range"] == "bytes 100-199/1024"
+
+    assert respond(artifact, range="bytes=-24").body == BODY[-24:]
+
+    for unsatisfiable in ("bytes=2000-", "bytes=5-4", "bytes=-0"):
+        response = respond(artifact, range=unsatisfiable)
+        assert response.status_code == 416
+        assert response.headers["content-range"] == "bytes */1024"
+
+    assert respond(artifact, range="bytes=0-1,5-6").status_code == 200
+
+
+def test_if_range_mismatch_sends_the_whole_file(artifact):
+    etag = respond(artifact).headers["etag"]
+    assert respond(artifact, range="bytes=0-9", if_range=etag).status_code == 206
+    stale = respond(artifact, range="bytes=0-9", if_range='"stale"')
+    assert stale.status_code == 200
+    assert stale.body == BODY
+
+
+@pytest.mark.parametrize("fmt, magic", [("pdf", b"%PDF"), ("png", b"\x89PNG")])
+def test_render_certificate(fmt, magic):
+    data = {"student_name": "Asha", "course_title": "Physics", "instructor_name": "", "issued_on": "1 Jan 2024", "certificate_id": "abc"}
+    assert render_certificate(data, fmt).startswith(magic)
+
+
+def test_store_renders_once_and_serves_from_disk(tmp_path):
+    store = CertificateStore(str(tmp_path), max_workers=1)
+    data = {"student_name": "Asha", "course_title": "Physics", "issued_on": "1 Jan 2024", "certificate_id": "abc"}
+
+    async def scenario():
+        # Concurrent requests share one render
+        first, second = await asyncio.gather(store.get("u1", "c1", "png", data), store.get("u1", "c1", "png", data))
+        again = await store.get("u1", "c1", "png", data)
+        return first, second, again
+
+    try:
+        first, second, again = asyncio.run(scenario())
+    finally:
+        store.close()
+    assert first == second == again == store.path("u1", "c1", "png")
+    assert first.read_bytes().startswith(b"\x89PNG")
+    assert store.stats() == {"rendered": 1, "hits": 1, "inflight": 0}
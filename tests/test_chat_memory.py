@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    # Every prompt the tutor sends, answered with a numbered reply
+    from benchmarks.fake_llm import FakeLlmChat
+
+    sent = []
+
+    async def send_message(self, message):
+        sent.append((self.system_message, message.text))
+        return f"answer {len(sent)}"
+
+    monkeypatch.setattr(FakeLlmChat, "send_message", send_message)
+    return sent
+
+
+def chat(api, headers, message, **body):
+    response = api.post("/api/ai/chat", json={"message": message, **body}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["response"]
+
+
+def history(api, headers, **params):
+    return api.get("/api/ai/chat/history", params=params, headers=headers).json()
+
+
+def test_turns_are_stored_and_replayed_in_the_next_prompt(api, signup, prompts):
+    headers = signup("learner@example.com")
+    assert chat(api, headers, "What is inertia?") == "answer 1"
+    assert chat(api, headers, "And momentum?") == "answer 2"
+
+    turns = history(api, headers)["turns"]
+    assert [(t["role"], t["text"]) for t in turns] == [
+        ("user", "What is inertia?"), ("assistant", "answer 1"), ("user", "And momentum?"), ("assistant", "answer 2")
+    ]
+    assert "Student: What is inertia?\nTutor: answer 1" in prompts[1][1]
+    assert prompts[1][1].endswith("New message from the student:\nAnd momentum?")
+
+
+def test_conversations_are_per_course_and_clearable(api, signup, prompts):
+    headers = signup("learner@example.com")
+    chat(api, headers, "general question")
+    chat(api, headers, "course question", course_id="c1")
+
+    assert [t["text"] for t in history(api, headers, course_id="c1")["turns"]] == ["course question", "answer 2"]
+    assert api.delete("/api/ai/chat/history", params={"course_id": "c1"}, headers=headers).status_code == 200
+    assert history(api, headers, course_id="c1")["turns"] == []
+    assert len(history(api, headers)["turns"]) == 2
+
+
+def test_old_exchanges_are_folded_into_the_summary(api, signup, prompts, server):
+    headers = signup("learner@example.com")
+    exchanges = (server.CHAT_WINDOW_TURNS + server.CHAT_SUMMARIZE_AFTER_TURNS) // 2 + 1
+    for i in range(exchanges):
+        chat(api, headers, f"question {i}")
+
+    deadline = time.monotonic() + 5
+    while not history(api, headers)["summary"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    conversation = history(api, headers)
+    summary_prompts = [text for system, text in prompts if "running notes" in system]
+    assert len(summary_prompts) == 1
+    assert "Student: question 0" in summary_prompts[0]
+    assert conversation["summary"] == f"answer {exchanges + 1}"
+    # Only the window is kept verbatim, starting on a question
+    assert len(conversation["turns"]) == server.CHAT_WINDOW_TURNS
+    first = conversation["turns"][0]
+    assert (first["role"], first["text"]) == ("user", f"question {exchanges - server.CHAT_WINDOW_TURNS // 2}")
+
+    chat(api, headers, "one more")
+    assert prompts[-1][1].startswith(f"Summary of the conversation so far:\nanswer {exchanges + 1}")
+
+
+def test_reply_survives_a_failed_memory_write(api, signup, prompts, server, monkeypatch):
+    headers = signup("learner@example.com")
+
+    async def unavailable(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(server, "append_conversation_turns", unavailable)
+    assert chat(api, headers, "still answered?") == "answer 1"
@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from compression import CompressionConfig, CompressionMiddleware
+
+
+def gzip_only(**kwargs) -> CompressionConfig:
+    config = CompressionConfig(**kwargs)
+    config.encodings = ["gzip"]
+    return config
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*;q=0.3, gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("gzip;q=bogus", None),
+])
+def test_negotiate_gzip(header, expected):
+    assert gzip_only().negotiate(header) == expected
+
+
+def test_negotiate_prefers_client_weight_then_server_order():
+    config = CompressionConfig()
+    config.encodings = ["zstd", "br", "gzip"]
+
+    assert config.negotiate("gzip, br, zstd") == "zstd"
+    assert config.negotiate("gzip;q=1, br;q=0.8, zstd;q=0.5") == "gzip"
+    assert config.negotiate("GZIP, Br") == "br"
+
+
+def run_app(app, accept_encoding: str, messages):
+    sent = []
+
+    async def inner(scope, receive, send):
+        for message in messages:
+            await send(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(app(inner)(scope, receive, send))
+    return sent
+
+
+def start(content_type: bytes = b"application/json", **extra):
+    headers = [(b"content-type", content_type)] + [(k.encode(), v.encode()) for k, v in extra.items()]
+    return {"type": "http.response.start", "status": 200, "headers": headers}
+
+
+def body(data: bytes, more_body: bool = False):
+    return {"type": "http.response.body", "body": data, "more_body": more_body}
+
+
+def middleware(config):
+    return lambda inner: CompressionMiddleware(inner, config)
+
+
+def header(message, name: bytes):
+    return dict(message["headers"]).get(name)
+
+
+def test_large_json_body_is_compressed():
+    payload = b'{"x": "' + b"a" * 4000 + b'"}'
+    sent = run_app(middleware(gzip_only()), "gzip", [start(), body(payload)])
+
+    assert header(sent[0], b"content-encoding") == b"gzip"
+    assert int(header(sent[0], b"content-length")) == len(sent[1]["body"])
+    assert gzip.decompress(sent[1]["body"]) == payload
+
+
+def test_small_and_incompressible_bodies_pass_through():
+    config = middleware(gzip_only(minimum_size=1024))
+
+    small = run_app(config, "gzip", [start(), body(b"{}")])
+    assert header(small[0], b"content-encoding") is None and small[1]["body"] == b"{}"
+
+    image = run_app(config, "gzip", [start(b"image/png"), body(b"\x89PNG" * 1000)])
+    assert header(image[0], b"content-encoding") is None
+
+
+def test_already_encoded_responses_are_left_alone():
+    sent = run_app(middleware(gzip_only()), "gzip", [start(**{"content-encoding": "br"}), body(b"x" * 4000)])
+    assert header(sent[0], b"content-encoding") == b"br"
+    assert sent[1]["body"] == b"x" * 4000
+
+
+def test_streaming_body_is_flushed_per_chunk():
+    chunks = [b'{"row": 1}\n' * 50, b'{"row": 2}\n' * 50, b""]
+    messages = [start(b"application/x-ndjson")] + [body(c, more_body=i < 2) for i, c in enumerate(chunks)]
+    sent = run_app(middleware(gzip_only()), "gzip", messages)
+
+    assert header(sent[0], b"content-length") is None
+    # Every chunk is decodable as soon as it arrives
+    assert all(m["body"] for m in sent[1:3])
+    assert gzip.decompress(b"".join(m["body"] for m in sent[1:])) == b"".join(chunks)
+
+
+def test_precompressed_payload_caches_variants():
+    config = gzip_only(minimum_size=10)
+    payload = config.payload(b'{"courses": []}' * 20)
+
+    first = asyncio.run(payload.response("gzip"))
+    second = asyncio.run(payload.response("gzip"))
+    plain = asyncio.run(payload.response(""))
+
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.body is second.body
+    assert gzip.decompress(first.body) == payload.body
+    assert plain.body == payload.body and "content-encoding" not in plain.headers
@@ -0,0 +1,50 @@
+import asyncio
+import uuid
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+
+def rollup(server, course_id):
+    return asyncio.run(server.db.course_analytics.find_one({"course_id": course_id}))
+
+
+@pytest.mark.parametrize("previous, progress, expected", [
+    (0, 40, {"progress_sum": 40}),
+    (60, 100, {"progress_sum": 40, "completions": 1}),
+    (100, 100, {"progress_sum": 0}),
+    (100, 80, {"progress_sum": -20, "completions": -1}),
+])
+def test_progress_rollup_delta(server, previous, progress, expected):
+    assert server.progress_rollup_delta(previous, progress) == expected
+
+
+def test_learner_counted_once_per_week(server):
+    course_id = str(uuid.uuid4())
+    week = server.analytics_week()
+    for _ in range(3):
+        asyncio.run(server.record_course_activity(course_id, "u1", {"quiz_attempts": 1}))
+    # Another worker's cache knows nothing; the stored activity row still dedupes
+    server.activity_cache.clear()
+    asyncio.run(server.record_course_activity(course_id, "u1"))
+    asyncio.run(server.record_course_activity(course_id, "u2"))
+
+    stored = rollup(server, course_id)
+    assert stored["active_learners"][week] == 2
+    assert stored["quiz_attempts"] == 3
+
+
+def test_failed_activity_write_is_retried(server, monkeypatch):
+    course_id = str(uuid.uuid4())
+    week = server.analytics_week()
+
+    async def unavailable(*args, **kwargs):
+        raise AutoReconnect("primary stepped down")
+
+    monkeypatch.setattr(server.db.course_activity, "update_one", unavailable)
+    with pytest.raises(AutoReconnect):
+        asyncio.run(server.record_course_activity(course_id, "u1"))
+    monkeypatch.undo()
+
+    asyncio.run(server.record_course_activity(course_id, "u1"))
+    assert rollup(server, course_id)["active_learners"][week] == 1
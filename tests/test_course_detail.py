@@ -0,0 +1,62 @@
+import pytest
+
+
+@pytest.fixture
+def instructor(signup):
+    return signup("teacher@example.com", role="instructor")
+
+
+@pytest.fixture
+def course_id(api, instructor):
+    course = api.post("/api/courses", json={"title": "Optics", "description": "Light", "category": "JEE", "language": "en"},
+                      headers=instructor).json()
+    for order in (1, 0):
+        api.post("/api/lessons", json={"course_id": course["id"], "title": f"Part {order}", "description": "", "order": order},
+                 headers=instructor)
+    api.post("/api/quizzes", json={"course_id": course["id"], "title": "Checkpoint"}, headers=instructor)
+    return course["id"]
+
+
+def detail(api, course_id, headers=None):
+    response = api.get(f"/api/courses/{course_id}/detail", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_anonymous_detail(api, course_id):
+    page = detail(api, course_id)
+    assert page["course"]["title"] == "Optics"
+    assert [lesson["title"] for lesson in page["lessons"]] == ["Part 0", "Part 1"]
+    assert all("_id" not in lesson for lesson in page["lessons"])
+    assert [quiz["title"] for quiz in page["quizzes"]] == ["Checkpoint"]
+    assert page["reviews"] == []
+    assert (page["assignments"], page["enrollment"]) == ([], None)
+
+
+def test_writes_invalidate_the_cached_part(api, signup, instructor, course_id):
+    detail(api, course_id)
+    api.post("/api/lessons", json={"course_id": course_id, "title": "Part 2", "description": "", "order": 2}, headers=instructor)
+    student = signup("student@example.com")
+    api.post("/api/reviews", json={"course_id": course_id, "rating": 4, "comment": "Clear"}, headers=student)
+
+    page = detail(api, course_id)
+    assert [lesson["title"] for lesson in page["lessons"]] == ["Part 0", "Part 1", "Part 2"]
+    assert [(r["rating"], r["comment"]) for r in page["reviews"]] == [(4, "Clear")]
+    assert page["course"]["total_ratings"] == 1
+
+
+def test_signed_in_detail_adds_enrollment(api, signup, course_id):
+    student = signup("student@example.com")
+    assert detail(api, course_id, student)["enrollment"] is None
+
+    enrollment_id = api.post("/api/enrollments", params={"course_id": course_id}, headers=student).json()["enrollment_id"]
+    page = detail(api, course_id, student)
+    assert page["enrollment"]["id"] == enrollment_id
+    assert page["enrollment"]["progress"] == 0
+    # The public part is the same either way
+    assert page["lessons"] == detail(api, course_id)["lessons"]
+
+
+def test_unknown_course(api, signup):
+    assert api.get("/api/courses/nope/detail").status_code == 404
+    assert api.get("/api/courses/nope/detail", headers=signup("student@example.com")).status_code == 404
@@ -0,0 +1,58 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def enrolled_course(api, signup, server, monkeypatch):
+    # Three enrollments exported two per batch, so batches and name lookups repeat
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 2)
+    instructor = signup("teacher@example.com", role="instructor")
+    course_id = api.post("/api/courses", json={"title": "Optics", "description": "Light", "category": "JEE", "language": "en"},
+                         headers=instructor).json()["id"]
+    for name in ("asha", "bilal", "chen"):
+        student = signup(f"{name}@example.com")
+        api.post("/api/enrollments", params={"course_id": course_id}, headers=student)
+    return course_id, instructor
+
+
+def export(api, headers, **params):
+    return api.get("/api/exports/enrollments", params=params, headers=headers)
+
+
+def test_ndjson_export(api, enrolled_course):
+    course_id, instructor = enrolled_course
+    response = export(api, instructor, course_id=course_id)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert f'filename="enrollments_{course_id}.ndjson"' in response.headers["content-disposition"]
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["user_email"] for row in rows) == ["asha@example.com", "bilal@example.com", "chen@example.com"]
+    assert all(row["course_id"] == course_id and row["progress"] == 0 for row in rows)
+    assert all("_id" not in row for row in rows)
+
+
+def test_csv_export_is_gzipped_on_request(api, enrolled_course):
+    course_id, instructor = enrolled_course
+    response = export(api, instructor, course_id=course_id, format="csv", gzip="true")
+    assert response.headers["content-type"] == "application/gzip"
+    assert f'filename="enrollments_{course_id}.csv.gz"' in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode("utf-8"))))
+    assert len(rows) == 3
+    assert list(rows[0]) == ["id", "course_id", "user_id", "user_name", "user_email", "progress", "last_watched_lesson_id", "enrolled_at"]
+    assert sorted(row["user_name"] for row in rows) == ["asha", "bilal", "chen"]
+
+
+def test_export_access(api, signup, enrolled_course):
+    course_id, instructor = enrolled_course
+    assert export(api, instructor, course_id=course_id, format="xml").status_code == 400
+    assert export(api, instructor, course_id="no-such-course").status_code == 404
+    assert export(api, signup("rival@example.com", role="instructor"), course_id=course_id).status_code == 403
+    assert export(api, signup("student@example.com"), course_id=course_id).status_code == 403
+    assert export(api, signup("admin@example.com", role="admin"), course_id=course_id).status_code == 200
+    assert api.get("/api/exports/quiz-results", params={"quiz_id": "nope"}, headers=instructor).status_code == 404
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("dotenv")
+pytest.importorskip("fastapi")
+
+from pymongo.errors import DuplicateKeyError
+
+from migrate_data import parse_args, run_migration
+from storage import MemoryDatabase
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def run(db, *argv):
+    args = parse_args(list(argv))
+    return asyncio.run(run_migration(db, args.migration, args))
+
+
+def enrollment(id, user_id, course_id, progress=0.0, minutes=0):
+    return {"id": id, "user_id": user_id, "course_id": course_id, "progress": progress, "enrolled_at": T0 + timedelta(minutes=minutes)}
+
+
+def seeded():
+    db = MemoryDatabase("migrate_data")
+
+    async def seed():
+        await db.courses.insert_many([{"id": "c1", "total_enrollments": 4}, {"id": "c2", "total_enrollments": 1}])
+        await db.enrollments.insert_many([
+            enrollment("e1", "u1", "c1", progress=10, minutes=0),
+            enrollment("e2", "u1", "c1", progress=60, minutes=5),
+            enrollment("e3", "u1", "c1", progress=60, minutes=9),
+            enrollment("e4", "u2", "c1"),
+            enrollment("e5", "u1", "c2"),
+        ])
+        await db.idempotency_keys.insert_one({"_id": "u1:key", "response": {"enrollment_id": "e1"}})
+
+    asyncio.run(seed())
+    return db
+
+
+def test_dry_run_changes_nothing():
+    db = seeded()
+    stats = run(db, "dedupe-enrollments", "--dry-run")
+
+    assert stats == {"groups": 1, "removed": 2, "courses": 1}
+    assert asyncio.run(db.enrollments.count_documents({})) == 5
+    assert asyncio.run(db.migration_checkpoints.count_documents({})) == 0
+
+
+def test_keeps_most_advanced_copy_and_repoints_references():
+    db = seeded()
+    run(db, "dedupe-enrollments")
+
+    remaining = asyncio.run(db.enrollments.find({"user_id": "u1", "course_id": "c1"}).to_list(None))
+    # Highest progress wins; the earlier enrollment breaks the tie
+    assert [e["id"] for e in remaining] == ["e2"]
+    assert sorted(d["id"] for d in asyncio.run(db.enrollment_duplicates.find({}).to_list(None))) == ["e1", "e3"]
+    assert asyncio.run(db.idempotency_keys.find_one({"_id": "u1:key"}))["response"]["enrollment_id"] == "e2"
+    assert asyncio.run(db.courses.find_one({"id": "c1"}))["total_enrollments"] == 2
+    assert asyncio.run(db.courses.find_one({"id": "c2"}))["total_enrollments"] == 1
+
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(db.enrollments.insert_one(enrollment("e6", "u1", "c1")))
+
+    # Re-running finds nothing to do
+    assert run(db, "dedupe-enrollments")["removed"] == 0
+    assert asyncio.run(db.migration_checkpoints.find_one({"_id": "migrate_data:dedupe-enrollments"}))["done"]
+
+
+def test_backfills_and_purge():
+    db = MemoryDatabase("migrate_data_backfills")
+    now = datetime.now(timezone.utc)
+
+    async def seed():
+        await db.reviews.insert_many([{"id": "r1"}, {"id": "r2", "helpful_count": 4}])
+        await db.blog_posts.insert_many([
+            {"id": "p1", "content": "# Heading\n\nSome **bold** text"},
+            {"id": "p2", "content": "kept", "excerpt": "custom"},
+        ])
+        await db.user_sessions.insert_many([
+            {"session_token": "old", "expires_at": (now - timedelta(days=1)).isoformat()},
+            {"session_token": "live", "expires_at": (now + timedelta(days=1)).isoformat()},
+            {"session_token": "native", "expires_at": now - timedelta(days=1)},
+        ])
+
+    asyncio.run(seed())
+
+    assert run(db, "backfill-helpful-counts", "--dry-run") == {"reviews": 1}
+    assert run(db, "backfill-helpful-counts") == {"reviews": 1}
+    assert asyncio.run(db.reviews.find_one({"id": "r1"}))["helpful_count"] == 0
+    assert asyncio.run(db.reviews.find_one({"id": "r2"}))["helpful_count"] == 4
+
+    assert run(db, "backfill-blog-excerpts") == {"posts": 1}
+    assert asyncio.run(db.blog_posts.find_one({"id": "p1"}))["excerpt"] == "Heading Some bold text"
+    assert asyncio.run(db.blog_posts.find_one({"id": "p2"}))["excerpt"] == "custom"
+
+    assert run(db, "purge-legacy-sessions") == {"sessions": 1}
+    tokens = sorted(s["session_token"] for s in asyncio.run(db.user_sessions.find({}).to_list(None)))
+    assert tokens == ["live", "native"]
+
+    assert run(db, "backfill-helpful-counts")["reviews"] == 0
+    assert run(db, "backfill-blog-excerpts")["posts"] == 0
+
+
+def test_drop_cache_bus_state():
+    db = MemoryDatabase("migrate_data_bus_state")
+    asyncio.run(db.cache_bus_state.insert_many([{"_id": f"host:{pid}", "resume_token": {"_data": "01"}} for pid in range(3)]))
+
+    assert run(db, "drop-cache-bus-state", "--dry-run") == {"documents": 3}
+    assert run(db, "drop-cache-bus-state") == {"documents": 3}
+    assert "cache_bus_state" not in asyncio.run(db.list_collection_names())
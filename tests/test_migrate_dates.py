@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("dotenv")
+
+from migrate_dates import MIGRATION_NAME, migrate_collection, parse_args, parse_timestamp
+from storage import MemoryDatabase
+
+
+def test_parse_timestamp_assumes_utc_for_naive_values():
+    assert parse_timestamp("2024-03-01T10:00:00") == datetime(2024, 3, 1, 10, tzinfo=timezone.utc)
+    assert parse_timestamp("2024-03-01T10:00:00+05:30").utcoffset().total_seconds() == 5.5 * 3600
+    assert parse_timestamp("not a date") is None
+
+
+def run(db, name, fields, *argv):
+    args = parse_args(["--max-rate", "0", *argv])
+    return asyncio.run(migrate_collection(db, name, fields, args))
+
+
+def seed(db, count=25):
+    docs = [{"id": str(i), "created_at": f"2024-01-{i % 28 + 1:02d}T08:00:00"} for i in range(count)]
+    docs.append({"id": "native", "created_at": datetime(2024, 2, 1, tzinfo=timezone.utc)})
+    docs.append({"id": "broken", "created_at": "yesterday"})
+    asyncio.run(db.courses.insert_many(docs))
+
+
+def test_rewrites_strings_and_checkpoints():
+    db = MemoryDatabase("migrate")
+    seed(db)
+
+    stats = run(db, "courses", ["created_at"], "--batch-size", "7", "--no-count")
+
+    assert stats == {"scanned": 26, "updated": 25, "failed": 1}
+    converted = asyncio.run(db.courses.find_one({"id": "3"}))
+    assert converted["created_at"] == datetime(2024, 1, 4, 8, tzinfo=timezone.utc)
+    assert asyncio.run(db.courses.count_documents({"created_at": {"$type": "string"}})) == 1
+    checkpoint = asyncio.run(db.migration_checkpoints.find_one({"_id": f"{MIGRATION_NAME}:courses"}))
+    assert checkpoint["done"] is True
+
+    # A finished collection is skipped unless --restart is given
+    assert run(db, "courses", ["created_at"], "--no-count")["scanned"] == 0
+
+
+def test_dry_run_writes_nothing():
+    db = MemoryDatabase("migrate")
+    seed(db, count=5)
+
+    stats = run(db, "courses", ["created_at"], "--dry-run", "--no-count")
+
+    assert stats["updated"] == 5
+    assert asyncio.run(db.courses.count_documents({"created_at": {"$type": "string"}})) == 6
+    assert asyncio.run(db.migration_checkpoints.count_documents({})) == 0
+
+
+def test_concurrent_writes_win():
+    db = MemoryDatabase("migrate")
+    seed(db, count=3)
+
+    # The conditional update only matches the string the migration read
+    original_bulk_write = db.courses.bulk_write
+
+    async def racing_bulk_write(ops, **kwargs):
+        await db.courses.update_one({"id": "0"}, {"$set": {"created_at": "2030-01-01T00:00:00"}})
+        return await original_bulk_write(ops, **kwargs)
+
+    db.courses.bulk_write = racing_bulk_write
+    run(db, "courses", ["created_at"], "--no-count")
+
+    assert asyncio.run(db.courses.find_one({"id": "0"}))["created_at"] == "2030-01-01T00:00:00"
@@ -0,0 +1,86 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("motor")
+
+from bson.regex import Regex
+
+from pagination import decode_cursor, encode_cursor, keyset_cursor, keyset_filter, offset_cursor
+from storage import MemoryDatabase
+
+SORTS = {
+    "newest": [("created_at", -1), ("id", -1)],
+    "highest": [("rating", -1), ("created_at", -1), ("id", -1)],
+    "lowest": [("rating", 1), ("created_at", -1), ("id", -1)],
+}
+
+
+def seeded_reviews(count=57):
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    db = MemoryDatabase("pagination")
+    # Few distinct timestamps and ratings so every tie-break level is exercised
+    docs = [
+        {"id": f"r{i:03d}", "course_id": "c1", "rating": rng.randint(1, 5),
+         "created_at": start + timedelta(minutes=rng.randint(0, 5))}
+        for i in range(count)
+    ]
+    asyncio.run(db.reviews.insert_many([dict(d) for d in docs]))
+    return db, docs
+
+
+def expected_order(docs, sort):
+    ordered = list(docs)
+    for field, direction in reversed(sort):
+        ordered.sort(key=lambda d: d[field], reverse=direction < 0)
+    return [d["id"] for d in ordered]
+
+
+def walk_keyset(db, sort, limit):
+    seen, cursor = [], None
+    while True:
+        query = {"course_id": "c1"}
+        if cursor:
+            query.update(keyset_filter(decode_cursor(cursor)["after"], sort))
+        page = asyncio.run(db.reviews.find(query, {"_id": 0}).sort(sort).limit(limit).to_list(limit))
+        seen += [d["id"] for d in page]
+        if len(page) < limit:
+            return seen
+        cursor = keyset_cursor(page[-1], sort)
+
+
+@pytest.mark.parametrize("name", sorted(SORTS))
+@pytest.mark.parametrize("limit", [1, 7, 20])
+def test_keyset_pages_cover_every_review_once(name, limit):
+    db, docs = seeded_reviews()
+    assert walk_keyset(db, SORTS[name], limit) == expected_order(docs, SORTS[name])
+
+
+def test_cursor_round_trip_keeps_dates_typed():
+    doc = {"created_at": datetime(2024, 5, 1, 12, tzinfo=timezone.utc), "id": "r1"}
+    values = decode_cursor(keyset_cursor(doc, SORTS["newest"]))["after"]
+    assert values[0] == doc["created_at"]
+    assert values[1] == "r1"
+    assert decode_cursor(offset_cursor(40)) == {"offset": 40}
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30", "WzFd"])
+def test_malformed_cursors_raise_value_error(cursor):
+    # "e30" decodes to {} (no keyset values), "WzFd" to [1] (not an object)
+    with pytest.raises(ValueError):
+        keyset_filter(decode_cursor(cursor).get("after"), SORTS["newest"])
+
+
+def test_keyset_filter_rejects_wrong_arity():
+    with pytest.raises(ValueError):
+        keyset_filter(["2024-01-01"], SORTS["newest"])
+
+
+@pytest.mark.parametrize("value", [{"$ne": None}, Regex(".*"), ["r001"], None, True])
+def test_non_scalar_cursor_values_are_rejected(value):
+    cursor = encode_cursor({"after": [value, "r001"]})
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        keyset_filter(decode_cursor(cursor)["after"], SORTS["newest"])
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("numpy")
+
+from quiz_generation import GeneratedQuestion, allocate_quotas, deduplicate, merge, parse_questions, split_content
+
+
+def question(text: str, chunk: int = 0) -> GeneratedQuestion:
+    return GeneratedQuestion(question_text=text, options=["a", "b", "c", "d"], correct_answer="a", source_chunk=chunk)
+
+
+def test_parses_json_array_wrapped_in_prose():
+    reply = "Sure! Here you go:\n```json\n" + json.dumps([
+        {"question": "What is 2 + 2?", "options": ["3", "4", "5", "6"], "correct": "b", "explanation": "Arithmetic"},
+    ]) + "\n```"
+
+    [parsed] = parse_questions(reply, chunk_index=3)
+    assert parsed.question_text == "What is 2 + 2?"
+    assert parsed.correct_answer == "4"
+    assert parsed.explanation == "Arithmetic"
+    assert parsed.source_chunk == 3
+
+
+def test_falls_back_to_plain_text_layout():
+    reply = (
+        "Q: Capital of India? A) Mumbai B) New Delhi C) Kolkata D) Chennai Correct: B\n"
+        "Q: Largest planet? A) Earth B) Mars C) Jupiter D) Venus Correct: C"
+    )
+    parsed = parse_questions(reply)
+    assert [q.correct_answer for q in parsed] == ["New Delhi", "Jupiter"]
+
+
+def test_skips_malformed_items():
+    reply = json.dumps([
+        {"question": "Three options", "options": ["a", "b", "c"], "correct": "A"},
+        {"question": "Bad letter", "options": ["a", "b", "c", "d"], "correct": "E"},
+        {"question": "Duplicate options", "options": ["a", "A", "c", "d"], "correct": "A"},
+        {"question": "", "options": ["a", "b", "c", "d"], "correct": "A"},
+        "not an object",
+        {"question": "Valid", "options": ["w", "x", "y", "z"], "correct": "D"},
+    ])
+    assert [q.question_text for q in parse_questions(reply)] == ["Valid"]
+    assert parse_questions("no questions here") == []
+
+
+def test_short_content_is_one_chunk():
+    assert split_content("a short chapter", max_tokens=100) == ["a short chapter"]
+    assert len(split_content("word " * 2000, max_tokens=100)) > 1
+
+
+@pytest.mark.parametrize("total", [1, 5, 7, 20])
+def test_quotas_are_proportional_and_sum_to_total(total):
+    chunks = ["x" * 400, "x" * 200, "x" * 200]
+    quotas = allocate_quotas(chunks, total)
+    assert sum(quotas) == total
+    assert quotas[0] >= quotas[1] >= quotas[2] - 1
+
+
+def test_deduplicate_drops_near_identical_wording():
+    kept = deduplicate([
+        question("What is Newton's second law of motion?"),
+        question("What is Newton's second law of motion about?"),
+        question("Define photosynthesis"),
+        question("the of"),
+    ])
+    assert [q.question_text for q in kept] == ["What is Newton's second law of motion?", "Define photosynthesis"]
+
+
+def test_merge_fills_gaps_from_spares_in_chunk_order():
+    per_chunk = [
+        [question("Define velocity", 0), question("Define acceleration", 0)],
+        [question("Define velocity", 1), question("Define momentum", 1), question("Define inertia", 1)],
+    ]
+    merged = merge(per_chunk, quotas=[1, 2], total=3)
+
+    # Chunk 1's first question duplicates chunk 0's, so a spare fills in
+    assert [q.question_text for q in merged] == ["Define velocity", "Define acceleration", "Define momentum"]
+    assert [q.source_chunk for q in merged] == [0, 0, 1]
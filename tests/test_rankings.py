@@ -0,0 +1,110 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from rankings import RANKING_LISTS, CourseRankings
+
+CATEGORIES = ["JEE", "NEET", "UPSC"]
+LANGUAGES = ["en", "hi"]
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+K = 5
+
+
+def course(rng, i):
+    return {
+        "_id": f"oid{i}", "id": f"c{i}", "category": rng.choice(CATEGORIES), "language": rng.choice(LANGUAGES),
+        "total_enrollments": rng.randint(0, 30), "rating": round(rng.uniform(1, 5), 2), "total_ratings": rng.randint(0, 20),
+    }
+
+
+def expected_top(rankings, list_name, category, language):
+    # Brute force over every course, independent of the incremental buffers
+    prior, weight = rankings._prior_mean, rankings.rating_prior
+
+    def bayesian(s):
+        return (weight * prior + s.rating * s.ratings) / (weight + s.ratings)
+
+    def key(s):
+        if list_name == "popular":
+            return (-s.enrollments, -bayesian(s), s.course_id)
+        if list_name == "trending":
+            return (-s.recent_total, -s.enrollments, s.course_id)
+        return (-bayesian(s), -s.ratings, s.course_id)
+
+    members = [
+        s for s in rankings._courses.values()
+        if category in (None, s.category) and language in (None, s.language)
+    ]
+    return [s.course_id for s in sorted(members, key=key)[:K]]
+
+
+def assert_exact(rankings):
+    for list_name in RANKING_LISTS:
+        for category in [None, *CATEGORIES]:
+            for language in [None, *LANGUAGES]:
+                got = [card["id"] for card in rankings.top(list_name, category, language)]
+                assert got == expected_top(rankings, list_name, category, language), (list_name, category, language)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_top_matches_brute_force_after_random_updates(seed):
+    rng = random.Random(seed)
+    now = T0
+    rankings = CourseRankings(k=K, window_seconds=3 * 3600, bucket_seconds=3600, rating_prior=3)
+    rankings.load([course(rng, i) for i in range(40)], [], now)
+    assert_exact(rankings)
+
+    next_id = 40
+    for _ in range(1500):
+        op = rng.random()
+        ids = list(rankings._courses)
+        if op < 0.45 and ids:
+            rankings.record_enrollment(rng.choice(ids), now)
+        elif op < 0.6 and ids:
+            # Moves the catalogue mean, which must not disturb stored keys
+            rankings.record_rating(rng.choice(ids), round(rng.uniform(1, 5), 2), rng.randint(0, 40))
+        elif op < 0.7:
+            rankings.upsert_course(course(rng, next_id), now)
+            next_id += 1
+        elif op < 0.78 and ids:
+            rankings.remove(rng.choice(ids))
+        elif op < 0.86 and ids:
+            stats = rankings._courses[rng.choice(ids)]
+            doc = {**stats.card, "category": rng.choice(CATEGORIES), "total_enrollments": stats.enrollments + rng.randint(0, 3)}
+            rankings.upsert_course(doc, now)
+        elif op < 0.9:
+            now += timedelta(minutes=rng.randint(10, 90))
+            rankings.advance(now)
+        assert_exact(rankings)
+
+
+def test_prior_follows_the_mean_only_on_load_and_advance():
+    rankings = CourseRankings(k=K, rating_prior=10)
+    rankings.load([
+        {"id": "a", "category": "JEE", "language": "en", "rating": 4.0, "total_ratings": 10},
+        {"id": "b", "category": "JEE", "language": "en", "rating": 2.0, "total_ratings": 10},
+    ], [], T0)
+    assert rankings.stats()["prior_mean"] == 3.0
+
+    rankings.record_rating("b", 5.0, 30)
+    assert rankings.mean_rating > 4.0
+    assert rankings.stats()["prior_mean"] == 3.0
+
+    assert rankings.advance(T0 + timedelta(hours=2))
+    assert rankings.stats()["prior_mean"] == round(rankings.mean_rating, 3)
+    assert [card["id"] for card in rankings.top("top_rated")] == ["b", "a"]
+
+
+def test_trending_window_slides():
+    rankings = CourseRankings(k=K, window_seconds=2 * 3600, bucket_seconds=3600)
+    rankings.load([
+        {"id": "old", "category": "JEE", "language": "en", "total_enrollments": 5},
+        {"id": "new", "category": "JEE", "language": "en", "total_enrollments": 1},
+    ], [("old", T0)] * 3, T0)
+    rankings.record_enrollment("new", T0 + timedelta(hours=1))
+    assert [card["id"] for card in rankings.top("trending")] == ["old", "new"]
+
+    rankings.advance(T0 + timedelta(hours=2))
+    assert [card["id"] for card in rankings.top("trending")] == ["new", "old"]
+    assert [card["id"] for card in rankings.top("trending", category="JEE", language="en", limit=1)] == ["new"]
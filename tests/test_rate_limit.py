@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+from rate_limit import MemoryBucketBackend, RateLimiter, RateLimitPolicy
+
+POLICY = RateLimitPolicy("test", capacity=2, per_seconds=3600)
+
+
+def test_bucket_allows_a_burst_then_rejects_with_retry_after():
+    limiter = RateLimiter(MemoryBucketBackend())
+
+    async def scenario():
+        await limiter.check(POLICY, "k")
+        await limiter.check(POLICY, "k")
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.check(POLICY, "k")
+        assert rejected.value.status_code == 429
+        assert int(rejected.value.headers["Retry-After"]) > 1000
+        # Buckets are per key
+        await limiter.check(POLICY, "other")
+
+    asyncio.run(scenario())
+    assert limiter.stats() == {"test": {"allowed": 3, "rejected": 1}}
+
+
+def test_zero_cost_check_only_requires_a_token_and_charge_spends_it():
+    limiter = RateLimiter(MemoryBucketBackend())
+
+    async def scenario():
+        for _ in range(5):
+            await limiter.check(POLICY, "k", cost=0)
+        await limiter.charge(POLICY, "k")
+        await limiter.charge(POLICY, "k")
+        with pytest.raises(HTTPException):
+            await limiter.check(POLICY, "k", cost=0)
+
+    asyncio.run(scenario())
+
+
+def test_policy_override_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_LOGIN_IP", "3/30")
+    policy = RateLimitPolicy.from_env("login_ip", capacity=20, per_seconds=60, key="ip")
+    assert (policy.capacity, policy.per_seconds, policy.key) == (3, 30.0, "ip")
+
+
+def login(api, email, password):
+    return api.post("/api/auth/login", json={"email": email, "password": password})
+
+
+def test_successful_logins_never_lock_the_account(api, signup):
+    signup("owner@example.com")
+    for _ in range(6):
+        assert login(api, "owner@example.com", "secret-pw").status_code == 200
+
+
+def test_failed_logins_lock_only_that_account(api, signup):
+    signup("victim@example.com")
+    signup("bystander@example.com")
+    for _ in range(5):
+        assert login(api, "victim@example.com", "wrong").status_code == 401
+
+    locked = login(api, "VICTIM@example.com", "secret-pw")
+    assert locked.status_code == 429
+    assert "Retry-After" in locked.headers
+    assert login(api, "bystander@example.com", "secret-pw").status_code == 200
+
+
+def test_login_attempts_are_capped_per_ip(api):
+    # 20 per minute from one address, whatever the account
+    statuses = [login(api, f"nobody{i}@example.com", "wrong").status_code for i in range(21)]
+    assert statuses[:20] == [401] * 20
+    assert statuses[20] == 429
+
+
+@pytest.mark.parametrize("hops, header, expected", [
+    # The ingress appends the real peer; a spoofed leftmost entry is ignored
+    ("1", "6.6.6.6, 203.0.113.9", "203.0.113.9"),
+    ("2", "6.6.6.6, 203.0.113.9, 10.0.0.2", "203.0.113.9"),
+    ("3", "203.0.113.9, 10.0.0.2", "203.0.113.9"),
+    ("1", "", "testclient"),
+])
+def test_client_ip_counts_trusted_hops_from_the_right(server, monkeypatch, hops, header, expected):
+    from starlette.requests import Request
+
+    monkeypatch.setenv("TRUST_PROXY_HEADERS", "true")
+    monkeypatch.setenv("TRUSTED_PROXY_HOPS", hops)
+    request = Request({"type": "http", "headers": [(b"x-forwarded-for", header.encode())], "client": ("testclient", 50000)})
+    assert server.client_ip(request) == expected
+
+
+def test_rotating_forwarded_for_does_not_escape_the_ip_limit(api, monkeypatch):
+    monkeypatch.setenv("TRUST_PROXY_HEADERS", "true")
+    statuses = [
+        api.post("/api/auth/login", json={"email": f"x{i}@example.com", "password": "wrong"},
+                 headers={"X-Forwarded-For": f"198.51.100.{i}, 203.0.113.9"}).status_code
+        for i in range(21)
+    ]
+    assert statuses[20] == 429
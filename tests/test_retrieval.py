@@ -0,0 +1,121 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from retrieval import HashingEmbedder, SourceDocument, VectorIndex, chunk_text, estimate_tokens, tokenize
+
+
+def make_index(**kwargs) -> VectorIndex:
+    return VectorIndex(HashingEmbedder(dim=256), **kwargs)
+
+
+def add(index: VectorIndex, *docs: SourceDocument):
+    index.apply(index.prepare(docs))
+
+
+def lesson(source_id: str, text: str, scope: str = "course-1", title: str = "", oid=None) -> SourceDocument:
+    return SourceDocument("lesson", source_id, scope, title or source_id, text, oid)
+
+
+def test_tokenize_drops_stop_words_and_keeps_devanagari_words_whole():
+    assert tokenize("What is the Derivative of x?") == ["derivative", "x"]
+    assert tokenize("न्यूटन के नियम") == ["न्यूटन", "के", "नियम"]
+
+
+def test_embedding_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dim=64)
+    first, second = embedder.embed("photosynthesis in plants"), embedder.embed("photosynthesis in plants")
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert not embedder.embed("the of and").any()
+
+
+def test_chunks_respect_the_budget_and_overlap():
+    words = [f"word{i}" for i in range(400)]
+    chunks = chunk_text(" ".join(words), max_tokens=40, overlap_tokens=10)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 40 for c in chunks)
+    # Consecutive chunks share words, and together they cover the whole text
+    assert all(set(a.split()) & set(b.split()) for a, b in zip(chunks, chunks[1:]))
+    assert set(" ".join(chunks).split()) == set(words)
+    assert chunk_text("   ") == []
+
+
+def test_search_ranks_relevant_chunks_within_scope():
+    index = make_index()
+    add(
+        index,
+        lesson("l1", "Newton's laws of motion describe force, mass and acceleration"),
+        lesson("l2", "Photosynthesis converts light energy into chemical energy in plants"),
+        lesson("l3", "Force equals mass times acceleration", scope="course-2"),
+    )
+
+    results = index.search("force and acceleration", ["course-1"])
+    assert [chunk.source_id for _, chunk in results] == ["l1"]
+    assert index.search("force", ["unknown-scope"]) == []
+    assert index.search("the of", ["course-1"]) == []
+
+
+def test_token_budget_limits_results():
+    index = make_index()
+    add(index, *[lesson(f"l{i}", "algebra equations " * 20 + str(i)) for i in range(5)])
+
+    # Each chunk is ~90 tokens, so only two fit
+    results = index.search("algebra equations", ["course-1"], k=5, token_budget=200)
+    assert len(results) == 2
+    assert sum(chunk.tokens for _, chunk in results) <= 200
+
+
+def test_updates_replace_rows_and_reuse_free_slots():
+    index = make_index()
+    add(index, lesson("l1", "vectors and matrices"), lesson("l2", "cell biology"))
+    capacity = index.stats()["capacity"]
+
+    add(index, lesson("l1", "trigonometry identities"))
+    assert len(index) == 2
+    assert index.search("matrices", ["course-1"]) == []
+    assert index.search("trigonometry", ["course-1"])[0][1].source_id == "l1"
+
+    # Unchanged text is skipped by prepare
+    docs, _, _ = index.prepare([lesson("l1", "trigonometry identities")])
+    assert docs == []
+
+    index.remove("lesson", "l2")
+    add(index, lesson("l3", "organic chemistry"))
+    assert len(index) == 2
+    assert index.stats()["capacity"] == capacity
+
+
+def test_grows_past_initial_capacity():
+    index = make_index()
+    add(index, *[lesson(f"l{i}", f"topic number {i}") for i in range(1500)])
+    assert len(index) == 1500
+    assert index.stats()["capacity"] >= 1500
+
+
+def test_remove_by_oid_and_scope():
+    index = make_index()
+    add(index, lesson("l1", "kinematics", oid="oid-1"), lesson("l2", "dynamics"), lesson("l3", "optics", scope="course-2"))
+
+    index.remove_oid("oid-1")
+    assert index.search("kinematics", ["course-1"]) == []
+
+    index.remove_scope("course-1")
+    assert len(index) == 1
+
+
+def test_build_keeps_changes_made_while_it_runs():
+    index = make_index()
+    add(index, lesson("l1", "old text"), lesson("stale", "deleted upstream"))
+
+    index.begin_build()
+    snapshot = index.prepare([lesson("l1", "text read by the build"), lesson("l2", "new lesson")])
+    # A live update lands after the build read l1
+    add(index, lesson("l1", "text from the live update"))
+    index.apply(snapshot, from_build=True)
+    index.finish_build({("lesson", "l1"), ("lesson", "l2")})
+
+    assert index.ready
+    texts = {chunk.source_id: chunk.text for chunk in index._chunks if chunk is not None}
+    assert texts == {"l1": "text from the live update", "l2": "new lesson"}
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from session_tokens import SessionSigner, RevocationList, _b64decode, is_signed_token
+
+
+def expires_in(seconds: float) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+
+def test_issue_and_verify_round_trip():
+    signer = SessionSigner({"k1": b"secret"}, "k1")
+    token, claims = signer.issue("user-1", "student", expires_in(60))
+
+    assert is_signed_token(token)
+    assert signer.verify(token) == claims
+    assert claims["u"] == "user-1" and claims["r"] == "student"
+
+
+def test_payload_carries_no_profile_data():
+    signer = SessionSigner({"k1": b"secret"}, "k1")
+    token, _ = signer.issue("user-1", "admin", expires_in(60))
+
+    payload = json.loads(_b64decode(token.split(".")[2]))
+    assert set(payload) == {"u", "r", "e", "j"}
+
+
+def test_tampered_payload_is_rejected():
+    signer = SessionSigner({"k1": b"secret"}, "k1")
+    token, _ = signer.issue("user-1", "student", expires_in(60))
+    version, kid, payload, signature = token.split(".")
+
+    forged = SessionSigner({"k1": b"other"}, "k1").issue("user-1", "admin", expires_in(60))[0].split(".")[2]
+
+    assert signer.verify(f"{version}.{kid}.{forged}.{signature}") is None
+    assert signer.verify(f"{version}.{kid}.{payload}.{signature[:-2]}xx") is None
+
+
+def test_expired_token_is_rejected():
+    signer = SessionSigner({"k1": b"secret"}, "k1")
+    token, _ = signer.issue("user-1", "student", expires_in(-1))
+    assert signer.verify(token) is None
+
+
+def test_rotated_keys_still_verify_old_tokens():
+    old = SessionSigner({"k1": b"one"}, "k1")
+    token, _ = old.issue("user-1", "student", expires_in(60))
+
+    rotated = SessionSigner.from_env("k2:two,k1:one")
+    assert rotated.active_kid == "k2"
+    assert rotated.verify(token)["u"] == "user-1"
+    assert rotated.issue("user-1", "student", expires_in(60))[0].split(".")[1] == "k2"
+
+    retired = SessionSigner.from_env("k2:two")
+    assert retired.verify(token) is None
+
+
+@pytest.mark.parametrize("value", ["k1", "k1:", ":secret", "k.1:secret"])
+def test_from_env_rejects_malformed_entries(value):
+    with pytest.raises(ValueError):
+        SessionSigner.from_env(value)
+
+
+def test_from_env_without_keys_disables_signing():
+    assert SessionSigner.from_env(" , ") is None
+
+
+def test_malformed_tokens_are_rejected():
+    signer = SessionSigner({"k1": b"secret"}, "k1")
+    for token in ["", "v1.k1.abc", "v2.k1.abc.def", "v1.unknown.abc.def", "opaque-db-token"]:
+        assert signer.verify(token) is None
+
+
+def test_revocation_list_prunes_expired_entries():
+    revoked = RevocationList()
+    now = datetime.now(timezone.utc).timestamp()
+    revoked.add("live", now + 60)
+    revoked.add("stale", now - 60)
+
+    revoked.prune()
+    assert revoked.is_revoked("live")
+    assert not revoked.is_revoked("stale")
+    assert len(revoked) == 1
@@ -0,0 +1,169 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("motor")
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from cache_bus import InvalidationBus, LocalCache, doc_tag
+from storage import MemoryDatabase
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def seeded():
+    db = MemoryDatabase("storage")
+    run(db.items.insert_many([
+        {"id": "a", "n": 1, "tags": ["x", "y"], "meta": {"level": "beginner"}, "at": T0},
+        {"id": "b", "n": 5, "tags": ["y"], "meta": {"level": "advanced"}, "at": T0 + timedelta(days=1)},
+        {"id": "c", "n": 3, "tags": [], "at": "2024-01-03T00:00:00+00:00"},
+    ]))
+    return db
+
+
+def ids(docs):
+    return [d["id"] for d in docs]
+
+
+@pytest.mark.parametrize("query,expected", [
+    ({"n": {"$gte": 3}}, ["b", "c"]),
+    ({"tags": "y"}, ["a", "b"]),
+    ({"tags": {"$size": 0}}, ["c"]),
+    ({"meta.level": {"$in": ["beginner", "intermediate"]}}, ["a"]),
+    ({"meta": {"$exists": False}}, ["c"]),
+    ({"at": {"$type": "string"}}, ["c"]),
+    # Comparisons are bracketed by type: the string date never matches a date bound
+    ({"at": {"$lt": T0 + timedelta(days=5)}}, ["a", "b"]),
+    ({"$or": [{"n": 1}, {"tags": {"$all": ["y"]}, "n": {"$ne": 1}}]}, ["a", "b"]),
+    ({"id": {"$regex": "^[AB]$", "$options": "i"}}, ["a", "b"]),
+    ({"n": {"$not": {"$gt": 2}}}, ["a"]),
+])
+def test_query_operators(query, expected):
+    db = seeded()
+    assert sorted(ids(run(db.items.find(query).to_list(None)))) == expected
+
+
+def test_sort_skip_limit_and_projection():
+    db = seeded()
+    docs = run(db.items.find({}, {"_id": 0, "id": 1}).sort([("n", -1)]).skip(1).limit(1).to_list(None))
+    assert docs == [{"id": "c"}]
+
+
+def test_dotted_projection_through_arrays():
+    db = MemoryDatabase("projection")
+    run(db.chats.insert_one({"_id": "c1", "turns": [{"at": 1, "text": "hi"}, {"text": "no at"}, 7], "meta": {"a": 1, "b": 2}}))
+
+    after = run(db.chats.find_one_and_update(
+        {"_id": "c1"}, {"$push": {"turns": {"at": 2, "text": "new"}}},
+        projection={"turns.at": 1, "meta.a": 1}, return_document=ReturnDocument.AFTER
+    ))
+    assert after == {"_id": "c1", "turns": [{"at": 1}, {}, {"at": 2}], "meta": {"a": 1}}
+    assert run(db.chats.find_one({}, {"_id": 0, "turns.at": 1, "turns.text": 1}))["turns"][1] == {"text": "no at"}
+
+
+def test_update_operators():
+    db = seeded()
+    run(db.items.update_one({"id": "a"}, {
+        "$set": {"meta.level": "advanced"},
+        "$inc": {"n": 2, "views": 1},
+        "$addToSet": {"tags": {"$each": ["y", "z"]}},
+        "$unset": {"at": ""},
+    }))
+    doc = run(db.items.find_one({"id": "a"}, {"_id": 0}))
+    assert doc == {"id": "a", "n": 3, "views": 1, "tags": ["x", "y", "z"], "meta": {"level": "advanced"}}
+
+    run(db.items.update_one({"id": "b"}, {"$push": {"tags": {"$each": ["p", "q"], "$slice": -2}}, "$max": {"n": 4}}))
+    doc = run(db.items.find_one({"id": "b"}))
+    assert doc["tags"] == ["p", "q"] and doc["n"] == 5
+
+
+def test_upsert_seeds_equality_fields_and_set_on_insert():
+    db = seeded()
+    update = {"$inc": {"n": 1}, "$setOnInsert": {"created": True}}
+    run(db.items.update_one({"id": "d", "kind": "new"}, update, upsert=True))
+    run(db.items.update_one({"id": "d", "kind": "new"}, {**update, "$setOnInsert": {"created": False}}, upsert=True))
+    doc = run(db.items.find_one({"id": "d"}, {"_id": 0}))
+    assert doc == {"id": "d", "kind": "new", "n": 2, "created": True}
+
+
+def test_find_one_and_update_returns_requested_version():
+    db = seeded()
+    before = run(db.items.find_one_and_update({"id": "a"}, {"$inc": {"n": 1}}, projection={"_id": 0, "n": 1}))
+    after = run(db.items.find_one_and_update(
+        {"id": "a"}, {"$inc": {"n": 1}}, projection={"_id": 0, "n": 1}, return_document=ReturnDocument.AFTER
+    ))
+    assert (before, after) == ({"n": 1}, {"n": 3})
+
+
+def test_unique_index_rejects_inserts_updates_and_bulk_writes():
+    db = seeded()
+    run(db.items.create_index("id", unique=True))
+    with pytest.raises(DuplicateKeyError):
+        run(db.items.insert_one({"id": "a"}))
+    with pytest.raises(DuplicateKeyError):
+        run(db.items.update_one({"id": "b"}, {"$set": {"id": "a"}}))
+    run(db.items.insert_one({"id": "e", "n": 1}))
+    with pytest.raises(DuplicateKeyError):
+        run(db.items.create_index("n", unique=True))
+
+    result = run(db.items.bulk_write([UpdateOne({"id": "b"}, {"$inc": {"n": 1}}), UpdateOne({"id": "c"}, {"$inc": {"n": 1}})]))
+    assert result.modified_count == 2
+
+
+def test_aggregate_group_and_sort():
+    db = seeded()
+    groups = run(db.items.aggregate([
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "total": {"$sum": "$n"}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]).to_list(None))
+    assert groups == [{"_id": "x", "total": 1, "count": 1}, {"_id": "y", "total": 6, "count": 2}]
+
+
+def test_change_stream_delivers_matching_writes():
+    db = MemoryDatabase("streams")
+
+    async def scenario():
+        async with db.watch([{"$match": {"ns.coll": {"$in": ["courses"]}}}], max_await_time_ms=10) as stream:
+            await db.lessons.insert_one({"id": "l1"})
+            await db.courses.insert_one({"id": "c1"})
+            change = await stream.try_next()
+            assert (change["operationType"], change["ns"]["coll"]) == ("insert", "courses")
+            assert stream.resume_token == change["_id"]
+            assert await stream.try_next() is None
+
+    run(scenario())
+
+
+def test_bus_invalidates_and_stops_with_a_backlog():
+    db = MemoryDatabase("bus")
+    bus = InvalidationBus(["courses"], bus_id="test")
+    cache = bus.register(LocalCache("courses", ttl=60, fallback_ttl=1))
+
+    async def scenario():
+        bus.start(db)
+        while not bus.healthy:
+            await asyncio.sleep(0.01)
+        cache.set("c1", "cached", tags=[doc_tag("courses", "id", "c1")])
+        await db.courses.insert_one({"id": "c1"})
+        for _ in range(100):
+            if cache.get("c1") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.get("c1") is None
+
+        # Stopping while the stream still has queued changes must not hang
+        for i in range(200):
+            await db.courses.insert_one({"id": f"bulk{i}"})
+        await asyncio.wait_for(bus.stop(), timeout=5)
+
+    run(scenario())
+    # The resume token only lives in memory; restarted workers begin with empty caches
+    assert "cache_bus_state" not in run(db.list_collection_names())
@@ -0,0 +1,116 @@
+import json
+import types
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from tracing import (TraceCommandListener, TraceExporter, TracedJSONResponse, TracedRoute, TracingMiddleware,
+                     Trace, current_trace, span, traced)
+
+
+def build_app(**middleware):
+    app = FastAPI(default_response_class=TracedJSONResponse)
+    router = APIRouter(route_class=TracedRoute, default_response_class=TracedJSONResponse)
+
+    @traced("auth")
+    async def user():
+        with span("db", "users.find"):
+            return {"id": "u1"}
+
+    @router.get("/items")
+    async def items(current=Depends(user)):
+        with span("llm"):
+            pass
+        return {"owner": current["id"], "items": list(range(100))}
+
+    app.include_router(router)
+    app.add_middleware(TracingMiddleware, **middleware)
+    return app
+
+
+def metrics(header):
+    return {part.split(";")[0]: part for part in header.split(", ")}
+
+
+def test_sampled_requests_get_a_server_timing_header():
+    with TestClient(build_app(sample_rate=1.0)) as client:
+        response = client.get("/items")
+    assert response.status_code == 200
+    timing = metrics(response.headers["server-timing"])
+    assert list(timing) == ["auth", "db", "llm", "serialize", "total"]
+    assert timing["db"].endswith('desc="1x"')
+    assert "x-trace-id" not in response.headers
+
+
+def test_unsampled_requests_are_untouched():
+    with TestClient(build_app(sample_rate=0.0)) as client:
+        response = client.get("/items")
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+
+
+def test_exported_traces_carry_their_spans(tmp_path):
+    exporter = TraceExporter(str(tmp_path / "traces" / "out.ndjson"))
+    exporter.start()
+    with TestClient(build_app(sample_rate=0.0, export_rate=1.0, exporter=exporter)) as client:
+        response = client.get("/items")
+    exporter.close()
+
+    (record,) = [json.loads(line) for line in (tmp_path / "traces" / "out.ndjson").read_text().splitlines()]
+    assert record["trace_id"] == response.headers["x-trace-id"]
+    assert (record["method"], record["path"], record["status"]) == ("GET", "/items", 200)
+    assert [s["name"] for s in record["spans"]] == ["db", "auth", "llm", "serialize"]
+    assert record["spans"][0]["detail"] == "users.find"
+    assert record["totals"]["auth"]["count"] == 1
+    assert exporter.exported == 1
+
+
+def test_exporter_drops_instead_of_queueing_without_bound():
+    exporter = TraceExporter("unused.ndjson", max_queue=2)
+    for n in range(5):
+        exporter.submit({"n": n})
+    assert exporter.dropped == 3
+
+
+def test_span_caps_and_spans_outside_a_trace():
+    with span("db"):
+        pass
+
+    trace = Trace("t", "GET", "/", record_spans=True, max_spans=2)
+    token = current_trace.set(trace)
+    try:
+        for _ in range(3):
+            with span("db"):
+                pass
+    finally:
+        current_trace.reset(token)
+    assert len(trace.spans) == 2
+    assert trace.totals["db"][0] == 3
+
+
+def test_command_listener_times_driver_commands():
+    listener = TraceCommandListener()
+    trace = Trace("t", "GET", "/", record_spans=True)
+
+    def event(name, request_id, command=None):
+        return types.SimpleNamespace(command_name=name, command=command or {}, connection_id=("h", 1),
+                                     request_id=request_id, duration_micros=2500)
+
+    token = current_trace.set(trace)
+    try:
+        listener.started(event("find", 1, {"find": "courses"}))
+        listener.started(event("ping", 2))
+        listener.started(event("aggregate", 3, {"aggregate": "lessons"}))
+    finally:
+        current_trace.reset(token)
+    # Completions arrive on driver threads without the request context
+    listener.succeeded(event("find", 1))
+    listener.succeeded(event("ping", 2))
+    listener.failed(event("aggregate", 3))
+
+    assert [(s["detail"], s["duration_ms"]) for s in trace.spans] == [("courses.find", 2.5), ("lessons.aggregate failed", 2.5)]
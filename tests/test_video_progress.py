@@ -0,0 +1,64 @@
+import pytest
+
+
+@pytest.fixture
+def course(api, signup):
+    # A course with three lessons, created through the routes
+    instructor = signup("teacher@example.com", role="instructor")
+    course = api.post("/api/courses", json={"title": "Optics", "description": "Light", "category": "JEE", "language": "en"},
+                      headers=instructor).json()
+    lessons = [
+        api.post("/api/lessons", json={"course_id": course["id"], "title": f"Part {i}", "description": "", "order": i},
+                 headers=instructor).json()["id"]
+        for i in (2, 0, 1)
+    ]
+    return course["id"], [lessons[1], lessons[2], lessons[0]]  # in lesson order
+
+
+def watch(api, headers, lesson_id, seconds, total=100):
+    response = api.post("/api/video-progress", json={"lesson_id": lesson_id, "progress_seconds": seconds, "total_seconds": total},
+                        headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_batch_by_course(api, signup, course):
+    course_id, lessons = course
+    student = signup("student@example.com")
+    other = signup("other@example.com")
+    assert watch(api, student, lessons[0], 95)["completed"] is True
+    assert watch(api, student, lessons[1], 30)["completed"] is False
+    watch(api, other, lessons[2], 100)
+
+    batch = api.get("/api/video-progress/batch", params={"course_id": course_id}, headers=student).json()
+    assert batch["fields"] == ["progress_seconds", "total_seconds", "completed"]
+    assert batch["lessons"] == {lessons[0]: [95, 100, True], lessons[1]: [30, 100, False]}
+    assert (batch["total_lessons"], batch["completed_lessons"]) == (3, 1)
+    assert batch["percent_complete"] == pytest.approx(100 / 3)
+
+    # Re-watching updates the row in place
+    watch(api, student, lessons[1], 99)
+    batch = api.get("/api/video-progress/batch", params={"course_id": course_id}, headers=student).json()
+    assert batch["completed_lessons"] == 2
+
+
+def test_batch_by_lesson_ids(api, signup, course):
+    _, lessons = course
+    student = signup("student@example.com")
+    watch(api, student, lessons[2], 10)
+
+    ids = ",".join([lessons[2], lessons[2], "unknown", ""])
+    batch = api.get("/api/video-progress/batch", params={"lesson_ids": ids}, headers=student).json()
+    assert batch["lessons"] == {lessons[2]: [10, 100, False]}
+    assert batch["total_lessons"] == 2
+
+
+def test_batch_validation(api, signup, server):
+    student = signup("student@example.com")
+    assert api.get("/api/video-progress/batch", headers=student).status_code == 400
+    too_many = ",".join(f"l{i}" for i in range(server.MAX_BATCH_LESSONS + 1))
+    assert api.get("/api/video-progress/batch", params={"lesson_ids": too_many}, headers=student).status_code == 400
+    assert api.get("/api/video-progress/batch", params={"course_id": "c1"}).status_code == 401
+
+    empty = api.get("/api/video-progress/batch", params={"course_id": "no-such-course"}, headers=student).json()
+    assert (empty["total_lessons"], empty["percent_complete"]) == (0, 0.0)